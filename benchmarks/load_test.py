@@ -0,0 +1,174 @@
+"""Local load test of the headless server with the scripted provider.
+
+Starts nanoengineer.server with engines using benchmarks.scripted and the
+network tools pointed to a StubServer, then drives it with concurrent
+conversations and writes latency and throughput as JSON:
+
+    python -m benchmarks.load_test --workers 4 --sessions 64 --messages 3 --latency 0.2
+"""
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+from benchmarks import scripted
+from benchmarks.run import metadata, summarize
+from benchmarks.stub_server import StubServer, point_tools
+from nanoengineer import NanoEngineer, LLMInteract
+from nanoengineer.cache import ToolResultCache
+from nanoengineer.server import serve
+from tools import HotelTool, MapSearchTool, WeatherTool, WikiTool
+
+
+def scripted_engine():
+    # Called in each worker, configured by the load test through the environment
+    scripted.ScriptedProvider.latency = float(os.environ.get("SCRIPTED_LATENCY", "0"))
+    point_tools(os.environ["STUB_URL"])
+
+    nano = NanoEngineer(LLMInteract("scripted", os.environ.get("SCRIPT", "travel")), cache=ToolResultCache())
+    nano.register_tools([MapSearchTool, WeatherTool, WikiTool, HotelTool])
+    return nano
+
+
+def send(host, port, session, message, stream=True, timeout=60):
+    """
+    Send a message and read the server-sent events of the turn.
+
+    Returns:
+        float: Seconds until the first event.
+        list: The (event, data) pairs.
+    """
+    connection = http.client.HTTPConnection(host, port, timeout=timeout)
+    started = time.perf_counter()
+    first = None
+    events = []
+    try:
+        body = json.dumps({"message": message, "stream": stream})
+        connection.request("POST", f"/sessions/{session}/messages", body, {"Content-Type": "application/json"})
+        response = connection.getresponse()
+        if response.status != 200:
+            return None, [("error", {"status": response.status, "body": response.read().decode()})]
+
+        event = None
+        for line in response:
+            line = line.decode("utf-8").rstrip("\n")
+            if line.startswith("event: "):
+                event = line[7:]
+            elif line.startswith("data: "):
+                if first is None:
+                    first = time.perf_counter() - started
+                events.append((event, json.loads(line[6:])))
+    finally:
+        connection.close()
+    return first, events
+
+
+def wait_until_ready(host, port, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection(host, port, timeout=1)
+            connection.request("GET", "/health")
+            if connection.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Server on port {port} did not start")
+
+
+def run_load(host, port, sessions, messages, concurrency, stream):
+    latencies = []
+    first_events = []
+    errors = []
+    lock = threading.Lock()
+    queue = [str(uuid.uuid4()) for _ in range(sessions)]
+
+    def client():
+        while True:
+            with lock:
+                if not queue:
+                    return
+                session = queue.pop()
+            # The turns of a conversation are sequential
+            for i in range(messages):
+                started = time.perf_counter()
+                try:
+                    first, events = send(host, port, session, f"Plan a trip to London, message {i}", stream)
+                except OSError as e:
+                    first, events = None, [("error", {"error": str(e)})]
+                elapsed = time.perf_counter() - started
+                with lock:
+                    if events and events[-1][0] == "done":
+                        latencies.append(elapsed * 1e6)
+                        first_events.append(first * 1e6)
+                    else:
+                        errors.append(events[-1][1] if events else {"error": "no events"})
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - started
+
+    return {
+        "turns": len(latencies),
+        "errors": len(errors),
+        "error_samples": errors[:5],
+        "duration_seconds": round(duration, 3),
+        "turns_per_second": round(len(latencies) / duration, 2),
+        "latency": summarize(latencies) if latencies else None,
+        "first_event": summarize(first_events) if first_events else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test of the headless server")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--sessions", type=int, default=64, help="Number of conversations")
+    parser.add_argument("--messages", type=int, default=3, help="Messages per conversation")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent conversations")
+    parser.add_argument("--latency", type=float, default=0.2, help="Simulated seconds per LLM call")
+    parser.add_argument("--script", default="travel", choices=list(scripted.SCRIPTS))
+    parser.add_argument("--no-stream", action="store_true", help="Request complete responses")
+    parser.add_argument("--output", help="JSON file the results are written to, stdout if omitted")
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(scripted_engine, args.host, args.port, args.workers)
+        return
+
+    with StubServer() as stub:
+        env = {**os.environ, "STUB_URL": stub.url, "SCRIPT": args.script, "SCRIPTED_LATENCY": str(args.latency)}
+        server = subprocess.Popen([sys.executable, "-m", "benchmarks.load_test", "--serve",
+                                   "--host", args.host, "--port", str(args.port), "--workers", str(args.workers)],
+                                  env=env, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        try:
+            wait_until_ready(args.host, args.port)
+            results = run_load(args.host, args.port, args.sessions, args.messages, args.concurrency,
+                               not args.no_stream)
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
+
+    config = {k: getattr(args, k) for k in ("workers", "sessions", "messages", "concurrency", "latency", "script")}
+    report = {"meta": {**metadata(), **config}, "results": {"load": results}}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""Offline micro-benchmarks of the engine, the response parser and the tools.
+
+The LLM is replaced by benchmarks.scripted.ScriptedProvider and the network
+APIs by benchmarks.stub_server.StubServer, so the suite needs no network
+access and no API keys. Results are written as JSON and can be compared
+with the results of another commit:
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --compare results.json --rows 1000,100000
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from benchmarks import scripted  # registers the "scripted" provider
+from benchmarks.stub_server import StubServer
+from nanoengineer import NanoEngineer, LLMInteract
+from nanoengineer.parser import _parse_cached
+from tools import HotelTool, SightseeingTool, MapSearchTool, WeatherTool, WikiTool
+from tools.catalog import CSVCatalog
+from tools.columnar import ColumnarCatalog, convert_csv
+
+HOTEL_TYPES = ("luxury", "hostel", "boutique", "business", "budget")
+
+
+def measure(fn, repeat=100, warmup=3, setup=None):
+    """
+    Time fn and summarize the durations in microseconds.
+
+    Args:
+        fn (callable): The measured function, called with the result of setup if given.
+        repeat (int): Number of timed calls.
+        warmup (int): Number of untimed calls before.
+        setup (callable): Called before every call, not timed.
+
+    Returns:
+        dict: Number of calls, min, median, p95, p99 and mean in microseconds.
+    """
+    times = []
+    for i in range(warmup + repeat):
+        arg = setup() if setup else None
+        started = time.perf_counter()
+        fn(arg) if setup else fn()
+        if i >= warmup:
+            times.append((time.perf_counter() - started) * 1e6)
+
+    return summarize(times)
+
+
+def summarize(times):
+    """
+    Summarize durations.
+
+    Args:
+        times (list): Durations in microseconds.
+
+    Returns:
+        dict: Number of durations, min, median, p95, p99 and mean in microseconds.
+    """
+    times = sorted(times)
+    return {
+        "n": len(times),
+        "min_us": round(times[0], 2),
+        "median_us": round(statistics.median(times), 2),
+        "p95_us": round(times[min(len(times) - 1, int(len(times) * 0.95))], 2),
+        "p99_us": round(times[min(len(times) - 1, int(len(times) * 0.99))], 2),
+        "mean_us": round(statistics.fmean(times), 2)
+    }
+
+
+def large_response(steps=500, executions=100, answer_chars=50000):
+    plan = "".join(f"<{i}>Step {i} of the plan, looking up place number {i}</{i}>" for i in range(steps))
+    execute = "".join(
+        f'<Execute plan=0 step={i}>{{"execute_tool": "map_search", "params": {{"place": "Place {i}"}}}}</Execute>'
+        for i in range(executions)
+    )
+    answer = ("London is a great city to visit. " * (answer_chars // 33 + 1))[:answer_chars]
+    return f"<Plan id=0>{plan}</Plan>{execute}<Answer plan=0>{answer}</Answer>"
+
+
+def engine(script="travel", **kwargs):
+    return NanoEngineer(LLMInteract("scripted", script), **kwargs)
+
+
+def bench_parse(results, repeat):
+    nano = engine()
+    response = large_response()
+
+    def cold(check):
+        def fn():
+            _parse_cached.cache_clear()
+            check(response)
+        return fn
+
+    results["parse.is_plan.cold"] = measure(cold(nano._is_plan), repeat)
+    results["parse.is_execution.cold"] = measure(cold(nano._is_execution), repeat)
+    results["parse.is_plan.cached"] = measure(lambda: nano._is_plan(response), repeat)
+    results["parse.is_execution.cached"] = measure(lambda: nano._is_execution(response), repeat)
+
+
+def bench_format_tools(results, repeat):
+    for count in (100, 500):
+        nano = engine()
+        nano.register_tools([
+            type(f"Tool{i}", (), {
+                "name": f"tool_{i}",
+                "description": f"Tool number {i}, returning data about topic {i}",
+                "params": {"query": {"description": "The query", "type": "string", "optional": "no"}},
+                "return_schema": {"type": "json", "columns": ["name", "value"], "records": "results"}
+            })
+            for i in range(count)
+        ])
+        results[f"format_tools.{count}"] = measure(nano._format_tools, repeat)
+
+
+def write_hotels(path, rows, cities):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["number_id", "city", "name", "type", "stars", "price", "description", "longitude", "latitude"])
+        for i in range(rows):
+            writer.writerow([i, f"City{i % cities}", f"Hotel {i}", HOTEL_TYPES[i % 5], 1 + i % 5,
+                             round(random.uniform(30, 600), 2), f"Hotel number {i} with comfortable rooms",
+                             round(random.uniform(-180, 180), 6), round(random.uniform(-90, 90), 6)])
+
+
+def write_sights(path, rows, cities):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["number_id", "City", "Name", "Description", "Longitude", "Latitude"])
+        for i in range(rows):
+            writer.writerow([i, f"City{i % cities}", f"Sight {i}", f"Sight number {i} worth a visit",
+                             round(random.uniform(-180, 180), 6), round(random.uniform(-90, 90), 6)])
+
+
+def bench_catalogs(results, repeat, row_counts):
+    random.seed(0)
+    with tempfile.TemporaryDirectory() as directory:
+        for rows in row_counts:
+            cities = max(10, rows // 200)
+            for tool, write, key, filters, queries in (
+                (HotelTool, write_hotels, "city", ("type", "stars"), [
+                    ("city", {}),
+                    ("city_type_stars", {"type": "luxury", "stars": 1}),
+                    ("city_price", {"min_price": 50, "max_price": 150})
+                ]),
+                (SightseeingTool, write_sights, "City", (), [("city", {})])
+            ):
+                path = os.path.join(directory, f"{tool.name}_{rows}.csv")
+                write(path, rows, cities)
+
+                started = time.perf_counter()
+                csv_catalog = CSVCatalog(path, key, filters)
+                csv_catalog.lookup("City0")
+                results[f"{tool.name}.{rows}.csv.load"] = {"seconds": round(time.perf_counter() - started, 3)}
+
+                started = time.perf_counter()
+                columnar_catalog = ColumnarCatalog(convert_csv(path, key))
+                columnar_catalog.lookup("City0")
+                results[f"{tool.name}.{rows}.columnar.load"] = {"seconds": round(time.perf_counter() - started, 3)}
+
+                for backend, catalog in (("csv", csv_catalog), ("columnar", columnar_catalog)):
+                    bench_tool = type(tool.__name__, (tool,), {"catalog": catalog,
+                                                               "priced": "price" in catalog.columns()})()
+                    for name, params in queries:
+                        results[f"{tool.name}.{rows}.{backend}.{name}"] = measure(
+                            lambda params: bench_tool.execute(params), repeat,
+                            setup=lambda params=params: {"city": f"City{random.randrange(cities)}", **params}
+                        )
+
+
+class NoGazetteer:
+    def search(self, query, limit=3, exact=False):
+        return []
+
+
+def bench_send_message(results, repeat):
+    def run(nano, stream=False):
+        for _ in nano.send_message("Plan a trip to London", yield_response=True, stream=stream):
+            pass
+
+    async def arun(nano):
+        async for _ in nano.asend_message("Plan a trip to London"):
+            pass
+
+    # Engine overhead of a turn answered directly
+    results["send_message.answer"] = measure(run, repeat, setup=lambda: engine("answer"))
+
+    # Without the offline gazetteer every map search goes to Photon, comparable to earlier results
+    photon_only = type("MapSearchTool", (MapSearchTool,), {"gazetteer": NoGazetteer()})
+
+    with StubServer():
+        def travel_engine(map_tool=photon_only):
+            nano = engine("travel")
+            nano.register_tools([map_tool, WeatherTool, WikiTool, HotelTool])
+            return nano
+
+        # Plan, four tools against the stub server and answer, tool cache disabled
+        results["send_message.tools"] = measure(run, repeat, setup=travel_engine)
+        results["send_message.tools.stream"] = measure(lambda nano: run(nano, stream=True), repeat,
+                                                       setup=travel_engine)
+        # London is found by the offline gazetteer
+        results["send_message.tools.gazetteer"] = measure(run, repeat,
+                                                          setup=lambda: travel_engine(MapSearchTool))
+        # The same turn on an event loop, the network tools awaiting their requests
+        results["asend_message.tools"] = measure(lambda nano: asyncio.run(arun(nano)), repeat,
+                                                 setup=travel_engine)
+
+
+BENCHMARKS = {
+    "parse": bench_parse,
+    "format_tools": bench_format_tools,
+    "catalogs": bench_catalogs,
+    "send_message": bench_send_message
+}
+
+
+def metadata():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(__file__)).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "processor": platform.processor()
+    }
+
+
+def compare(results, baseline):
+    print(f"{'benchmark':45} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        key = "median_us" if "median_us" in current else "seconds"
+        if not previous.get(key):
+            continue
+        change = (current[key] - previous[key]) / previous[key] * 100
+        print(f"{name:45} {previous[key]:12.2f} {current[key]:12.2f} {change:+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks of NanoEngineer")
+    parser.add_argument("--output", help="JSON file the results are written to, stdout if omitted")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare with")
+    parser.add_argument("--rows", default="1000,100000,1000000", help="Comma separated catalog sizes")
+    parser.add_argument("--repeat", type=int, default=100, help="Timed calls per benchmark")
+    parser.add_argument("--only", action="append", choices=list(BENCHMARKS), help="Run only these benchmarks")
+    args = parser.parse_args()
+
+    results = {}
+    for name, bench in BENCHMARKS.items():
+        if args.only and name not in args.only:
+            continue
+        print(f"Running {name}", file=sys.stderr)
+        if name == "catalogs":
+            bench(results, args.repeat, [int(r) for r in args.rows.split(",")])
+        else:
+            bench(results, args.repeat)
+
+    report = {"meta": metadata(), "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f)["results"])
+
+
+if __name__ == "__main__":
+    main()
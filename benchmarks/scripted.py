@@ -0,0 +1,75 @@
+from typing import List, Dict, Any, Iterator
+import asyncio
+import time
+from nanoengineer.llm_interact import BaseLLMProvider, LLMInteract
+from nanoengineer.history import estimate_tokens
+
+# Responses of one turn, selected by LLMInteract("scripted", model=<script name>)
+SCRIPTS = {
+    "travel": [
+        '<Plan id=0><0>Find London on the map</0><1>Get the weather in London</1>'
+        '<2>Find hotels in London</2><3>Look up London on Wikipedia</3></Plan>'
+        '<Execute plan=0 step=0>{"execute_tool": "map_search", "params": {"place": "London"}}</Execute>'
+        '<Execute plan=0 step=2>{"execute_tool": "hotel", "params": {"city": "London"}}</Execute>'
+        '<Execute plan=0 step=3>{"execute_tool": "wiki", "params": {"query": "London"}}</Execute>',
+        '<Execute plan=0 step=1>{"execute_tool": "weather", "params": {"lat": 51.5074, "lon": -0.1278, "date": "2025-02-10"}}</Execute>',
+        '<Answer plan=0>London is cloudy at about 4 degrees. The Ritz London and YHA London Central '
+        'have rooms available.</Answer>'
+    ],
+    "answer": [
+        '<Answer>Hello, how can I help you plan your trip?</Answer>'
+    ]
+}
+
+
+class ScriptedProvider(BaseLLMProvider):
+    """Offline provider replaying canned responses, for benchmarks and load tests.
+
+    The model name selects the script. Within a turn, the n-th assistant
+    response after the user's request is the n-th response of the script, so
+    every conversation replays the same script independent of other sessions.
+    latency and chunk_size simulate the response time and streaming of a
+    real provider.
+    """
+
+    latency = 0.0
+    chunk_size = 16
+
+    def __init__(self, model: str, api_key: str = None):
+        if model not in SCRIPTS:
+            raise ValueError(f"Unknown script: {model}. Available scripts: {list(SCRIPTS.keys())}")
+        self.script = SCRIPTS[model]
+
+    def _next_response(self, messages: List[Dict[str, Any]], system_prompt: str, usage: Dict[str, int]) -> str:
+        position = 0
+        for message in reversed(messages):
+            if message["role"] == "user" and message.get("kind") != "tool_result":
+                break
+            if message["role"] == "assistant":
+                position += 1
+
+        response = self.script[min(position, len(self.script) - 1)]
+        input_tokens = estimate_tokens(system_prompt) + sum(estimate_tokens(m["content"]) for m in messages)
+        self._record_usage(usage, input_tokens, estimate_tokens(response))
+        return response
+
+    def generate_response(self, messages, system_prompt="", usage=None, **kwargs) -> str:
+        if self.latency:
+            time.sleep(self.latency)
+        return self._next_response(messages, system_prompt, usage)
+
+    async def agenerate_response(self, messages, system_prompt="", usage=None, **kwargs) -> str:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._next_response(messages, system_prompt, usage)
+
+    def stream_response(self, messages, system_prompt="", usage=None, **kwargs) -> Iterator[str]:
+        response = self._next_response(messages, system_prompt, usage)
+        chunks = [response[i:i + self.chunk_size] for i in range(0, len(response), self.chunk_size)]
+        for chunk in chunks:
+            if self.latency:
+                time.sleep(self.latency / len(chunks))
+            yield chunk
+
+
+LLMInteract.PROVIDERS["scripted"] = ScriptedProvider
@@ -0,0 +1,92 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+import os
+import threading
+from tools import MapSearchTool, WeatherTool, WikiTool
+from tools.http_client import client
+
+PAYLOAD_DIR = os.path.join(os.path.dirname(__file__), "payloads")
+
+# Path of each API, the recorded payload it serves and the tool calling it
+ROUTES = {
+    "/api/": ("photon.json", "application/json", MapSearchTool),
+    "/weather": ("brightsky.json", "application/json", WeatherTool),
+    "/api/search": ("dbpedia.xml", "application/xml", WikiTool)
+}
+
+
+def point_tools(url):
+    """
+    Point the network tools to a stub server.
+
+    Args:
+        url (str): Base URL of the stub server, e.g. http://127.0.0.1:8080.
+
+    Returns:
+        dict: The previous base_url of each tool.
+    """
+    previous = {}
+    for path, (_, _, tool) in ROUTES.items():
+        previous[tool] = tool.base_url
+        tool.base_url = url + path
+    # The tools' rate limits protect the public APIs, not the stub
+    client._host(url, rate_limit=(1e9, 1e9))
+    return previous
+
+
+class StubServer:
+    """Local HTTP server serving recorded Photon, Bright Sky and DBpedia payloads.
+
+    Used as context manager, it points the base_url of the network tools to
+    itself and restores them on exit.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        """
+        Initialize the server.
+
+        Args:
+            host (str): The interface to listen on.
+            port (int): The port, 0 for any free port.
+        """
+        payloads = {}
+        for path, (file_name, content_type, _) in ROUTES.items():
+            with open(os.path.join(PAYLOAD_DIR, file_name), "rb") as f:
+                payloads[path] = (f.read(), content_type)
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written separately, Nagle would delay keep-alive responses
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                path = urlsplit(self.path).path
+                if path not in payloads:
+                    self.send_error(404)
+                    return
+                body, content_type = payloads[path]
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://{host}:{self.server.server_address[1]}"
+        self.base_urls = {}
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_urls = point_tools(self.url)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        for tool, base_url in self.base_urls.items():
+            tool.base_url = base_url
+        self.server.shutdown()
+        self.server.server_close()
+        return False
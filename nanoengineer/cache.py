@@ -0,0 +1,333 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+
+def canonical_params(params: Dict[str, Any]) -> str:
+    """
+    Serialize tool parameters so that equivalent calls produce the same key.
+
+    Keys are sorted, surrounding whitespace is stripped from strings and
+    empty values are dropped, as tools treat them as missing.
+
+    Args:
+        params (dict): The tool parameters.
+
+    Returns:
+        str: The canonical JSON representation.
+    """
+    canonical = {}
+    for key, value in (params or {}).items():
+        if isinstance(value, str):
+            value = value.strip()
+        if value is None or value == "":
+            continue
+        canonical[key] = value
+    return json.dumps(canonical, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def cache_key(tool_name: str, params: Dict[str, Any], version: Any = None) -> str:
+    """
+    Build the cache key of a tool call.
+
+    Args:
+        tool_name (str): The name of the tool.
+        params (dict): The tool parameters.
+        version: The tool's data version, e.g. the mtime of its data file.
+
+    Returns:
+        str: The cache key.
+    """
+    key = f"{tool_name}:{canonical_params(params)}"
+    if version is not None:
+        key += f"@{version}"
+    return key
+
+
+# Message keys which are part of the request sent to the provider; other
+# keys (tokens, kind, compacted, cache_prefix) are history bookkeeping
+RESPONSE_KEY_FIELDS = ("role", "content", "schema", "tool_calls", "tool_results")
+
+
+def response_cache_key(provider: str,
+                       model: str,
+                       system_prompt: str,
+                       messages: List[Dict[str, Any]],
+                       params: Dict[str, Any]) -> str:
+    """
+    Build the cache key of an LLM response.
+
+    Args:
+        provider (str): The provider name.
+        model (str): The model name.
+        system_prompt (str): The system prompt.
+        messages (list): The conversation history.
+        params (dict): The generation parameters.
+
+    Returns:
+        str: The cache key, a hash of all inputs of the call.
+    """
+    request = {
+        "provider": provider,
+        "model": model,
+        "system": system_prompt,
+        "messages": [{k: m[k] for k in RESPONSE_KEY_FIELDS if k in m} for m in messages],
+        "params": {k: v for k, v in params.items() if k not in ("usage", "tool_calls", "deadline")}
+    }
+    encoded = json.dumps(request, sort_keys=True, separators=(",", ":"), default=str)
+    return f"llm:{hashlib.sha256(encoded.encode('utf-8')).hexdigest()}"
+
+
+class BaseResultCache(ABC):
+    """Abstract base class for tool result and LLM response caches"""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached result for key, or None on a miss"""
+        pass
+
+    @abstractmethod
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        """Store a result for ttl seconds, or without expiry if ttl is None"""
+        pass
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit and miss counters"""
+        return {}
+
+
+class ToolResultCache(BaseResultCache):
+    """In-process tool result cache with TTL expiry and LRU eviction"""
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries (int): Maximum number of cached results.
+            max_bytes (int): Maximum total size of the cached results in characters.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self.lock:
+            entry = self.entries.get(key)
+
+            if entry is not None and entry[1] is not None and entry[1] < time.monotonic():
+                self._remove(key)
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        if len(value) > self.max_bytes:
+            return
+
+        expires = time.monotonic() + ttl if ttl is not None else None
+
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+
+            self.entries[key] = (value, expires)
+            self.size += len(value)
+
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                oldest = next(iter(self.entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key: str):
+        value, _ = self.entries.pop(key)
+        self.size -= len(value)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self.entries),
+                "size": self.size
+            }
+
+
+class SQLiteResultCache(BaseResultCache):
+    """Tool result store in a local SQLite file, shared by several processes.
+
+    The database runs in WAL mode, so readers in other processes are not
+    blocked by writers. Expired entries are removed and the store is
+    compacted to its size bounds every compact_interval writes, evicting
+    the least recently used entries. An optional in-process
+    ToolResultCache in front of the store is preloaded with the most
+    recently used entries on start.
+    """
+
+    def __init__(self,
+                 path: str,
+                 max_entries: int = 100000,
+                 max_bytes: int = 512 * 1024 * 1024,
+                 memory: Optional[ToolResultCache] = None,
+                 preload: int = 1000,
+                 compact_interval: int = 100):
+        """
+        Initialize the store.
+
+        Args:
+            path (str): Path of the SQLite database file.
+            max_entries (int): Maximum number of stored results.
+            max_bytes (int): Maximum total size of the stored results in characters.
+            memory (ToolResultCache): Optional in-process cache in front of the store.
+            preload (int): Number of most recently used entries loaded into memory on start.
+            compact_interval (int): Number of writes between compactions.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.memory = memory
+        self.compact_interval = compact_interval
+        self.local = threading.local()
+        self.writes = 0
+        self.hits = 0
+        self.misses = 0
+
+        with self._connection() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                expires REAL,
+                accessed REAL NOT NULL
+            )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)")
+
+        if self.memory is not None and preload > 0:
+            self.warm(preload)
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections must not be shared between threads
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def warm(self, limit: int):
+        """
+        Load the most recently used entries into the in-process cache.
+
+        Args:
+            limit (int): Maximum number of entries to load.
+        """
+        now = time.time()
+        rows = self._connection().execute(
+            "SELECT key, value, expires FROM results "
+            "WHERE expires IS NULL OR expires > ? "
+            "ORDER BY accessed DESC LIMIT ?",
+            (now, limit)
+        ).fetchall()
+
+        # Insert oldest first, so the most recent entries end up last in the LRU order
+        for key, value, expires in reversed(rows):
+            self.memory.set(key, value, expires - now if expires is not None else None)
+
+    def get(self, key: str) -> Optional[str]:
+        if self.memory is not None:
+            value = self.memory.get(key)
+            if value is not None:
+                self.hits += 1
+                return value
+
+        now = time.time()
+        with self._connection() as conn:
+            row = conn.execute(
+                "SELECT value, expires FROM results WHERE key = ? AND (expires IS NULL OR expires > ?)",
+                (key, now)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            conn.execute("UPDATE results SET accessed = ? WHERE key = ?", (now, key))
+
+        value, expires = row
+        if self.memory is not None:
+            self.memory.set(key, value, expires - now if expires is not None else None)
+
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        now = time.time()
+        expires = now + ttl if ttl is not None else None
+
+        if self.memory is not None:
+            self.memory.set(key, value, ttl)
+
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, value, size, expires, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value), expires, now)
+            )
+
+        self.writes += 1
+        if self.writes % self.compact_interval == 0:
+            self.compact()
+
+    def compact(self):
+        """Remove expired entries and evict least recently used entries beyond the size bounds"""
+        with self._connection() as conn:
+            conn.execute("DELETE FROM results WHERE expires IS NOT NULL AND expires <= ?", (time.time(),))
+
+            count, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+            if count <= self.max_entries and size <= self.max_bytes:
+                return
+
+            # Walk from the most recently used entry and keep entries while both bounds hold
+            kept, kept_size, cutoff = 0, 0, None
+            for accessed, entry_size in conn.execute("SELECT accessed, size FROM results ORDER BY accessed DESC"):
+                if kept + 1 > self.max_entries or kept_size + entry_size > self.max_bytes:
+                    cutoff = accessed
+                    break
+                kept += 1
+                kept_size += entry_size
+
+            if cutoff is not None:
+                conn.execute("DELETE FROM results WHERE accessed <= ?", (cutoff,))
+
+    def stats(self) -> Dict[str, int]:
+        count, size = self._connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results"
+        ).fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": count,
+            "size": size
+        }
@@ -0,0 +1,151 @@
+from typing import List, Dict, Any, Optional, Callable
+import re
+
+TOKEN_PATTERN = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of tokens of a text.
+
+    Mirrors how BPE tokenizers split text: words of up to about four
+    characters are one token, longer words and numbers several, and every
+    punctuation character (frequent in JSON and CSV tool results) its own
+    token.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        int: The estimated number of tokens.
+    """
+    tokens = 0
+    for match in TOKEN_PATTERN.finditer(text):
+        piece = match.group()
+        if piece[0].isdigit():
+            tokens += (len(piece) + 2) // 3
+        elif piece[0].isalpha():
+            tokens += (len(piece) + 3) // 4
+        else:
+            tokens += 1
+    return tokens
+
+
+def truncate_summary(content: str, max_chars: int = 300) -> str:
+    """Default summarizer, keeps the beginning of a text"""
+    if len(content) <= max_chars:
+        return content
+    return content[:max_chars].rstrip() + " ..."
+
+
+class HistoryManager:
+    """Keeps the conversation history within a token budget.
+
+    When the history exceeds token_budget, old tool results are replaced by
+    a short summary, oldest first, then other old messages, until the
+    history fits into target_ratio * token_budget. Compacting below the
+    budget avoids rewriting earlier messages on every call, which would
+    invalidate the provider's prompt cache each time.
+
+    The tool catalog message, the most recent plan and the last keep_recent
+    messages are never compacted. Messages are never removed, so the
+    user/assistant alternation is preserved.
+    """
+
+    def __init__(self,
+                 token_budget: int,
+                 target_ratio: float = 0.75,
+                 keep_recent: int = 4,
+                 token_counter: Callable[[str], int] = estimate_tokens,
+                 summarizer: Callable[[str], str] = truncate_summary):
+        """
+        Initialize the history manager.
+
+        Args:
+            token_budget (int): Maximum number of tokens of the history.
+            target_ratio (float): Share of the budget the history is compacted to.
+            keep_recent (int): Number of most recent messages which are never compacted.
+            token_counter (callable): Returns the number of tokens of a text, e.g. a tokenizer.
+            summarizer (callable): Returns a short summary of an elided message.
+        """
+        self.token_budget = token_budget
+        self.target_ratio = target_ratio
+        self.keep_recent = keep_recent
+        self.token_counter = token_counter
+        self.summarizer = summarizer
+
+    def tokens(self, message: Dict[str, Any]) -> int:
+        """
+        Return the token count of a message, cached in the message.
+
+        Args:
+            message (dict): The message.
+
+        Returns:
+            int: The number of tokens.
+        """
+        if "tokens" not in message:
+            message["tokens"] = self.token_counter(message.get("content", ""))
+        return message["tokens"]
+
+    def total(self, history: List[Dict[str, Any]]) -> int:
+        return sum(self.tokens(m) for m in history)
+
+    def _pinned(self, history: List[Dict[str, Any]]) -> set:
+        pinned = {i for i, m in enumerate(history) if m.get("kind") == "catalog"}
+
+        plans = [i for i, m in enumerate(history) if m.get("kind") == "plan"]
+        if plans:
+            pinned.add(plans[-1])
+
+        pinned.update(range(max(0, len(history) - self.keep_recent), len(history)))
+        return pinned
+
+    def compact(self, history: List[Dict[str, Any]]) -> int:
+        """
+        Compact the history in place if it exceeds the token budget.
+
+        Args:
+            history (list): The conversation history.
+
+        Returns:
+            int: The number of tokens of the history.
+        """
+        total = self.total(history)
+        if total <= self.token_budget:
+            return total
+
+        target = int(self.token_budget * self.target_ratio)
+        pinned = self._pinned(history)
+        candidates = [i for i, m in enumerate(history) if i not in pinned and not m.get("compacted")]
+
+        # Tool results first, they are the largest and least needed later
+        candidates.sort(key=lambda i: (history[i].get("kind") != "tool_result", i))
+
+        for i in candidates:
+            if total <= target:
+                break
+
+            message = history[i]
+            before = self.tokens(message)
+            if message.get("kind") == "tool_result":
+                content = (f"[Result elided to save context ({before} tokens). "
+                           f"Summary: {self.summarizer(message['content'])}]")
+            else:
+                content = self.summarizer(message["content"])
+
+            compacted = {**message, "content": content, "compacted": True}
+            compacted.pop("tokens", None)
+            if "tool_results" in message:
+                # Native tool results are sent per call instead of the content
+                compacted["tool_results"] = [
+                    {**r, "content": f"[Result elided to save context. Summary: {self.summarizer(r['content'])}]"}
+                    for r in message["tool_results"]
+                ]
+            after = self.tokens(compacted)
+
+            if after < before:
+                history[i] = compacted
+                total += after - before
+
+        return total
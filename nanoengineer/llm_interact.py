@@ -1,9 +1,29 @@
-from typing import List, Dict, Any, Optional, Union
+from typing import List, Dict, Any, Optional, Union, Iterator, Tuple
 import json
 from abc import ABC, abstractmethod
+import asyncio
+import logging as lg
+import time
+from nanoengineer.history import HistoryManager
+from nanoengineer.metrics import MetricsSink, NullSink
+from nanoengineer.cache import BaseResultCache, response_cache_key
+from nanoengineer.repair import repair_json
 
 class BaseLLMProvider(ABC):
-    """Abstract base class for LLM providers"""
+    """Abstract base class for LLM providers
+
+    Providers report token usage of a call by filling the dict passed as
+    the usage keyword argument, see _record_usage.
+
+    Providers supporting native tool calling accept the tool schemas of
+    projection.tool_schema as the tools keyword argument and report the
+    calls of a response by appending {"id", "name", "input"} dicts to the
+    list passed as the tool_calls keyword argument, see _record_tool_call.
+    History messages carry the calls of an assistant message as tool_calls
+    and the results answering them as tool_results ({"id", "content"}).
+    """
+
+    supports_native_tools = False
     
     @abstractmethod
     def generate_response(self,
@@ -13,64 +33,303 @@ class BaseLLMProvider(ABC):
         """Generate a response from the LLM"""
         pass
 
+    async def agenerate_response(self,
+                                 messages: List[Dict[str, Any]],
+                                 system_prompt: str="",
+                                 **kwargs) -> str:
+        """Generate a response from the LLM without blocking the event loop.
+
+        Providers without a native async client fall back to running
+        generate_response in a worker thread.
+        """
+        return await asyncio.to_thread(self.generate_response, messages, system_prompt, **kwargs)
+
+    def stream_response(self,
+                        messages: List[Dict[str, Any]],
+                        system_prompt: str="",
+                        **kwargs) -> Iterator[str]:
+        """Generate a response from the LLM as a stream of text chunks.
+
+        Providers without streaming support yield the full response as a
+        single chunk.
+        """
+        yield self.generate_response(messages, system_prompt, **kwargs)
+
+    @staticmethod
+    def _record_usage(usage: Optional[Dict[str, int]],
+                      input_tokens: int,
+                      output_tokens: int,
+                      cached_input_tokens: int = 0,
+                      cache_creation_input_tokens: int = 0):
+        """Fill the caller's usage dict. input_tokens includes cached tokens."""
+        if usage is None:
+            return
+        usage.update({
+            "input_tokens": input_tokens,
+            "cached_input_tokens": cached_input_tokens,
+            "uncached_input_tokens": input_tokens - cached_input_tokens,
+            "cache_creation_input_tokens": cache_creation_input_tokens,
+            "output_tokens": output_tokens
+        })
+
+    @staticmethod
+    def _record_tool_call(tool_calls: Optional[List[Dict[str, Any]]],
+                          call_id: str,
+                          name: str,
+                          arguments: Union[str, Dict[str, Any], None]):
+        """Append a call to the caller's tool_calls list, parsing and if needed repairing JSON arguments"""
+        if tool_calls is None:
+            return
+        call = {"id": call_id, "name": name, "input": arguments}
+        if not isinstance(arguments, dict):
+            try:
+                call["input"] = json.loads(arguments or "{}")
+            except json.JSONDecodeError as e:
+                try:
+                    call["input"] = repair_json(arguments)
+                    call["repaired"] = True
+                except ValueError:
+                    call["input"] = {}
+                    call["error"] = f"Arguments of {name} are not valid JSON: {e}"
+            if not isinstance(call["input"], dict):
+                call["input"] = {}
+                call["error"] = f"Arguments of {name} are not a JSON object"
+        tool_calls.append(call)
+
 class AnthropicProvider(BaseLLMProvider):
-    """Anthropic Claude provider implementation"""
+    """Anthropic Claude provider implementation
+
+    The system prompt, the stable prefix of a message (its cache_prefix,
+    i.e. the tool catalog) and the last message are marked as prompt cache
+    breakpoints, so the conversation up to the previous turn is read from
+    the cache.
+    """
+
+    CACHE_CONTROL = {"type": "ephemeral"}
+    supports_native_tools = True
     
     def __init__(self, model: str, api_key: Optional[str] = None):
         try:
             import anthropic
             self.client = anthropic.Client(api_key=api_key)
+            self.async_client = anthropic.AsyncAnthropic(api_key=api_key)
             self.model=model
         except ImportError:
             raise ImportError("Please install anthropic package: pip install anthropic")
 
     
-    def generate_response(self,
-                          messages: List[Dict[str, Any]],
-                          system_prompt: str="",
-                          **kwargs) -> str:
+    def _format_messages(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         # Convert history format to Anthropic messages format
         formatted_messages = []
         for msg in messages:
             role = "assistant" if msg.get("role") == "assistant" else "user"
             content = msg.get("content", "")
+            prefix = msg.get("cache_prefix")
+
+            if msg.get("tool_results"):
+                content = [{"type": "tool_result", "tool_use_id": r["id"], "content": r["content"]}
+                           for r in msg["tool_results"]]
+            elif msg.get("tool_calls"):
+                content = [{"type": "text", "text": content}] if content.strip() else []
+                content += [{"type": "tool_use", "id": c["id"], "name": c["name"], "input": c["input"]}
+                            for c in msg["tool_calls"]]
+            elif prefix:
+                content = [
+                    {"type": "text", "text": content[:prefix], "cache_control": self.CACHE_CONTROL},
+                    {"type": "text", "text": content[prefix:]}
+                ]
             formatted_messages.append({"role": role, "content": content})
-        
-        response = self.client.messages.create(
-            model=self.model,
-            system=system_prompt,
-            messages=formatted_messages,
-            max_tokens=kwargs.get("max_tokens", 1000)
-        )
-        return response.content[0].text
+
+        if formatted_messages:
+            last = formatted_messages[-1]
+            if isinstance(last["content"], str):
+                last["content"] = [{"type": "text", "text": last["content"]}]
+            last["content"][-1] = {**last["content"][-1], "cache_control": self.CACHE_CONTROL}
+
+        return formatted_messages
+
+    def _request(self, messages: List[Dict[str, Any]], system_prompt: str, **kwargs) -> Dict[str, Any]:
+        if system_prompt:
+            system = [{"type": "text", "text": system_prompt, "cache_control": self.CACHE_CONTROL}]
+        else:
+            system = system_prompt
+        request = {
+            "model": self.model,
+            "system": system,
+            "messages": self._format_messages(messages),
+            "max_tokens": kwargs.get("max_tokens", 1000)
+        }
+        if kwargs.get("temperature") is not None:
+            request["temperature"] = kwargs["temperature"]
+        if kwargs.get("tools"):
+            request["tools"] = [{"name": t["name"], "description": t["description"], "input_schema": t["parameters"]}
+                                for t in kwargs["tools"]]
+        return request
+
+    def _content(self, response, tool_calls: Optional[List[Dict[str, Any]]]) -> str:
+        # Text blocks form the response, tool_use blocks are reported as calls
+        text = ""
+        for block in response.content:
+            if block.type == "text":
+                text += block.text
+            elif block.type == "tool_use":
+                self._record_tool_call(tool_calls, block.id, block.name, block.input)
+        return text
+
+    def _usage(self, response, usage: Optional[Dict[str, int]]):
+        cached = response.usage.cache_read_input_tokens or 0
+        created = response.usage.cache_creation_input_tokens or 0
+        # Anthropic's input_tokens excludes tokens read from or written to the cache
+        self._record_usage(usage,
+                           input_tokens=response.usage.input_tokens + cached + created,
+                           output_tokens=response.usage.output_tokens,
+                           cached_input_tokens=cached,
+                           cache_creation_input_tokens=created)
+
+    def generate_response(self,
+                          messages: List[Dict[str, Any]],
+                          system_prompt: str="",
+                          **kwargs) -> str:
+        response = self.client.messages.create(**self._request(messages, system_prompt, **kwargs))
+        self._usage(response, kwargs.get("usage"))
+        return self._content(response, kwargs.get("tool_calls"))
+
+    async def agenerate_response(self,
+                                 messages: List[Dict[str, Any]],
+                                 system_prompt: str="",
+                                 **kwargs) -> str:
+        response = await self.async_client.messages.create(**self._request(messages, system_prompt, **kwargs))
+        self._usage(response, kwargs.get("usage"))
+        return self._content(response, kwargs.get("tool_calls"))
+
+    def stream_response(self,
+                        messages: List[Dict[str, Any]],
+                        system_prompt: str="",
+                        **kwargs) -> Iterator[str]:
+        with self.client.messages.stream(**self._request(messages, system_prompt, **kwargs)) as stream:
+            for text in stream.text_stream:
+                yield text
+            response = stream.get_final_message()
+            self._usage(response, kwargs.get("usage"))
+            # The calls are complete once the message is, the text was already yielded
+            self._content(response, kwargs.get("tool_calls"))
 
 class OpenAIProvider(BaseLLMProvider):
-    """OpenAI provider implementation"""
+    """OpenAI provider implementation
+
+    OpenAI caches prompt prefixes automatically. The system prompt is sent
+    first and messages are passed through unchanged, so the prefix of a
+    conversation stays byte-stable between calls.
+    """
+
+    supports_native_tools = True
     
     def __init__(self, model: str, api_key: Optional[str] = None):
         try:
             import openai
             self.client = openai.Client(api_key=api_key)
+            self.async_client = openai.AsyncClient(api_key=api_key)
             self.model = model
         except ImportError:
             raise ImportError("Please install openai package: pip install openai")
     
-    def generate_response(self,
-                          messages: List[Dict[str, Any]],
-                          system_prompt: str="",
-                          **kwargs) -> str:
+    def _format_messages(self, messages: List[Dict[str, Any]], system_prompt: str="") -> List[Dict[str, Any]]:
+        # Drop history bookkeeping keys, the API only accepts role and content
+        formatted_messages = []
+        for msg in messages:
+            if msg.get("tool_results"):
+                formatted_messages += [{"role": "tool", "tool_call_id": r["id"], "content": r["content"]}
+                                       for r in msg["tool_results"]]
+            elif msg.get("tool_calls"):
+                formatted_messages.append({
+                    "role": "assistant",
+                    "content": msg.get("content") or None,
+                    "tool_calls": [{"id": c["id"], "type": "function",
+                                    "function": {"name": c["name"], "arguments": json.dumps(c["input"])}}
+                                   for c in msg["tool_calls"]]
+                })
+            else:
+                formatted_messages.append({"role": msg["role"], "content": msg.get("content", "")})
+        messages = formatted_messages
         if system_prompt != "":
             messages = [
                 {"role": "developer", "content": [{"type": "text", "text": system_prompt}]},
                 *messages
             ]
-        response = self.client.chat.completions.create(
-            model=self.model,#kwargs.get("model", "gpt-4"),
-            messages=messages,
-            max_tokens=kwargs.get("max_tokens", 1000)
-        )
+        return messages
+
+    def _usage(self, response_usage, usage: Optional[Dict[str, int]]):
+        if response_usage is None:
+            return
+        details = response_usage.prompt_tokens_details
+        self._record_usage(usage,
+                           input_tokens=response_usage.prompt_tokens,
+                           output_tokens=response_usage.completion_tokens,
+                           cached_input_tokens=(details.cached_tokens or 0) if details else 0)
+
+    def _request(self, messages: List[Dict[str, Any]], system_prompt: str, **kwargs) -> Dict[str, Any]:
+        request = {
+            "model": self.model,
+            "messages": self._format_messages(messages, system_prompt),
+            "max_tokens": kwargs.get("max_tokens", 1000)
+        }
+        if kwargs.get("temperature") is not None:
+            request["temperature"] = kwargs["temperature"]
+        if kwargs.get("tools"):
+            request["tools"] = [{"type": "function", "function": t} for t in kwargs["tools"]]
+        return request
+
+    def _content(self, message, tool_calls: Optional[List[Dict[str, Any]]]) -> str:
+        for call in message.tool_calls or []:
+            self._record_tool_call(tool_calls, call.id, call.function.name, call.function.arguments)
+        return message.content or ""
+
+    def generate_response(self,
+                          messages: List[Dict[str, Any]],
+                          system_prompt: str="",
+                          **kwargs) -> str:
+        response = self.client.chat.completions.create(**self._request(messages, system_prompt, **kwargs))
+        self._usage(response.usage, kwargs.get("usage"))
         
-        return response.choices[0].message.content
+        return self._content(response.choices[0].message, kwargs.get("tool_calls"))
+
+    async def agenerate_response(self,
+                                 messages: List[Dict[str, Any]],
+                                 system_prompt: str="",
+                                 **kwargs) -> str:
+        response = await self.async_client.chat.completions.create(**self._request(messages, system_prompt, **kwargs))
+        self._usage(response.usage, kwargs.get("usage"))
+
+        return self._content(response.choices[0].message, kwargs.get("tool_calls"))
+
+    def stream_response(self,
+                        messages: List[Dict[str, Any]],
+                        system_prompt: str="",
+                        **kwargs) -> Iterator[str]:
+        stream = self.client.chat.completions.create(**self._request(messages, system_prompt, **kwargs),
+                                                     stream=True,
+                                                     stream_options={"include_usage": True})
+
+        # Tool calls arrive as fragments keyed by their index
+        calls = {}
+        for chunk in stream:
+            if chunk.usage is not None:
+                self._usage(chunk.usage, kwargs.get("usage"))
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            for fragment in delta.tool_calls or []:
+                call = calls.setdefault(fragment.index, {"id": None, "name": "", "arguments": ""})
+                call["id"] = fragment.id or call["id"]
+                if fragment.function is not None:
+                    call["name"] += fragment.function.name or ""
+                    call["arguments"] += fragment.function.arguments or ""
+            if delta.content:
+                yield delta.content
+
+        for index in sorted(calls):
+            call = calls[index]
+            self._record_tool_call(kwargs.get("tool_calls"), call["id"], call["name"], call["arguments"])
 
 
 class OllamaProvider(BaseLLMProvider):
@@ -80,14 +339,12 @@ class OllamaProvider(BaseLLMProvider):
         try:
             import ollama
             self.client = ollama
+            self.async_client = ollama.AsyncClient()
             self.model = model
         except ImportError:
             raise ImportError("Please install ollama package: pip install ollama")
     
-    def generate_response(self,
-                          messages: List[Dict[str, Any]], 
-                          system_prompt: str="",
-                          **kwargs) -> str:
+    def _format_messages(self, messages: List[Dict[str, Any]], system_prompt: str="") -> List[Dict[str, Any]]:
         # Convert history format to Ollama messages format
         formatted_messages = []
 
@@ -99,15 +356,65 @@ class OllamaProvider(BaseLLMProvider):
             content = msg.get("content", "")
             formatted_messages.append({"role": role, "content": content})
 
-            
+        return formatted_messages
+
+    def _usage(self, response, usage: Optional[Dict[str, int]]):
+        # Ollama reports no prompt cache usage
+        self._record_usage(usage,
+                           input_tokens=response.get('prompt_eval_count') or 0,
+                           output_tokens=response.get('eval_count') or 0)
+
+    @staticmethod
+    def _options(kwargs: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        # Sampling parameters are passed as model options
+        if kwargs.get("temperature") is None:
+            return None
+        return {"temperature": kwargs["temperature"]}
+
+    def generate_response(self,
+                          messages: List[Dict[str, Any]], 
+                          system_prompt: str="",
+                          **kwargs) -> str:
         response = self.client.chat(
             model=self.model,
-            messages=formatted_messages,
+            messages=self._format_messages(messages, system_prompt),
+            options=self._options(kwargs),
             stream=False
         )
+        self._usage(response, kwargs.get("usage"))
         
         return response['message']['content']
 
+    async def agenerate_response(self,
+                                 messages: List[Dict[str, Any]],
+                                 system_prompt: str="",
+                                 **kwargs) -> str:
+        response = await self.async_client.chat(
+            model=self.model,
+            messages=self._format_messages(messages, system_prompt),
+            options=self._options(kwargs),
+            stream=False
+        )
+        self._usage(response, kwargs.get("usage"))
+
+        return response['message']['content']
+
+    def stream_response(self,
+                        messages: List[Dict[str, Any]],
+                        system_prompt: str="",
+                        **kwargs) -> Iterator[str]:
+        stream = self.client.chat(
+            model=self.model,
+            messages=self._format_messages(messages, system_prompt),
+            options=self._options(kwargs),
+            stream=True
+        )
+
+        for part in stream:
+            if part.get('done'):
+                self._usage(part, kwargs.get("usage"))
+            yield part['message']['content']
+
 
 class LLMInteract:
     """Main class for interacting with LLMs"""
@@ -118,27 +425,115 @@ class LLMInteract:
         "ollama": OllamaProvider
     }
     
-    def __init__(self, provider: str, model: str, api_key: Optional[str] = None, **kwargs):
+    def __init__(self,
+                 provider: str,
+                 model: str,
+                 api_key: Optional[str] = None,
+                 history_manager: Optional[HistoryManager] = None,
+                 metrics: Optional[MetricsSink] = None,
+                 response_cache: Optional[BaseResultCache] = None,
+                 response_cache_ttl: Optional[float] = 24 * 60 * 60,
+                 client: Optional[BaseLLMProvider] = None,
+                 fallbacks: Optional[List[Tuple[str, str]]] = None,
+                 routing: Optional[Dict[str, Any]] = None,
+                 **kwargs):
         """
         Initialize LLM interaction
         
         Args:
             provider: String identifier for the LLM provider (e.g., "anthropic/claude")
             api_key: Optional API key for the provider
+            history_manager: Optional manager keeping the history within a token budget
+            metrics: Optional sink for token, latency and error metrics
+            response_cache: Optional cache of responses for identical requests
+            response_cache_ttl: Seconds a cached response is valid, None for no expiry
+            client: Optional initialized provider to use, e.g. one shared by several sessions
+            fallbacks: Optional (provider, model) or (provider, model, api_key) pairs tried
+                in order after the primary provider, see RoutedProvider
+            routing: Optional RoutedProvider arguments, e.g. deadline, hedge_percentile
+                or max_concurrency. Without fallbacks, only the primary provider is used.
             **kwargs: Additional provider-specific configuration
         """
         if provider not in self.PROVIDERS:
             raise ValueError(f"Unsupported provider: {provider}. Available providers: {list(self.PROVIDERS.keys())}")
         
         self.provider_class = self.PROVIDERS[provider]
-        self.provider = self.provider_class(model=model, api_key=api_key)
+        self.labels = {"provider": provider, "model": model}
+        self.metrics = metrics or NullSink()
+        if client is not None:
+            self.provider = client
+        elif fallbacks or routing is not None:
+            self.provider = self._routed_provider([(provider, model, api_key), *(fallbacks or [])], routing or {})
+        else:
+            self.provider = self.provider_class(model=model, api_key=api_key)
         self.history: List[Dict[str, Any]] = []
+        self.history_manager = history_manager
+        self.response_cache = response_cache
+        self.response_cache_ttl = response_cache_ttl
         self.config = kwargs
+        self.logger = lg.getLogger(__name__)
+        self.last_usage: Dict[str, int] = {}
+        self.total_usage: Dict[str, int] = {}
+        self.tools: Optional[List[Dict[str, Any]]] = None
+        self.last_tool_calls: List[Dict[str, Any]] = []
+
+    def _routed_provider(self, routes: List[Tuple], routing: Dict[str, Any]) -> BaseLLMProvider:
+        # Imported here as the routing module builds on the providers of this one
+        from nanoengineer.routing import RoutedProvider
+
+        backends = []
+        for provider, model, *api_key in routes:
+            if provider not in self.PROVIDERS:
+                raise ValueError(f"Unsupported provider: {provider}. Available providers: {list(self.PROVIDERS.keys())}")
+            backends.append((f"{provider}/{model}",
+                             self.PROVIDERS[provider](model=model, api_key=api_key[0] if api_key else None)))
+        return RoutedProvider(backends, metrics=self.metrics, **routing)
+
+    def new_session(self) -> 'LLMInteract':
+        """
+        Create an LLMInteract with an empty history sharing this instance's
+        provider client, configuration, caches and metrics sink
+
+        Returns:
+            The new LLMInteract
+        """
+        llm = LLMInteract(self.labels["provider"],
+                          self.labels["model"],
+                          history_manager=self.history_manager,
+                          metrics=self.metrics,
+                          response_cache=self.response_cache,
+                          response_cache_ttl=self.response_cache_ttl,
+                          client=self.provider,
+                          **self.config)
+        if hasattr(self, "system_prompt"):
+            llm.set_system_prompt(self.system_prompt)
+        llm.set_tools(self.tools)
+        return llm
 
     def set_system_prompt(self, system_prompt: str):
         self.system_prompt = system_prompt
+
+    def set_tools(self, tools: Optional[List[Dict[str, Any]]]):
+        """
+        Set the tools offered to the model through native tool calling
+
+        Args:
+            tools: Tool schemas (see projection.tool_schema), None to disable
+                native tool calling. The calls of a response are available as
+                last_tool_calls.
+        """
+        if tools and not getattr(self.provider, "supports_native_tools", False):
+            raise ValueError(f"Provider {self.labels['provider']} does not support native tool calling")
+        self.tools = tools
     
-    def append(self, content: Union[str, Dict[str, Any]], role: str = "user", schema: Optional[str] = None) -> 'LLMInteract':
+    def append(self,
+               content: Union[str, Dict[str, Any]],
+               role: str = "user",
+               schema: Optional[str] = None,
+               cache_prefix: Optional[int] = None,
+               kind: Optional[str] = None,
+               tool_calls: Optional[List[Dict[str, Any]]] = None,
+               tool_results: Optional[List[Dict[str, Any]]] = None) -> 'LLMInteract':
         """
         Append a message to the conversation history
         
@@ -146,6 +541,13 @@ class LLMInteract:
             content: Message content (string or dict)
             role: Message role (default: "user")
             schema: Optional response format schema ("json" for JSON responses)
+            cache_prefix: Optional length of the content's prefix which is identical
+                across conversations, marked for prompt caching by providers supporting it
+            kind: Optional message kind used by the history manager
+                ("catalog", "plan" or "tool_result")
+            tool_calls: Optional native tool calls of an assistant message
+            tool_results: Optional results ({"id", "content"}) answering the
+                native tool calls of the previous message
         
         Returns:
             self for method chaining
@@ -157,34 +559,193 @@ class LLMInteract:
         
         if schema:
             message["schema"] = schema
+
+        if cache_prefix:
+            message["cache_prefix"] = cache_prefix
+
+        if kind:
+            message["kind"] = kind
+
+        if tool_calls:
+            message["tool_calls"] = tool_calls
+
+        if tool_results:
+            message["tool_results"] = tool_results
         
         self.history.append(message)
         return self
     
-    def response(self, **kwargs) -> str:
-        """
-        Generate a response based on the conversation history
-        
-        Args:
-            **kwargs: Additional provider-specific parameters
-        
-        Returns:
-            Generated response string
-        """
+    def _response_params(self, **kwargs) -> Dict[str, Any]:
         if not self.history:
             raise ValueError("No messages in history")
         
+        if self.history_manager is not None:
+            tokens = self.history_manager.compact(self.history)
+            self.logger.debug(f"History has {tokens} tokens")
+
         # Check if JSON schema is requested
         last_message = self.history[-1]
         if last_message.get("schema") == "json":
             kwargs["format"] = "json"
+
+        if self.tools:
+            kwargs["tools"] = self.tools
         
         # Merge with default config
-        params = {**self.config, **kwargs}
+        return {**self.config, **kwargs}
+
+    def _record_usage(self, usage: Dict[str, int]):
+        if not usage:
+            return
+        self.last_usage = usage
+        for key, value in usage.items():
+            self.total_usage[key] = self.total_usage.get(key, 0) + value
+            self.metrics.inc(f"llm_{key}_total", value, self.labels)
+        self.logger.info(f"LLM call used {usage['input_tokens']} input tokens "
+                         f"({usage['cached_input_tokens']} cached, {usage['uncached_input_tokens']} uncached) "
+                         f"and {usage['output_tokens']} output tokens")
+
+    def _record_call(self, started: float, error: Optional[Exception] = None):
+        status = "error" if error is not None else "ok"
+        self.metrics.inc("llm_calls_total", 1, {**self.labels, "status": status})
+        self.metrics.observe("llm_duration_seconds", time.perf_counter() - started, self.labels)
+
+    def _cache_key(self, params: Dict[str, Any], use_cache: bool) -> Optional[str]:
+        if self.response_cache is None or not use_cache:
+            return None
+        # Sampled responses are meant to differ between calls; providers
+        # sample unless the temperature is explicitly 0
+        if params.get("temperature") != 0:
+            return None
+        return response_cache_key(self.labels["provider"], self.labels["model"],
+                                  self.system_prompt, self.history, params)
+
+    def _cached_response(self, key: Optional[str], refresh: bool) -> Optional[str]:
+        if key is None or refresh:
+            return None
+        response = self.response_cache.get(key)
+        if response is None:
+            self.metrics.inc("llm_response_cache_misses_total", 1, self.labels)
+            return None
+
+        self.metrics.inc("llm_response_cache_hits_total", 1, self.labels)
+        self.logger.info("LLM response served from cache")
+        self.last_usage = {}
+        if self.tools:
+            # Responses with native tool calls are stored with their calls
+            cached = json.loads(response)
+            self.last_tool_calls = cached["tool_calls"]
+            return cached["text"]
+        return response
+
+    def _store_response(self, key: Optional[str], response: str, tool_calls: List[Dict[str, Any]]):
+        self.last_tool_calls = tool_calls
+        if key is None:
+            return
+        if self.tools:
+            response = json.dumps({"text": response, "tool_calls": tool_calls})
+        self.response_cache.set(key, response, self.response_cache_ttl)
+
+    def _stream(self, params: Dict[str, Any], key: Optional[str] = None) -> Iterator[str]:
+        started = time.perf_counter()
+        chunks = []
+        first = True
+        try:
+            for chunk in self.provider.stream_response(self.history,
+                                                       system_prompt=self.system_prompt,
+                                                       **params):
+                if first:
+                    first = False
+                    self.metrics.observe("llm_time_to_first_token_seconds", time.perf_counter() - started, self.labels)
+                chunks.append(chunk)
+                yield chunk
+        except Exception as e:
+            self._record_call(started, e)
+            raise
+        self._record_call(started)
+        self._record_usage(params["usage"])
+        self._store_response(key, "".join(chunks), params["tool_calls"])
+
+    def response(self,
+                 stream: bool = False,
+                 use_cache: bool = True,
+                 refresh_cache: bool = False,
+                 **kwargs) -> Union[str, Iterator[str]]:
+        """
+        Generate a response based on the conversation history
+        
+        Args:
+            stream: Return an iterator of text chunks instead of the full response
+            use_cache: Whether to use the response cache, if configured. Only calls
+                with a temperature of 0 are cached.
+            refresh_cache: Skip the cache lookup but store the new response,
+                e.g. when the cached response was unusable
+            **kwargs: Additional provider-specific parameters
+        
+        Returns:
+            Generated response string, or an iterator of chunks if stream is set
+        """
+        params = self._response_params(**kwargs)
+        self.last_tool_calls = []
+        key = self._cache_key(params, use_cache)
+        cached = self._cached_response(key, refresh_cache)
+        if cached is not None:
+            return iter([cached]) if stream else cached
+
+        params["usage"] = {}
+        params["tool_calls"] = []
+
+        if stream:
+            return self._stream(params, key)
+
+        started = time.perf_counter()
+        try:
+            response = self.provider.generate_response(self.history,
+                                                       system_prompt=self.system_prompt,
+                                                       **params)
+        except Exception as e:
+            self._record_call(started, e)
+            raise
+        self._record_call(started)
+        self._record_usage(params["usage"])
+        self._store_response(key, response, params["tool_calls"])
+        return response
+
+    async def aresponse(self, use_cache: bool = True, refresh_cache: bool = False, **kwargs) -> str:
+        """
+        Generate a response based on the conversation history without
+        blocking the event loop
         
-        return self.provider.generate_response(self.history,
-                                               system_prompt=self.system_prompt,
-                                               **params)
+        Args:
+            use_cache: Whether to use the response cache, if configured
+            refresh_cache: Skip the cache lookup but store the new response
+            **kwargs: Additional provider-specific parameters
+        
+        Returns:
+            Generated response string
+        """
+        params = self._response_params(**kwargs)
+        self.last_tool_calls = []
+        key = self._cache_key(params, use_cache)
+        cached = self._cached_response(key, refresh_cache)
+        if cached is not None:
+            return cached
+
+        params["usage"] = {}
+        params["tool_calls"] = []
+
+        started = time.perf_counter()
+        try:
+            response = await self.provider.agenerate_response(self.history,
+                                                              system_prompt=self.system_prompt,
+                                                              **params)
+        except Exception as e:
+            self._record_call(started, e)
+            raise
+        self._record_call(started)
+        self._record_usage(params["usage"])
+        self._store_response(key, response, params["tool_calls"])
+        return response
     
     def last_msg(self):
         return self.history[-1]
@@ -0,0 +1,143 @@
+from abc import ABC, abstractmethod
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+import bisect
+import threading
+
+# Latency buckets in seconds, from fast tool cache hits to slow LLM calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class MetricsSink(ABC):
+    """Abstract base class for metrics sinks"""
+
+    @abstractmethod
+    def inc(self, name: str, value: float = 1, labels: Optional[Dict[str, str]] = None):
+        """Increase a counter"""
+        pass
+
+    @abstractmethod
+    def observe(self, name: str, value: float, labels: Optional[Dict[str, str]] = None):
+        """Record a value in a histogram"""
+        pass
+
+
+class NullSink(MetricsSink):
+    """Sink discarding all metrics, used when no sink is configured"""
+
+    def inc(self, name, value=1, labels=None):
+        pass
+
+    def observe(self, name, value, labels=None):
+        pass
+
+
+class PrometheusSink(MetricsSink):
+    """In-memory counters and histograms, exported in the Prometheus text format"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS, prefix: str = "nanoengineer_"):
+        """
+        Initialize the sink.
+
+        Args:
+            buckets (tuple): Upper bounds of the histogram buckets.
+            prefix (str): Prefix of all metric names.
+        """
+        self.buckets = tuple(sorted(buckets))
+        self.prefix = prefix
+        self.counters = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _key(labels):
+        return tuple(sorted((labels or {}).items()))
+
+    def inc(self, name, value=1, labels=None):
+        key = self._key(labels)
+        with self.lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name, value, labels=None):
+        key = self._key(labels)
+        with self.lock:
+            series = self.histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            histogram = series[key]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                histogram["buckets"][index] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    def render(self) -> str:
+        """
+        Render all metrics in the Prometheus text exposition format.
+
+        Returns:
+            str: The metrics.
+        """
+        lines = []
+        with self.lock:
+            for name, series in sorted(self.counters.items()):
+                name = self.prefix + name
+                lines.append(f"# TYPE {name} counter")
+                for key, value in series.items():
+                    lines.append(f"{name}{_labels(key)} {_number(value)}")
+
+            for name, series in sorted(self.histograms.items()):
+                name = self.prefix + name
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in series.items():
+                    cumulative = 0
+                    for bound, count in zip(self.buckets, histogram["buckets"]):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_labels(key, le=_number(bound))} {cumulative}")
+                    lines.append(f"{name}_bucket{_labels(key, le='+Inf')} {histogram['count']}")
+                    lines.append(f"{name}_sum{_labels(key)} {_number(histogram['sum'])}")
+                    lines.append(f"{name}_count{_labels(key)} {histogram['count']}")
+
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+        """
+        Serve the metrics on http://host:port/metrics from a background thread.
+
+        Args:
+            port (int): The port.
+            host (str): The interface to listen on.
+
+        Returns:
+            ThreadingHTTPServer: The running server.
+        """
+        sink = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = sink.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+def _labels(key, **extra):
+    items = list(key) + list(extra.items())
+    if not items:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in items)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
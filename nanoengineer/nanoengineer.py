@@ -1,34 +1,113 @@
 from nanoengineer.llm_interact import LLMInteract
-from prompts import system_prompt, answer_instruction
-import re
+from nanoengineer.parser import ResponseParser, parse_response
+from nanoengineer.cache import BaseResultCache, cache_key
+from nanoengineer.projection import project_result, public_schema, tool_schema
+from nanoengineer.repair import validate_params
+from nanoengineer.metrics import MetricsSink, NullSink
+from nanoengineer.tracing import NullTracer, Tracer, params_hash
+from nanoengineer.singleflight import SingleFlight
+from prompts import system_prompt, native_system_prompt, answer_instruction
 import json
 import logging as lg
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 class NanoEngineer:
-    def __init__(self, llm: LLMInteract, additional_instructions: str=""):
+    def __init__(self, llm: LLMInteract, additional_instructions: str="", max_workers: int=4,
+                 cache: BaseResultCache=None, project_results: bool=True, max_rows: int=20,
+                 metrics: MetricsSink=None, tracer: Tracer=None, executor: ThreadPoolExecutor=None,
+                 native_tools: bool=False, single_flight: SingleFlight=None):
         """
         Initialize NanoEngineer with a given LLM provider.
 
         Args:
             llm (LLMInteract): An instance of LLMInteract.
             additional_instructions (str): Additional instructions to be added to the system prompt.
+            max_workers (int): Maximum number of tools executed concurrently within one response.
+            cache (BaseResultCache): Optional cache for results of cacheable tools.
+            project_results (bool): Whether to project tool results to their return_schema
+                before they are sent to the LLM.
+            max_rows (int): Default maximum number of rows of a projected tool result.
+            metrics (MetricsSink): Optional sink for tool latency, error and retry metrics.
+                Defaults to the sink of the LLMInteract.
+            tracer (Tracer): Optional tracer recording a span timeline of every turn.
+            executor (ThreadPoolExecutor): Optional executor for the tools, e.g. one shared
+                by several sessions. Defaults to a new executor with max_workers threads.
+            native_tools (bool): Whether tools are offered through the provider's native
+                tool calling (Anthropic and OpenAI) instead of <Execute> tags.
+            single_flight (SingleFlight): Optional registry of tool calls in flight, e.g. one
+                shared by several sessions. Identical calls of cacheable tools running at the
+                same time are executed once. Defaults to a new registry.
         """
         self.llm = llm
+        self.max_workers = max_workers
+        self.cache = cache
+        self.project_results = project_results
+        self.max_rows = max_rows
+        self.metrics = metrics or getattr(llm, "metrics", None) or NullSink()
+        self.stats = {"turns": 0, "json_retries": 0, "json_repairs": 0, "tool_calls": {}, "tool_errors": {},
+                      "tool_cache_hits": {}, "tool_coalesced": {}}
+        self.tracer = tracer or NullTracer()
+        self._turn = None
+        self.executor = executor or ThreadPoolExecutor(max_workers=max_workers)
+        self.single_flight = single_flight or SingleFlight()
         self.logger = lg.getLogger(__name__)
         self.logger.info("Initializing NanoEngineer")
 
+        if native_tools and not getattr(llm.provider, "supports_native_tools", False):
+            raise ValueError(f"Provider {llm.labels['provider']} does not support native tool calling")
+        self.native_tools = native_tools
+        # Natively called tools need neither the Execute syntax nor the tool catalog in the prompt
+        base_prompt = native_system_prompt if native_tools else system_prompt
+
         if len(additional_instructions) > 0:
-            full_prompt = f"{system_prompt}\n\nAdditional instructions: {additional_instructions}"
+            full_prompt = f"{base_prompt}\n\nAdditional instructions: {additional_instructions}"
             self.logger.debug(f"Using additional instructions: {additional_instructions}")
         else:
-            full_prompt = system_prompt
+            full_prompt = base_prompt
 
         self.llm.set_system_prompt(full_prompt)
         self.plans = {}
         self.tools = {}
         self.widgets = {}
         self.answer_instruction = None
-        
+        self._catalog = None
+
+    def new_session(self, llm: LLMInteract=None):
+        """
+        Create an engine for a new conversation.
+
+        The new engine shares the registered tools and widgets, the serialized
+        catalog, the system prompt, the provider client, the executor, the
+        caches, the calls in flight, the metrics sink and the tracer with this engine, so only
+        the conversation state (history and plans) is new.
+
+        Args:
+            llm (LLMInteract): Optional LLMInteract of the new conversation,
+                defaults to one sharing this engine's provider client.
+
+        Returns:
+            NanoEngineer: The new engine.
+        """
+        session = NanoEngineer(llm or self.llm.new_session(),
+                               max_workers=self.max_workers,
+                               cache=self.cache,
+                               project_results=self.project_results,
+                               max_rows=self.max_rows,
+                               metrics=self.metrics,
+                               tracer=self.tracer,
+                               executor=self.executor,
+                               native_tools=self.native_tools,
+                               single_flight=self.single_flight)
+        session.llm.set_system_prompt(self.llm.system_prompt)
+        session.llm.set_tools(self.llm.tools)
+        session.tools = self.tools
+        session.widgets = self.widgets
+        session.answer_instruction = self.answer_instruction
+        session._catalog = self._format_catalog()
+        return session
+
     def register_tools(self, tools):
         """
         Register tools with NanoEngineer.
@@ -37,12 +116,19 @@ class NanoEngineer:
             tools (list): A list of tool instances to be registered.
         """
         self.logger.info(f"Registering {len(tools)} tools")
+        # Registries are replaced, not modified, as sessions may share them
+        registry = dict(self.tools)
         for tool in tools:
-            if tool.name in self.tools:
+            if tool.name in registry:
                 self.logger.error(f"Tool {tool.name} already registered")
                 raise Exception(f"Tool {tool.name} already registered")
-            self.tools[tool.name] = tool
+            registry[tool.name] = tool
             self.logger.debug(f"Registered tool: {tool.name}")
+        self.tools = registry
+        self._catalog = None
+
+        if self.native_tools:
+            self.llm.set_tools([tool_schema(t) for t in registry.values()])
 
     def set_answer_instruction(self, answer_instruction):
         """
@@ -61,7 +147,7 @@ class NanoEngineer:
                 "name": t,
                 "description": self.tools[t].description,
                 "params": self.tools[t].params,
-                "return_schema": self.tools[t].return_schema
+                "return_schema": public_schema(self.tools[t].return_schema)
             }
             
             tool_list.append(elem)
@@ -76,94 +162,249 @@ class NanoEngineer:
             widgets (list): A list of widget instances to be registered.
         """
         self.logger.info(f"Registering {len(widgets)} widgets")
+        registry = dict(self.widgets)
         for w in widgets:
-            if w.name in self.widgets:
+            if w.name in registry:
                 self.logger.error(f"Widget {w.name} already registered")
                 raise Exception(f"Widget {w.name} already registered")
-            self.widgets[w.name] = {
+            registry[w.name] = {
                 "name": w.name,
                 "description": w.description,
                 "params": w.params
             }
             self.logger.debug(f"Registered widget: {w.name}")
+        self.widgets = registry
+        self._catalog = None
+
 
+    def _format_catalog(self):
+        # Serialized once per registry, not per conversation
+        if self._catalog is None:
+            # Natively called tools are sent as tool definitions instead
+            catalog = "" if self.native_tools else f"""Tools: {self._format_tools()}\n\n"""
+
+            if len(self.widgets) > 0:
+                catalog += f"Widgets: {json.dumps(self.widgets)}\n\n"
+            self._catalog = catalog
+        return self._catalog
 
     def _format_answer_instruction(self):
         return answer_instruction.format(answer_instruction=self.answer_instruction)
 
-    def send_message(self, message, yield_response=False):
+    def _append_request(self, message):
         """
-        Send a message to NanoEngineer.
+        Append a user message to the history, adding the tool and widget
+        catalog to the first message of a conversation.
 
         Args:
             message (str): The message to be sent.
-            yield_response (bool): Whether to yield the response.
-
-        Returns:
-            str: The response from NanoEngineer.
         """
         self.logger.info("Processing new message")
         self.logger.debug(f"Message content: {message}")
 
         if len(self.llm.history) == 0:
-            msg = f"""Request: {message}\n\nTools: {self._format_tools()}"""
-
-            if len(self.widgets) > 0:
-                msg += f"\n\nWidgets: {json.dumps(self.widgets)}"
-            self.llm.append(msg)
+            # The catalog comes first, so it forms a prefix shared by all
+            # conversations which providers can serve from their prompt cache
+            catalog = self._format_catalog()
+            self.llm.append(f"{catalog}Request: {message}", cache_prefix=len(catalog), kind="catalog")
         else:
             self.llm.append(message)
 
+    def send_message(self, message, yield_response=False, stream=False):
+        """
+        Send a message to NanoEngineer.
+
+        Args:
+            message (str): The message to be sent.
+            yield_response (bool): Whether to yield the response.
+            stream (bool): Whether to stream responses from the LLM. Tools are
+                started as soon as their Execute block is complete and the final
+                response is yielded chunk by chunk instead of as one string.
+
+        Returns:
+            str: The response from NanoEngineer.
+        """
+        with self.tracer.span("send_message", stream=stream) as turn:
+            self._turn = turn
+            yield from self._send_message(message, yield_response, stream)
+
+    def _send_message(self, message, yield_response, stream):
+        self._start_turn(message)
         retries = 0
 
         while True:
-            response = self.llm.response()
-            is_plan, plan = self._is_plan(response)
+            if stream:
+                response, dispatched, streamed = yield from self._stream_response(yield_response)
+            else:
+                response, dispatched, streamed = self._llm_response(), {}, False
+
+            steps, executions = self._parse_response(response)
+            if steps is not None and yield_response and not stream:
+                yield steps
+
+            if executions is not None:
+                retries = self._check_executions(executions, retries)
+                results = self._run_executions(executions, dispatched)
+                self._append_results(response, steps is not None, executions, results)
 
-            if is_plan:
-                self.logger.info(f"Received plan {plan['id']} with {len(plan['steps'])} steps")
-                self.plans[plan["id"]] = plan["steps"]
                 if yield_response:
-                    yield self.plans[plan["id"]]
+                    for execution in executions:
+                        yield execution
+                continue
 
-            is_execution, execution = self._is_execution(response)
+            if self._append_final(response, steps is not None):
+                with self.tracer.span("format_answer", self._turn) as span:
+                    self.llm.append(self._format_answer_instruction())
+                    self.llm.append(self._llm_response(span), "assistant")
 
-            if is_execution:
-                if execution == "json_unparseable":
-                    retries += 1
-                    self.logger.warning(f"JSON parse error, retry {retries}/3")
-                    if retries > 3:
-                        self.logger.error("Max retries reached for JSON parsing")
-                        raise Exception("JSON unparseable")
-                    else:
-                        continue
+            if yield_response and not streamed:
+                yield response
+            break
 
-                self.logger.info(f"Executing tool for plan {execution['plan_id']}")
+    def _stream_response(self, yield_response):
+        """
+        Consume a streamed LLM response, dispatching tools early.
 
-                result = self.execute_tool(execution["content"])
-                self.llm.append(response, "assistant")
-                self.llm.append(result)
+        Every complete Execute block is submitted to the tool executor as soon
+        as its closing tag arrives. A plan is yielded once its closing tag
+        arrives. Once the response turns out to be final (an Answer or Ask
+        without any Execute), the text is yielded chunk by chunk. Native tool
+        calls are complete only with the response, so in native tool calling
+        mode tools start after the stream ends.
 
-                if yield_response:
-                    yield execution
+        Args:
+            yield_response (bool): Whether to yield plans and response chunks.
 
-            if not is_execution:
-                self.llm.append(response, "assistant")
+        Returns:
+            str: The full response.
+            dict: Futures of the dispatched tools, keyed by the offset of their Execute block.
+            bool: True if the response text has been yielded.
+        """
+        parser = ResponseParser()
+        response = ""
+        dispatched = {}
+        plan_seen = False
+        streamed = False
 
-                if self.answer_instruction:
-                    is_answer, answer = self._is_answer(response)
+        with self.tracer.span("llm.response", self._turn, stream=True) as span:
+            for chunk in self.llm.response(stream=True):
+                response += chunk
 
-                    if is_answer:
-                        formatted_answer_instruction = self._format_answer_instruction()
-                        self.llm.append(formatted_answer_instruction)
-                        new_answer = self.llm.response()
-                        self.llm.append(new_answer, "assistant")
+                if streamed:
+                    yield chunk
+                    continue
 
-                if yield_response:
+                for event in parser.feed(chunk):
+                    if event.tag == "Plan" and not plan_seen:
+                        plan_seen = True
+                        if yield_response:
+                            yield event.steps
+
+                    if event.tag == "Execute":
+                        execution = self._execution(event)
+                        # Unusable calls are answered with their error once the response is complete
+                        if "error" in execution:
+                            continue
+                        self.logger.info(f"Dispatching tool {event.data.get('execute_tool')} for step {execution['step']}")
+                        dispatched[execution["offset"]] = \
+                            self.executor.submit(self.execute_tool, execution["content"])
+
+                if yield_response and "Execute" not in parser.seen \
+                        and ("Answer" in parser.seen or "Ask" in parser.seen):
+                    streamed = True
                     yield response
-                break
-        
-        
+
+            span.set(dispatched=len(dispatched), **self.llm.last_usage)
+
+        return response, dispatched, streamed
+
+    async def asend_message(self, message):
+        """
+        Send a message to NanoEngineer without blocking the event loop.
+
+        Yields the same items as send_message with yield_response=True:
+        plan step lists, execution dicts and finally the response string.
+
+        Args:
+            message (str): The message to be sent.
+        """
+        with self.tracer.span("send_message", stream=False) as turn:
+            self._turn = turn
+            async for item in self._asend_message(message):
+                yield item
+
+    async def _asend_message(self, message):
+        self._start_turn(message)
+        retries = 0
+
+        while True:
+            response = await self._allm_response()
+
+            steps, executions = self._parse_response(response)
+            if steps is not None:
+                yield steps
+
+            if executions is not None:
+                retries = self._check_executions(executions, retries)
+                results = await self._arun_executions(executions)
+                self._append_results(response, steps is not None, executions, results)
+
+                for execution in executions:
+                    yield execution
+                continue
+
+            if self._append_final(response, steps is not None):
+                with self.tracer.span("format_answer", self._turn) as span:
+                    self.llm.append(self._format_answer_instruction())
+                    self.llm.append(await self._allm_response(span), "assistant")
+
+            yield response
+            break
+
+    def _start_turn(self, message):
+        self._append_request(message)
+        self.stats["turns"] += 1
+        self.metrics.inc("turns_total")
+
+    def _parse_response(self, response):
+        """
+        Parse a response and register its plan.
+
+        Args:
+            response (str): The response of the LLM.
+
+        Returns:
+            list: The steps of the plan, None if the response has no plan.
+            list: The executions, None if the response has none.
+        """
+        with self.tracer.span("parse", self._turn) as span:
+            is_plan, plan = self._is_plan(response)
+            is_execution, executions = self._executions(response)
+            span.set(plan=is_plan, executions=len(executions) if isinstance(executions, list) else 0)
+
+        steps = None
+        if is_plan:
+            self.logger.info(f"Received plan {plan['id']} with {len(plan['steps'])} steps")
+            steps = self.plans[plan["id"]] = plan["steps"]
+        return steps, executions if is_execution else None
+
+    def _append_final(self, response, is_plan):
+        # Append the final response, True if the answer is to be rewritten following the answer instruction
+        self.llm.append(response, "assistant", kind="plan" if is_plan else None)
+        return bool(self.answer_instruction) and self._is_answer(response)[0]
+
+    def _llm_response(self, parent=None):
+        with self.tracer.span("llm.response", parent or self._turn) as span:
+            response = self.llm.response()
+            span.set(**self.llm.last_usage)
+        return response
+
+    async def _allm_response(self, parent=None):
+        with self.tracer.span("llm.response", parent or self._turn) as span:
+            response = await self.llm.aresponse()
+            span.set(**self.llm.last_usage)
+        return response
+
     def _is_plan(self, response):
         """
         Check if the response contains a plan.
@@ -174,22 +415,9 @@ class NanoEngineer:
         Returns:
             bool: True if the response contains a plan, False otherwise.
         """
-        plan_pattern = r'<Plan id=(\d+)>(.*)</Plan>'
-        step_pattern = r'<(\d+)>(.*?)</\1>'
-        
-        plan_match = re.search(plan_pattern, response, re.DOTALL)
-        
-        if plan_match:
-            plan_id = int(plan_match.group(1))
-            steps_content = plan_match.group(2)
-            steps = []
-
-            for step_match in re.finditer(step_pattern, steps_content):
-                step_num = int(step_match.group(1))
-                step_content = step_match.group(2)
-                steps.append(step_content)
-            
-            return True, {"id": plan_id, "steps": steps}
+        for event in parse_response(response):
+            if event.tag == "Plan" and "id" in event.attrs:
+                return True, {"id": event.attrs["id"], "steps": event.steps}
         
         return False, None
 
@@ -203,23 +431,21 @@ class NanoEngineer:
         Returns:
             bool: True if the response contains an answer, False otherwise.
         """
-        answer_pattern = r'<Answer plan=(\d+) step=(\d+)>(.*)</Answer>'
-        answer_match = re.search(answer_pattern, response, re.DOTALL)
-
-        if answer_match:
-            return True, answer_match
+        for event in parse_response(response):
+            if event.tag == "Answer":
+                return True, event
 
         return False, None
 
-    def execute_tool(self, tool_content):
+    def _get_tool(self, tool_content):
         """
-        Execute a tool.
+        Look up the tool requested by an execution.
 
         Args:
             tool_content (dict): The content of the tool to be executed.
 
         Returns:
-            str: The result of the tool execution.
+            Tool: A new instance of the requested tool.
         """
         tool_name = tool_content["execute_tool"]
         self.logger.info(f"Executing tool: {tool_name}")
@@ -229,39 +455,610 @@ class NanoEngineer:
             self.logger.error(f"Tool {tool_name} not found")
             raise Exception(f"Tool {tool_name} not found")
 
-        tool = self.tools[tool_name]()
-        
+        return self.tools[tool_name]()
+
+    def _cache_key(self, tool, params):
+        """
+        Build the result cache key of a tool call.
+
+        Args:
+            tool (Tool): The tool to be executed.
+            params (dict): The tool parameters.
+
+        Returns:
+            str: The cache key, or None if the result must not be cached.
+        """
+        if self.cache is None or not getattr(tool, "cacheable", False):
+            return None
+        return cache_key(tool.name, params, tool.cache_version())
+
+    def _flight_key(self, tool, params):
+        """
+        Build the key under which identical calls in flight are coalesced.
+
+        Only cacheable tools are coalesced, their results do not depend on
+        who called them.
+
+        Args:
+            tool (Tool): The tool to be executed.
+            params (dict): The tool parameters.
+
+        Returns:
+            str: The key, or None if the call must be executed on its own.
+        """
+        if not getattr(tool, "cacheable", False):
+            return None
+        return cache_key(tool.name, params, tool.cache_version())
+
+    def _record_flight(self, tool, coalesced, span):
+        span.set(coalesced=coalesced)
+        if coalesced:
+            self.logger.debug(f"Coalesced call of tool {tool.name} with an identical call in flight")
+            self._count("tool_coalesced", tool.name)
+
+    def _count(self, stat, tool_name):
+        counts = self.stats[stat]
+        counts[tool_name] = counts.get(tool_name, 0) + 1
+        self.metrics.inc(f"{stat}_total", 1, {"tool": tool_name})
+
+    def _record_tool(self, tool, started, error=False):
+        self.metrics.observe("tool_duration_seconds", time.perf_counter() - started, {"tool": tool.name})
+        self._count("tool_calls", tool.name)
+        if error:
+            self._count("tool_errors", tool.name)
+
+    def _record_json_retry(self):
+        self.stats["json_retries"] += 1
+        self.metrics.inc("json_retries_total")
+
+    def _record_json_repair(self):
+        self.stats["json_repairs"] += 1
+        self.metrics.inc("json_repairs_total")
+
+    def _check_executions(self, executions, retries):
+        """
+        Log the executions of a response, counting one with unusable executions as a retry.
+
+        Args:
+            executions (list): The executions of the response.
+            retries (int): The retries of the turn so far.
+
+        Returns:
+            int: The retries of the turn including this response.
+        """
+        self.logger.info(f"Executing {len(executions)} tool(s) for plan {executions[0]['plan_id']}")
+        invalid = [e for e in executions if "error" in e]
+        if not invalid:
+            return retries
+
+        retries += 1
+        self._record_json_retry()
+        self.logger.warning(f"{len(invalid)} unusable tool call(s), retry {retries}/3: {invalid[0]['error']}")
+        if retries > 3:
+            self.logger.error("Max retries reached for JSON parsing")
+            raise Exception("JSON unparseable")
+        return retries
+
+    @staticmethod
+    def _is_error_result(result):
+        # Tools report most failures as error strings instead of raising
+        return isinstance(result, str) and result.startswith("Error")
+
+    def session_stats(self):
+        """
+        Return the statistics of this session.
+
+        Returns:
+            dict: Turns, JSON retries and repairs, tool calls, errors, cache hits and calls
+                coalesced with identical calls of other sessions per tool and the LLM token usage.
+        """
+        return {**self.stats, "llm_usage": dict(self.llm.total_usage)}
+
+    def _tool_span(self, tool_content):
+        span = self.tracer.span("execute_tool", self._turn)
+        if self.tracer.enabled:
+            span.set(tool=tool_content.get("execute_tool"), params_hash=params_hash(tool_content.get("params")))
+        return span
+
+    def _store_result(self, tool, key, result):
+        if key is not None and tool.is_cacheable_result(result):
+            self.cache.set(key, result, tool.cache_ttl)
+
+    def execute_tool(self, tool_content):
+        """
+        Execute a tool.
+
+        Args:
+            tool_content (dict): The content of the tool to be executed.
+
+        Returns:
+            str: The result of the tool execution, a list of results if params is a list of param sets.
+        """
+        if isinstance(tool_content["params"], list):
+            return self._execute_batch(tool_content)
+
+        with self._tool_span(tool_content) as span:
+            tool = self._get_tool(tool_content)
+            params = tool_content["params"]
+            key = self._cache_key(tool, params)
+            cached = self._cached_result(tool, key, span)
+            if cached is not None:
+                return cached
+
+            flight = self._flight_key(tool, params)
+            if flight is None:
+                tool_result = self._run_tool(tool, params, key)
+            else:
+                tool_result, coalesced = self.single_flight.do(flight, lambda: self._run_tool(tool, params, key))
+                self._record_flight(tool, coalesced, span)
+
+            span.set(cache_hit=False, error=self._is_error_result(tool_result))
+            return tool_result
+
+    def _run_tool(self, tool, params, key):
+        started = time.perf_counter()
+        try:
+            tool_result = tool.execute(params=params)
+        except Exception as e:
+            raise self._tool_failed(tool, started, e)
+        return self._tool_done(tool, started, key, tool_result)
+
+    async def aexecute_tool(self, tool_content):
+        """
+        Execute a tool without blocking the event loop.
+
+        Args:
+            tool_content (dict): The content of the tool to be executed.
+
+        Returns:
+            str: The result of the tool execution, a list of results if params is a list of param sets.
+        """
+        if isinstance(tool_content["params"], list):
+            return await self._aexecute_batch(tool_content)
+
+        with self._tool_span(tool_content) as span:
+            tool = self._get_tool(tool_content)
+            params = tool_content["params"]
+            key = self._cache_key(tool, params)
+            cached = self._cached_result(tool, key, span)
+            if cached is not None:
+                return cached
+
+            flight = self._flight_key(tool, params)
+            if flight is None:
+                tool_result = await self._arun_tool(tool, params, key)
+            else:
+                tool_result, coalesced = await self.single_flight.ado(flight, lambda: self._arun_tool(tool, params, key))
+                self._record_flight(tool, coalesced, span)
+
+            span.set(cache_hit=False, error=self._is_error_result(tool_result))
+            return tool_result
+
+    async def _arun_tool(self, tool, params, key):
+        started = time.perf_counter()
         try:
-            tool_result = tool.execute(params=tool_content["params"])
+            tool_result = await tool.aexecute(params=params)
         except Exception as e:
-            self.logger.error(f"Tool {tool_name} execution failed: {e}")
-            raise Exception(f"Tool {tool_name} execution failed: {e}")
+            raise self._tool_failed(tool, started, e)
+        return self._tool_done(tool, started, key, tool_result)
+
+    def _cached_result(self, tool, key, span):
+        if key is None:
+            return None
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.logger.debug(f"Cache hit for tool {tool.name}")
+            self._count("tool_cache_hits", tool.name)
+            span.set(cache_hit=True)
+        return cached
+
+    def _tool_failed(self, tool, started, error, batch=False):
+        # The exception to raise for a tool which raised instead of returning an error string
+        self._record_tool(tool, started, error=True)
+        self.logger.error(f"Tool {tool.name} {'batch ' if batch else ''}execution failed: {error}")
+        return Exception(f"Tool {tool.name} execution failed: {error}")
+
+    def _tool_done(self, tool, started, key, tool_result):
+        self._record_tool(tool, started, error=self._is_error_result(tool_result))
+        self._store_result(tool, key, tool_result)
         return tool_result
 
+    def _cached_batch(self, tool_content, span):
+        """
+        Look up the cached results of a batch.
+
+        Args:
+            tool_content (dict): The content of the tool, params being a list of param sets.
+            span (Span): The span of the execution.
+
+        Returns:
+            Tool: The tool to be executed.
+            list: The cache key of each param set.
+            list: The cached result of each param set, None for misses.
+            list: The indices of the param sets to be executed.
+        """
+        tool = self._get_tool(tool_content)
+        params_list = tool_content["params"]
+        keys = [self._cache_key(tool, params) for params in params_list]
+        results = [self.cache.get(key) if key is not None else None for key in keys]
+        misses = [i for i, r in enumerate(results) if r is None]
+        for _ in range(len(params_list) - len(misses)):
+            self._count("tool_cache_hits", tool.name)
+        span.set(batch_size=len(params_list), cache_hits=len(params_list) - len(misses))
+        return tool, keys, results, misses
+
+    def _finish_batch(self, tool, started, keys, results, misses, batch, span):
+        if len(batch) != len(misses):
+            self._record_tool(tool, started, error=True)
+            raise Exception(f"Tool {tool.name} returned {len(batch)} results for {len(misses)} param sets")
+
+        for i, result in zip(misses, batch):
+            results[i] = result
+            self._store_result(tool, keys[i], result)
+
+        error = any(self._is_error_result(r) for r in batch)
+        self._record_tool(tool, started, error=error)
+        span.set(error=error)
+
+    def _execute_batch(self, tool_content):
+        """
+        Execute a tool for a list of param sets with one call of its execute_batch.
+
+        Cached param sets are not executed again.
+
+        Args:
+            tool_content (dict): The content of the tool, params being a list of param sets.
+
+        Returns:
+            list: The results, in the order of the param sets.
+        """
+        with self._tool_span(tool_content) as span:
+            tool, keys, results, misses = self._cached_batch(tool_content, span)
+            if not misses:
+                return results
+
+            started = time.perf_counter()
+            try:
+                batch = tool.execute_batch([tool_content["params"][i] for i in misses])
+            except Exception as e:
+                raise self._tool_failed(tool, started, e, batch=True)
+
+            self._finish_batch(tool, started, keys, results, misses, batch, span)
+            return results
+
+    async def _aexecute_batch(self, tool_content):
+        with self._tool_span(tool_content) as span:
+            tool, keys, results, misses = self._cached_batch(tool_content, span)
+            if not misses:
+                return results
+
+            started = time.perf_counter()
+            try:
+                batch = await tool.aexecute_batch([tool_content["params"][i] for i in misses])
+            except Exception as e:
+                raise self._tool_failed(tool, started, e, batch=True)
+
+            self._finish_batch(tool, started, keys, results, misses, batch, span)
+            return results
+
+    def _run_executions(self, executions, dispatched=None):
+        """
+        Execute the usable executions of a response; unusable ones get their
+        error as result, so the model can correct exactly these calls.
+
+        Args:
+            executions (list): The executions of the response.
+            dispatched (dict): Futures of tools already dispatched while streaming,
+                keyed by the offset of their Execute block.
+
+        Returns:
+            list: The results, in the order of executions.
+        """
+        dispatched = dispatched or {}
+        pending = [e for e in executions if "error" not in e and e.get("offset") not in dispatched]
+        results = iter(self.execute_tools([e["content"] for e in pending]) if pending else [])
+
+        return [
+            f"Error: {e['error']}" if "error" in e
+            else dispatched[e["offset"]].result() if e.get("offset") in dispatched
+            else next(results)
+            for e in executions
+        ]
+
+    async def _arun_executions(self, executions):
+        pending = [e for e in executions if "error" not in e]
+        results = iter(await self.aexecute_tools([e["content"] for e in pending]) if pending else [])
+        return [f"Error: {e['error']}" if "error" in e else next(results) for e in executions]
+
+    def execute_tools(self, tool_contents):
+        """
+        Execute several independent tools concurrently.
+
+        Args:
+            tool_contents (list): The contents of the tools to be executed.
+
+        Returns:
+            list: The results of the tool executions, in the order of tool_contents.
+        """
+        merged = self._merge_batches(tool_contents)
+        contents = [content for content, _ in merged]
+        if len(contents) == 1:
+            outputs = [self.execute_tool(contents[0])]
+        else:
+            outputs = list(self.executor.map(self.execute_tool, contents))
+        return self._split_batches(merged, outputs, len(tool_contents))
+
+    async def aexecute_tools(self, tool_contents):
+        """
+        Execute several independent tools concurrently on the event loop.
+
+        Args:
+            tool_contents (list): The contents of the tools to be executed.
+
+        Returns:
+            list: The results of the tool executions, in the order of tool_contents.
+        """
+        semaphore = asyncio.Semaphore(self.max_workers)
+
+        async def run(tool_content):
+            async with semaphore:
+                return await self.aexecute_tool(tool_content)
+
+        merged = self._merge_batches(tool_contents)
+        outputs = await asyncio.gather(*(run(content) for content, _ in merged))
+        return self._split_batches(merged, outputs, len(tool_contents))
+
+    def _merge_batches(self, tool_contents):
+        """
+        Merge the executions of each batched tool into a single batch.
+
+        Args:
+            tool_contents (list): The contents of the tools to be executed.
+
+        Returns:
+            list: (tool_content, members) pairs. Members map the results of a merged
+                batch back to tool_contents as (index, count) pairs, count being None
+                for a single param set; other executions keep their index as members.
+        """
+        merged = []
+        batches = {}
+        for i, content in enumerate(tool_contents):
+            tool = self.tools.get(content.get("execute_tool"))
+            if tool is None or not getattr(tool, "batched", False):
+                merged.append((content, i))
+                continue
+
+            if tool.name not in batches:
+                batches[tool.name] = ({"execute_tool": tool.name, "params": []}, [])
+                merged.append(batches[tool.name])
+            batch, members = batches[tool.name]
+            params = content["params"]
+            if isinstance(params, list):
+                batch["params"].extend(params)
+                members.append((i, len(params)))
+            else:
+                batch["params"].append(params)
+                members.append((i, None))
+
+        # A batched tool requested once is executed as requested
+        return [(tool_contents[members[0][0]], members[0][0])
+                if isinstance(members, list) and len(members) == 1 else (content, members)
+                for content, members in merged]
+
+    @staticmethod
+    def _split_batches(merged, outputs, size):
+        results = [None] * size
+        for (_, members), output in zip(merged, outputs):
+            if not isinstance(members, list):
+                results[members] = output
+                continue
+
+            position = 0
+            for i, count in members:
+                if count is None:
+                    results[i] = output[position]
+                    position += 1
+                else:
+                    results[i] = output[position:position + count]
+                    position += count
+        return results
+
+    def _append_results(self, response, is_plan, executions, results):
+        """
+        Append a response with executions and the results of its tools to the history.
+
+        Args:
+            response (str): The response requesting the executions.
+            is_plan (bool): Whether the response contains a plan.
+            executions (list): The executions of the response.
+            results (list): The results of the tool executions.
+        """
+        tool_calls = [e["call"] for e in executions] if self.native_tools else None
+        self.llm.append(response, "assistant", kind="plan" if is_plan else None, tool_calls=tool_calls)
+
+        with self.tracer.span("format_results", self._turn, results=len(results)):
+            if self.project_results:
+                results = [self._project(e["content"], r) for e, r in zip(executions, results)]
+            results = [self._format_batch(e["content"], r) if isinstance(r, list) else r
+                       for e, r in zip(executions, results)]
+
+            # Native tool calls are answered one by one, the message content
+            # is kept for the history manager
+            tool_results = None
+            if self.native_tools:
+                tool_results = [{"id": e["call"]["id"], "content": r} for e, r in zip(executions, results)]
+            self.llm.append(self._format_results(executions, results), kind="tool_result", tool_results=tool_results)
+
+    def _format_results(self, executions, results):
+        """
+        Combine tool results into a single message for the LLM.
+
+        Args:
+            executions (list): The executions the results belong to.
+            results (list): The projected results of the tool executions.
+
+        Returns:
+            str: The combined message.
+        """
+        if len(results) == 1:
+            return results[0]
+
+        return "\n\n".join(
+            f"Result plan={e['plan_id']} step={e['step']}:\n{r}"
+            for e, r in zip(executions, results)
+        )
+
+    @staticmethod
+    def _format_batch(tool_content, results):
+        # Label the result of each param set of a batched execution with its params
+        return "\n\n".join(
+            f"Result for {json.dumps(params, ensure_ascii=False)}:\n{result}"
+            for params, result in zip(tool_content["params"], results)
+        )
+
+    def _project(self, tool_content, result):
+        """
+        Project a tool result to the columns of the tool's return_schema.
+
+        Args:
+            tool_content (dict): The content of the executed tool.
+            result (str): The result of the tool execution.
+
+        Returns:
+            str: The projected result, a list of projected results for a batched execution.
+        """
+        tool = self.tools.get(tool_content.get("execute_tool"))
+        if tool is None:
+            return result
+        schema = getattr(tool, "return_schema", None)
+        if isinstance(result, list):
+            return [project_result(r, schema, max_rows=self.max_rows) for r in result]
+        return project_result(result, schema, max_rows=self.max_rows)
+
     def _is_execution(self, response):
         """
-        Check if the response contains an execution.
+        Check if the response contains one or more executions.
+
+        Malformed JSON payloads are repaired by the parser. Executions which
+        still cannot be used carry an "error" describing the problem.
 
         Args:
             response (str): The response to be checked.
 
         Returns:
             bool: True if the response contains an execution, False otherwise.
-            dict: The execution content if the response contains an execution, None otherwise.
+            list: The executions sorted by step if the response contains executions, None otherwise.
         """
-        execution_pattern = r'<Execute plan=(\d+) step=(\d+)>(.*)</Execute>'
-        execution_match = re.search(execution_pattern, response, re.DOTALL)
+        executions = []
 
-        if execution_match:
-            plan_id = int(execution_match.group(1))
-            step = int(execution_match.group(2))
-            execution_content = execution_match.group(3)
+        for event in parse_response(response):
+            if event.tag != "Execute":
+                continue
 
-            try:
-                execution_content = json.loads(execution_content)
-            except:
-                return True, "json_unparseable"
+            if event.repaired:
+                self._record_json_repair()
+
+            executions.append(self._execution(event))
 
-            return True, {"plan_id": plan_id, "content": execution_content}
+        if executions:
+            executions.sort(key=lambda e: (e["plan_id"], e["step"]))
+            return True, executions
 
         return False, None
+
+    def _executions(self, response):
+        """
+        Return the executions requested by a response, read from its native
+        tool calls or its Execute tags.
+
+        Args:
+            response (str): The response text.
+
+        Returns:
+            bool: True if the response requests executions, False otherwise.
+            list: The executions sorted by step, or None.
+        """
+        if not self.native_tools:
+            return self._is_execution(response)
+
+        calls = self.llm.last_tool_calls
+        if not calls:
+            return False, None
+
+        executions = []
+        for call in calls:
+            if call.get("repaired"):
+                self._record_json_repair()
+
+            params = dict(call["input"])
+            plan_id = params.pop("plan", 0)
+            step = params.pop("step", 0)
+            execution = {"plan_id": plan_id, "step": step,
+                         "content": {"execute_tool": call["name"], "params": params}, "call": call}
+            if "error" in call:
+                execution["error"] = f"{call['error']}. Call the tool again with valid JSON arguments."
+            else:
+                self._validate(execution)
+            executions.append(execution)
+
+        executions.sort(key=lambda e: (e["plan_id"], e["step"]))
+        return True, executions
+
+    def _execution(self, event):
+        plan_id = event.attrs.get("plan", 0)
+        step = event.attrs.get("step", 0)
+        # The offset identifies the block, plan and step may repeat within a response
+        execution = {"plan_id": plan_id, "step": step, "content": event.data, "offset": event.start}
+
+        if event.error is not None:
+            execution["content"] = {"execute_tool": None, "params": {}}
+            execution["error"] = (f"The payload of <Execute plan={plan_id} step={step}> is not valid JSON ({event.error}). "
+                                  f'Resend this step as <Execute plan={plan_id} step={step}>'
+                                  f'{{"execute_tool": "<tool name>", "params": {{...}}}}</Execute>.')
+        else:
+            self._validate(execution)
+        return execution
+
+    def _validate(self, execution):
+        """
+        Validate an execution against the params of its tool.
+
+        The content is replaced by the validated copy with converted param
+        values; parsed payloads are shared by the parse cache and must not be
+        modified. Problems are described in execution["error"].
+
+        Args:
+            execution (dict): The execution.
+        """
+        content = execution["content"]
+        if not isinstance(content, dict) or not isinstance(content.get("execute_tool"), str):
+            execution["content"] = {"execute_tool": None, "params": {}}
+            execution["error"] = ('The payload of an execution must be a JSON object '
+                                  '{"execute_tool": "<tool name>", "params": {...}}.')
+            return
+
+        name = content["execute_tool"]
+        params = content.get("params")
+        if params is None:
+            # Params written next to execute_tool instead of inside params
+            params = {k: v for k, v in content.items() if k != "execute_tool"}
+
+        tool = self.tools.get(name)
+        if tool is None:
+            execution["content"] = {"execute_tool": name, "params": params}
+            execution["error"] = f"Unknown tool {name}. Available tools: {', '.join(self.tools)}."
+            return
+
+        if isinstance(params, list):
+            # A batch, one param set per entity
+            validated = [validate_params(tool.params, p) for p in params]
+            params = [p for p, _ in validated]
+            problems = [f"param set {i}: {problem}" for i, (_, found) in enumerate(validated) for problem in found]
+            if not params:
+                problems = ["params must not be an empty list"]
+        else:
+            params, problems = validate_params(tool.params, params)
+        execution["content"] = {"execute_tool": name, "params": params}
+        if problems:
+            execution["error"] = (f"Invalid params for tool {name}: {'; '.join(problems)}. "
+                                  f"Expected params: {json.dumps(tool.params)}.")
@@ -0,0 +1,218 @@
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple
+import re
+import json
+from nanoengineer.repair import repair_json
+
+TAGS = ("Plan", "Execute", "Ask", "Message", "Answer", "Widget",
+        "FormattedAnswer", "FormattedMessage")
+
+# Tags whose content is a JSON payload
+JSON_TAGS = ("Execute", "Widget")
+
+TAG_PATTERN = re.compile(
+    r'<(/?)(' + "|".join(TAGS) + r')((?:\s+\w+=(?:"[^"]*"|[^\s>]+))*)\s*>'
+)
+ATTR_PATTERN = re.compile(r'(\w+)=(?:"([^"]*)"|([^\s>]+))')
+STEP_PATTERN = re.compile(r'<(\d+)>(.*?)</\1>', re.DOTALL)
+
+# Longest possible tag prefix we have to wait for before deciding a "<" is plain text
+MAX_TAG_LENGTH = 256
+
+
+@dataclass
+class Event:
+    """A complete tag of the response protocol.
+
+    Attributes:
+        tag: Tag name, e.g. "Execute", or "Error" for protocol errors.
+        attrs: Tag attributes, numeric values converted to int.
+        content: Raw content between the opening and closing tag.
+        text: Content without nested tags, e.g. an Answer without its Widgets.
+        data: Parsed JSON payload of Execute and Widget tags.
+        steps: Plan steps of Plan tags.
+        error: Description of the error for unparseable payloads and Error events.
+        repaired: True if the JSON payload was malformed and repaired locally.
+        start: Offset of the opening tag in the response.
+        end: Offset after the closing tag in the response.
+    """
+    tag: str
+    attrs: Dict[str, Any] = field(default_factory=dict)
+    content: str = ""
+    text: str = ""
+    data: Any = None
+    steps: Optional[List[str]] = None
+    error: Optional[str] = None
+    repaired: bool = False
+    start: int = 0
+    end: int = 0
+
+
+class ResponseParser:
+    """Incremental single-pass tokenizer for the Plan/Execute/Answer/Ask/Widget protocol.
+
+    Chunks are passed to feed() as they arrive; every call returns the events
+    of the tags closed by the chunk. close() flushes errors for unclosed tags.
+    Each character of the response is scanned once.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0
+        self.stack = []
+        self.seen = set()
+
+    def feed(self, chunk: str) -> List[Event]:
+        """
+        Add a chunk of the response.
+
+        Args:
+            chunk (str): The next chunk of the response.
+
+        Returns:
+            list: Events for tags closed by this chunk.
+        """
+        self.buffer += chunk
+        events = []
+
+        while True:
+            lt = self.buffer.find("<", self.pos)
+            if lt == -1:
+                self.pos = len(self.buffer)
+                break
+
+            match = TAG_PATTERN.match(self.buffer, lt)
+            if match is None:
+                if self._incomplete(lt):
+                    self.pos = lt
+                    break
+                self.pos = lt + 1
+                continue
+
+            self.pos = match.end()
+            closing, tag, attrs = match.group(1), match.group(2), match.group(3)
+
+            if not closing:
+                self.seen.add(tag)
+                self.stack.append({
+                    "tag": tag,
+                    "attrs": _parse_attrs(attrs),
+                    "start": lt,
+                    "content_start": match.end(),
+                    "children": []
+                })
+                continue
+
+            events.extend(self._close(tag, lt, match.end()))
+
+        return events
+
+    def close(self) -> List[Event]:
+        """
+        Finish the response.
+
+        Returns:
+            list: Error events for tags which were never closed.
+        """
+        events = []
+        while self.stack:
+            frame = self.stack.pop()
+            events.append(Event(tag="Error",
+                                error=f"Unclosed tag <{frame['tag']}>",
+                                start=frame["start"],
+                                end=len(self.buffer)))
+        return events
+
+    def _incomplete(self, lt: int) -> bool:
+        # A "<" at the end of the buffer may still become a tag with the next chunk
+        tail = self.buffer[lt:]
+        if len(tail) > MAX_TAG_LENGTH or ">" in tail:
+            return False
+        name = tail.lstrip("</")
+        return any(t.startswith(name[:len(t)]) for t in TAGS)
+
+    def _close(self, tag: str, start: int, end: int) -> List[Event]:
+        events = []
+
+        if not any(frame["tag"] == tag for frame in self.stack):
+            return [Event(tag="Error", error=f"Unexpected closing tag </{tag}>", start=start, end=end)]
+
+        while self.stack[-1]["tag"] != tag:
+            frame = self.stack.pop()
+            events.append(Event(tag="Error",
+                                error=f"Unclosed tag <{frame['tag']}> inside <{tag}>",
+                                start=frame["start"],
+                                end=start))
+
+        frame = self.stack.pop()
+        event = self._build(frame, start, end)
+        if self.stack:
+            self.stack[-1]["children"].append(event)
+        events.append(event)
+        return events
+
+    def _build(self, frame: Dict[str, Any], close_start: int, end: int) -> Event:
+        content = self.buffer[frame["content_start"]:close_start]
+
+        text_parts = []
+        cursor = frame["content_start"]
+        for child in frame["children"]:
+            text_parts.append(self.buffer[cursor:child.start])
+            cursor = child.end
+        text_parts.append(self.buffer[cursor:close_start])
+
+        event = Event(tag=frame["tag"],
+                      attrs=frame["attrs"],
+                      content=content,
+                      text="".join(text_parts).strip(),
+                      start=frame["start"],
+                      end=end)
+
+        if event.tag in JSON_TAGS:
+            try:
+                event.data = json.loads(content)
+            except ValueError as e:
+                # Trailing commas, single quotes, code fences etc. are fixed locally
+                try:
+                    event.data = repair_json(content)
+                    event.repaired = True
+                except ValueError:
+                    event.error = f"Unparseable JSON in <{event.tag}>: {e}"
+
+        if event.tag == "Plan":
+            event.steps = [m.group(2) for m in STEP_PATTERN.finditer(content)]
+
+        return event
+
+
+def _parse_attrs(attrs: str) -> Dict[str, Any]:
+    parsed = {}
+    for match in ATTR_PATTERN.finditer(attrs):
+        value = match.group(2) if match.group(2) is not None else match.group(3)
+        parsed[match.group(1)] = int(value) if value.isdigit() else value
+    return parsed
+
+
+@lru_cache(maxsize=1024)
+def _parse_cached(response: str) -> Tuple[Event, ...]:
+    parser = ResponseParser()
+    events = parser.feed(response)
+    events.extend(parser.close())
+    return tuple(events)
+
+
+def parse_response(response: str) -> Tuple[Event, ...]:
+    """
+    Parse a complete response into events, in the order their tags close.
+
+    Results are cached, so parsing the same response again is free. The
+    returned events are shared and must not be modified.
+
+    Args:
+        response (str): The response to be parsed.
+
+    Returns:
+        tuple: The events of the response.
+    """
+    return _parse_cached(response)
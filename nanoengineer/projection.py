@@ -0,0 +1,184 @@
+from typing import List, Dict, Any, Optional
+import csv
+import io
+import json
+from nanoengineer.history import estimate_tokens
+
+# Keys of a return_schema which describe the projection and are not shown to the LLM
+PROJECTION_KEYS = ("records", "sources", "max_rows", "float_digits")
+
+
+def public_schema(schema: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Return the part of a return_schema which is shown to the LLM"""
+    if not isinstance(schema, dict):
+        return schema
+    return {k: v for k, v in schema.items() if k not in PROJECTION_KEYS}
+
+
+# JSON schema types of tool params, other types are passed as strings
+PARAM_TYPES = ("string", "number", "integer", "boolean", "array", "object")
+
+
+def tool_schema(tool) -> Dict[str, Any]:
+    """
+    Build the provider-neutral schema of a tool for native tool calling.
+
+    The tool's params become a JSON schema; params with optional "no" are
+    required. Every call also names the plan and step it belongs to. The
+    return_schema is appended to the description, as native tool
+    definitions have no field for it.
+
+    Args:
+        tool (Tool): The tool class or instance.
+
+    Returns:
+        dict: The schema with name, description and parameters.
+    """
+    properties = {
+        "plan": {"type": "integer", "description": "Id of the plan the call belongs to"},
+        "step": {"type": "integer", "description": "Step of the plan the call belongs to"}
+    }
+    required = ["plan", "step"]
+    for name, param in (tool.params or {}).items():
+        param_type = param.get("type", "string")
+        properties[name] = {
+            "type": param_type if param_type in PARAM_TYPES else "string",
+            "description": param.get("description", "")
+        }
+        if param.get("optional") == "no":
+            required.append(name)
+
+    description = tool.description
+    returns = public_schema(tool.return_schema)
+    if returns:
+        description += f"\nReturns: {json.dumps(returns)}"
+
+    return {
+        "name": tool.name,
+        "description": description,
+        "parameters": {"type": "object", "properties": properties, "required": required}
+    }
+
+
+def project_result(result: str,
+                   schema: Optional[Dict[str, Any]],
+                   max_rows: int = 20,
+                   float_digits: int = 4) -> str:
+    """
+    Project a tool result to the columns of the tool's return_schema.
+
+    The result is parsed as CSV or JSON according to schema["type"]. Records
+    are taken from schema["records"] (a dotted path, e.g. "features") or the
+    top level, columns are read from schema["sources"] (column to dotted path,
+    e.g. "geometry.coordinates.1") or the column name. Rows are capped at
+    max_rows, floats rounded to float_digits and the result is encoded as CSV
+    or compact JSON, whichever needs fewer tokens. Results which cannot be
+    parsed, e.g. error messages, are returned unchanged.
+
+    Args:
+        result (str): The tool result.
+        schema (dict): The tool's return_schema.
+        max_rows (int): Default row cap, overridden by schema["max_rows"].
+        float_digits (int): Default float precision, overridden by schema["float_digits"].
+
+    Returns:
+        str: The projected result.
+    """
+    if not isinstance(result, str) or not isinstance(schema, dict) or not schema.get("columns"):
+        return result
+
+    records = _records(result, schema)
+    if not records:
+        return result
+
+    max_rows = schema.get("max_rows", max_rows)
+    float_digits = schema.get("float_digits", float_digits)
+    sources = schema.get("sources", {})
+
+    rows = []
+    for record in records[:max_rows]:
+        rows.append({
+            column: _round(_lookup(record, sources.get(column, column)), float_digits)
+            for column in schema["columns"]
+        })
+
+    # Columns missing in every record are not part of this result
+    columns = [c for c in schema["columns"] if any(row[c] is not None for row in rows)]
+    if not columns:
+        return result
+    omitted = max(0, len(records) - max_rows)
+
+    encoded = [_encode_csv(rows, columns, omitted), _encode_json(rows, columns, omitted)]
+    return min(encoded, key=estimate_tokens)
+
+
+def _records(result: str, schema: Dict[str, Any]) -> Optional[List[Any]]:
+    if schema.get("type") == "csv":
+        try:
+            return list(csv.DictReader(io.StringIO(result)))
+        except csv.Error:
+            return None
+
+    try:
+        data = json.loads(result)
+    except ValueError:
+        return None
+
+    if schema.get("records"):
+        data = _lookup(data, schema["records"])
+    elif isinstance(data, dict) and len(data) == 1:
+        # Results wrapped in a single key, e.g. {"weather": [...]}
+        data = next(iter(data.values()))
+
+    if isinstance(data, dict):
+        data = [data]
+    if not isinstance(data, list):
+        return None
+    return data
+
+
+def _lookup(value: Any, path: str) -> Any:
+    for key in path.split("."):
+        if isinstance(value, dict):
+            value = value.get(key)
+        elif isinstance(value, list) and key.isdigit() and int(key) < len(value):
+            value = value[int(key)]
+        else:
+            return None
+    return value
+
+
+def _round(value: Any, digits: int) -> Any:
+    if isinstance(value, float):
+        return round(value, digits)
+    if isinstance(value, str):
+        # CSV values are strings, round numeric ones with a fractional part
+        try:
+            number = float(value)
+        except ValueError:
+            return value
+        if "." in value and "e" not in value.lower():
+            return str(round(number, digits))
+    return value
+
+
+def _encode_csv(rows: List[Dict[str, Any]], columns: List[str], omitted: int) -> str:
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator="\n")
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow([
+            json.dumps(row[c], separators=(",", ":")) if isinstance(row[c], (list, dict)) else
+            ("" if row[c] is None else row[c])
+            for c in columns
+        ])
+    if omitted:
+        out.write(f"({omitted} more rows omitted)\n")
+    return out.getvalue()
+
+
+def _encode_json(rows: List[Dict[str, Any]], columns: List[str], omitted: int) -> str:
+    data = {"columns": columns, "rows": [[row[c] for c in columns] for row in rows]}
+    if omitted:
+        data["omitted_rows"] = omitted
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
@@ -0,0 +1,206 @@
+from typing import Any, Dict, List, Optional, Tuple
+import json
+import re
+
+FENCE_PATTERN = re.compile(r"^\s*```[\w-]*[ \t]*\n?(.*?)(?:\n?[ \t]*```\s*)?$", re.DOTALL)
+NUMBER_PATTERN = re.compile(r"[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?")
+INTEGER_PATTERN = re.compile(r"[+-]?\d+$")
+IDENTIFIER_PATTERN = re.compile(r"[^\W\d][\w$-]*")
+
+# Bare words which are JSON literals, including their Python spelling
+LITERALS = {"true": "true", "false": "false", "null": "null",
+            "True": "true", "False": "false", "None": "null"}
+ESCAPES = {"b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+def repair_json(text: str) -> Any:
+    """
+    Parse JSON written by an LLM, repairing its common mistakes.
+
+    Handles markdown code fences, single-quoted strings, unquoted keys,
+    Python literals (True, None), trailing commas and missing closing
+    brackets or braces after complete values. A value cut off by the end
+    of the text, e.g. an unterminated string, is rejected, as running a
+    tool with a truncated argument is worse than asking again. Text after
+    the first complete value is ignored.
+
+    Args:
+        text (str): The malformed JSON.
+
+    Returns:
+        Any: The parsed value.
+
+    Raises:
+        ValueError: If the text cannot be repaired.
+    """
+    fenced = FENCE_PATTERN.match(text)
+    if fenced and text.lstrip().startswith("```"):
+        text = fenced.group(1)
+
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    if not starts:
+        raise ValueError("No JSON object found")
+
+    out = []
+    stack = []
+    i = min(starts)
+    n = len(text)
+
+    while i < n:
+        c = text[i]
+
+        if c in "\"'":
+            value, end, closed = _read_string(text, i)
+            if not closed:
+                raise ValueError(f"Unterminated string at position {i}")
+            out.append(json.dumps(value))
+            i = end
+            continue
+
+        if c in "{[":
+            stack.append("}" if c == "{" else "]")
+            out.append(c)
+        elif c in "}]":
+            _strip_comma(out)
+            if stack:
+                out.append(stack.pop())
+            if not stack:
+                break
+        elif c in ",:":
+            out.append(c)
+        elif c.isspace():
+            pass
+        else:
+            number = NUMBER_PATTERN.match(text, i)
+            word = IDENTIFIER_PATTERN.match(text, i)
+            if (number or word) and (number or word).end() == n:
+                raise ValueError(f"Truncated value at position {i}")
+            if number:
+                token = number.group().lstrip("+")
+                out.append(str(int(token)) if INTEGER_PATTERN.match(token) else json.dumps(float(token)))
+                i = number.end()
+                continue
+            if word:
+                out.append(LITERALS.get(word.group()) or json.dumps(word.group()))
+                i = word.end()
+                continue
+            raise ValueError(f"Unexpected character {c!r} at position {i}")
+        i += 1
+
+    # Close the brackets and braces of complete values truncated by the end of the response
+    if out and out[-1] == ":":
+        raise ValueError("Missing value at the end")
+    _strip_comma(out)
+    out.extend(reversed(stack))
+
+    try:
+        return json.loads("".join(out))
+    except ValueError as e:
+        raise ValueError(f"Unrepairable JSON: {e}")
+
+
+def _read_string(text: str, i: int) -> Tuple[str, int, bool]:
+    quote = text[i]
+    chars = []
+    j = i + 1
+    n = len(text)
+    while j < n:
+        c = text[j]
+        if c == "\\" and j + 1 < n:
+            escaped = text[j + 1]
+            if escaped == "u" and j + 6 <= n:
+                try:
+                    chars.append(chr(int(text[j + 2:j + 6], 16)))
+                    j += 6
+                    continue
+                except ValueError:
+                    pass
+            chars.append(ESCAPES.get(escaped, escaped))
+            j += 2
+            continue
+        if c == quote:
+            return "".join(chars), j + 1, True
+        chars.append(c)
+        j += 1
+    return "".join(chars), n, False
+
+
+def _strip_comma(out: List[str]):
+    if out and out[-1] == ",":
+        out.pop()
+
+
+def validate_params(schema: Optional[Dict[str, Dict[str, Any]]],
+                    params: Any) -> Tuple[Any, List[str]]:
+    """
+    Validate tool params against the tool's params schema.
+
+    Required params (optional "no") must be present. Values are converted
+    to the declared type where this is lossless, e.g. "51.5" to a number.
+    Params not in the schema are passed on unchanged.
+
+    Args:
+        schema (dict): The tool's params.
+        params (dict): The params of the call.
+
+    Returns:
+        dict: The params with converted values.
+        list: Descriptions of the problems, empty if the params are valid.
+    """
+    if not isinstance(params, dict):
+        return params, ["params must be a JSON object"]
+
+    validated = dict(params)
+    problems = []
+    for name, spec in (schema or {}).items():
+        if params.get(name) in (None, ""):
+            if spec.get("optional") == "no":
+                problems.append(f"missing required param {name}")
+            continue
+
+        param_type = spec.get("type", "string")
+        value, valid = _coerce(params[name], param_type)
+        if valid:
+            validated[name] = value
+        else:
+            problems.append(f"param {name} must be a {param_type}, got {json.dumps(params[name])}")
+
+    return validated, problems
+
+
+def _coerce(value: Any, param_type: str) -> Tuple[Any, bool]:
+    if param_type == "string":
+        if isinstance(value, str):
+            return value, True
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return str(value), True
+        return value, False
+
+    if param_type in ("number", "integer"):
+        if isinstance(value, bool):
+            return value, False
+        if isinstance(value, str):
+            try:
+                value = float(value.strip())
+            except ValueError:
+                return value, False
+        if not isinstance(value, (int, float)):
+            return value, False
+        if param_type == "integer":
+            return (int(value), True) if float(value).is_integer() else (value, False)
+        return value, True
+
+    if param_type == "boolean":
+        if isinstance(value, bool):
+            return value, True
+        if isinstance(value, str) and value.lower() in ("true", "false"):
+            return value.lower() == "true", True
+        return value, False
+
+    if param_type == "array":
+        return value, isinstance(value, list)
+
+    if param_type == "object":
+        return value, isinstance(value, dict)
+
+    return value, True
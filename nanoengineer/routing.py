@@ -0,0 +1,407 @@
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+import asyncio
+import logging as lg
+import queue
+import threading
+import time
+from nanoengineer.llm_interact import BaseLLMProvider
+from nanoengineer.metrics import MetricsSink, NullSink
+
+
+class LLMUnavailableError(Exception):
+    """Raised when no provider returned a response before the deadline"""
+    pass
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Check whether another provider should be tried after an error.
+
+    Timeouts, connection errors, 429 and 5xx responses are retryable; other
+    errors, e.g. an invalid request, would fail with every provider.
+
+    Args:
+        error (Exception): The error of a provider call.
+
+    Returns:
+        bool: True if the call should fail over.
+    """
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    # SDK and httpx errors, e.g. APITimeoutError, APIConnectionError, ConnectError
+    name = type(error).__name__
+    return "Timeout" in name or "Connect" in name
+
+
+class _Backend:
+    """A provider of the route with its concurrency limit and latency history"""
+
+    def __init__(self, name, provider, max_concurrency, window):
+        self.name = name
+        self.provider = provider
+        self.max_concurrency = max_concurrency
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self.latencies = deque(maxlen=window)
+        self.first_chunks = deque(maxlen=window)
+
+    def percentile(self, samples, p, min_samples):
+        if len(samples) < min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+class RoutedProvider(BaseLLMProvider):
+    """Provider sending each call to an ordered list of providers.
+
+    A call goes to the first provider with a free concurrency slot. If it
+    has not finished after the hedge_percentile of that provider's recent
+    latencies, a second request is sent to the next provider with a free
+    slot and the first response wins; a hedge never waits for a busy
+    provider. Timeouts, 429 and 5xx errors fail over to the next provider,
+    waiting for a slot if all are busy. The whole call, including hedges and failovers, must finish
+    within the deadline. Streams are hedged on the time to the first chunk
+    and fail over only before it.
+
+    Requests which lose a race are abandoned, not cancelled, in the sync
+    API: their threads finish in the background and their tokens are not
+    counted in the caller's usage. Only the usage and tool calls of the
+    winning request are reported.
+    """
+
+    def __init__(self,
+                 backends: List[Tuple[str, BaseLLMProvider]],
+                 deadline: Optional[float] = 60.0,
+                 hedge_percentile: Optional[float] = 0.95,
+                 hedge_min_delay: float = 0.5,
+                 min_samples: int = 20,
+                 max_concurrency: Union[int, Dict[str, int]] = 16,
+                 window: int = 200,
+                 metrics: Optional[MetricsSink] = None):
+        """
+        Initialize the routed provider.
+
+        Args:
+            backends (list): Ordered (name, provider) pairs, e.g. ("anthropic/claude-3-5-sonnet", provider).
+            deadline (float): Default seconds a call may take, None for no deadline.
+            hedge_percentile (float): Latency percentile of a provider after which a call
+                is hedged, e.g. 0.95. None disables hedging.
+            hedge_min_delay (float): Minimum seconds before a call is hedged.
+            min_samples (int): Number of calls of a provider before its percentile is used;
+                calls are not hedged before.
+            max_concurrency (int or dict): Maximum concurrent calls per provider, or per provider name.
+            window (int): Number of recent latencies kept per provider.
+            metrics (MetricsSink): Optional sink for hedge and failover counters.
+        """
+        if not backends:
+            raise ValueError("At least one provider is required")
+
+        def limit(name):
+            if isinstance(max_concurrency, dict):
+                return max_concurrency.get(name, 16)
+            return max_concurrency
+
+        self.backends = [_Backend(name, provider, limit(name), window) for name, provider in backends]
+        # Native tool calls can only be used if every provider can answer them
+        self.supports_native_tools = all(b.provider.supports_native_tools for b in self.backends)
+        self.deadline = deadline
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.min_samples = min_samples
+        self.metrics = metrics or NullSink()
+        self.executor = ThreadPoolExecutor(max_workers=sum(b.max_concurrency for b in self.backends) + 4)
+        self.logger = lg.getLogger(__name__)
+
+    def _deadline(self, kwargs):
+        seconds = kwargs.pop("deadline", self.deadline)
+        return time.monotonic() + seconds if seconds is not None else None
+
+    def _hedge_delay(self, backend, stream=False):
+        if self.hedge_percentile is None:
+            return None
+        samples = backend.first_chunks if stream else backend.latencies
+        latency = backend.percentile(samples, self.hedge_percentile, self.min_samples)
+        if latency is None:
+            return None
+        return max(self.hedge_min_delay, latency)
+
+    def _acquire(self, tried, deadline, blocking=True):
+        """Return the next untried backend with a free slot, waiting until the deadline if all are busy"""
+        untried = [b for b in self.backends if b not in tried]
+        for backend in untried:
+            if backend.slots.acquire(blocking=False):
+                return backend
+        if not untried or not blocking:
+            return None
+
+        # All remaining providers are at their limit, wait for the preferred one
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        if untried[0].slots.acquire(timeout=timeout):
+            return untried[0]
+        return None
+
+    def _failed(self, backend, error):
+        if not is_retryable(error):
+            raise error
+        self.logger.warning(f"Provider {backend.name} failed: {error}")
+        self.metrics.inc("llm_failovers_total", 1, {"backend": backend.name})
+
+    def _unavailable(self, errors):
+        self.metrics.inc("llm_unavailable_total")
+        detail = "; ".join(f"{name}: {error}" for name, error in errors) or "deadline exceeded"
+        return LLMUnavailableError(f"No provider responded: {detail}")
+
+    def _remaining(self, deadline, hedge_at):
+        now = time.monotonic()
+        times = [t for t in (deadline, hedge_at) if t is not None]
+        return max(0.0, min(times) - now) if times else None
+
+    def generate_response(self,
+                          messages: List[Dict[str, Any]],
+                          system_prompt: str="",
+                          **kwargs) -> str:
+        usage = kwargs.pop("usage", None)
+        tool_calls = kwargs.pop("tool_calls", None)
+        deadline = self._deadline(kwargs)
+        tried, errors, pending = [], [], {}
+        hedge_at = None
+
+        def launch(blocking=True):
+            backend = self._acquire(tried, deadline, blocking)
+            if backend is None:
+                return None
+            tried.append(backend)
+            attempt_usage, attempt_calls = {}, []
+
+            def call():
+                started = time.monotonic()
+                try:
+                    response = backend.provider.generate_response(messages, system_prompt,
+                                                                  usage=attempt_usage, tool_calls=attempt_calls,
+                                                                  **kwargs)
+                finally:
+                    backend.slots.release()
+                backend.latencies.append(time.monotonic() - started)
+                return response
+
+            pending[self.executor.submit(call)] = (backend, attempt_usage, attempt_calls)
+            return backend
+
+        backend = launch()
+        if backend is not None:
+            delay = self._hedge_delay(backend)
+            hedge_at = time.monotonic() + delay if delay is not None else None
+
+        while pending:
+            done, _ = wait(pending, timeout=self._remaining(deadline, hedge_at), return_when=FIRST_COMPLETED)
+
+            if not done:
+                if deadline is not None and time.monotonic() >= deadline:
+                    self.metrics.inc("llm_deadline_exceeded_total")
+                    break
+                # The call is slower than usual, race it against the next provider
+                hedge_at = None
+                hedge = launch(blocking=False)
+                if hedge is not None:
+                    self.logger.info(f"Hedging slow call with {hedge.name}")
+                    self.metrics.inc("llm_hedges_total", 1, {"backend": hedge.name})
+                continue
+
+            for future in done:
+                backend, attempt_usage, attempt_calls = pending.pop(future)
+                try:
+                    response = future.result()
+                except Exception as e:
+                    self._failed(backend, e)
+                    errors.append((backend.name, e))
+                    continue
+                if usage is not None:
+                    usage.update(attempt_usage)
+                if tool_calls is not None:
+                    tool_calls.extend(attempt_calls)
+                return response
+
+            if not pending:
+                hedge_at = None
+                launch()
+
+        raise self._unavailable(errors)
+
+    async def agenerate_response(self,
+                                 messages: List[Dict[str, Any]],
+                                 system_prompt: str="",
+                                 **kwargs) -> str:
+        usage = kwargs.pop("usage", None)
+        tool_calls = kwargs.pop("tool_calls", None)
+        deadline = self._deadline(kwargs)
+        tried, errors, pending = [], [], {}
+        hedge_at = None
+
+        async def launch(blocking=True):
+            backend = self._acquire(tried, deadline, blocking=False)
+            if backend is None and blocking and len(tried) < len(self.backends):
+                # Wait for a slot without blocking the event loop
+                backend = await asyncio.to_thread(self._acquire, tried, deadline)
+            if backend is None:
+                return None
+            tried.append(backend)
+            attempt_usage, attempt_calls = {}, []
+
+            async def call():
+                started = time.monotonic()
+                try:
+                    response = await backend.provider.agenerate_response(messages, system_prompt,
+                                                                         usage=attempt_usage, tool_calls=attempt_calls,
+                                                                         **kwargs)
+                finally:
+                    backend.slots.release()
+                backend.latencies.append(time.monotonic() - started)
+                return response
+
+            pending[asyncio.ensure_future(call())] = (backend, attempt_usage, attempt_calls)
+            return backend
+
+        try:
+            backend = await launch()
+            if backend is not None:
+                delay = self._hedge_delay(backend)
+                hedge_at = time.monotonic() + delay if delay is not None else None
+
+            while pending:
+                done, _ = await asyncio.wait(pending, timeout=self._remaining(deadline, hedge_at),
+                                             return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    if deadline is not None and time.monotonic() >= deadline:
+                        self.metrics.inc("llm_deadline_exceeded_total")
+                        break
+                    hedge_at = None
+                    hedge = await launch(blocking=False)
+                    if hedge is not None:
+                        self.logger.info(f"Hedging slow call with {hedge.name}")
+                        self.metrics.inc("llm_hedges_total", 1, {"backend": hedge.name})
+                    continue
+
+                for task in done:
+                    backend, attempt_usage, attempt_calls = pending.pop(task)
+                    try:
+                        response = task.result()
+                    except Exception as e:
+                        self._failed(backend, e)
+                        errors.append((backend.name, e))
+                        continue
+                    if usage is not None:
+                        usage.update(attempt_usage)
+                    if tool_calls is not None:
+                        tool_calls.extend(attempt_calls)
+                    return response
+
+                if not pending:
+                    hedge_at = None
+                    await launch()
+        finally:
+            # Losing and timed out requests are cancelled
+            for task in pending:
+                task.cancel()
+
+        raise self._unavailable(errors)
+
+    def stream_response(self,
+                        messages: List[Dict[str, Any]],
+                        system_prompt: str="",
+                        **kwargs) -> Iterator[str]:
+        usage = kwargs.pop("usage", None)
+        tool_calls = kwargs.pop("tool_calls", None)
+        deadline = self._deadline(kwargs)
+        events = queue.Queue()
+        tried, errors, running = [], [], {}
+        cancelled = set()
+        hedge_at = None
+
+        def launch(blocking=True):
+            backend = self._acquire(tried, deadline, blocking)
+            if backend is None:
+                return None
+            tried.append(backend)
+            attempt = len(tried)
+            running[attempt] = (backend, {}, [])
+
+            def consume():
+                started = time.monotonic()
+                first = True
+                try:
+                    for chunk in backend.provider.stream_response(messages, system_prompt,
+                                                                  usage=running[attempt][1],
+                                                                  tool_calls=running[attempt][2], **kwargs):
+                        if attempt in cancelled:
+                            break
+                        if first:
+                            first = False
+                            backend.first_chunks.append(time.monotonic() - started)
+                        events.put((attempt, "chunk", chunk))
+                    events.put((attempt, "end", None))
+                except Exception as e:
+                    events.put((attempt, "error", e))
+                finally:
+                    backend.slots.release()
+
+            self.executor.submit(consume)
+            return backend
+
+        backend = launch()
+        if backend is not None:
+            delay = self._hedge_delay(backend, stream=True)
+            hedge_at = time.monotonic() + delay if delay is not None else None
+
+        winner = None
+        try:
+            while running:
+                try:
+                    timeout = None if winner is not None else self._remaining(deadline, hedge_at)
+                    attempt, kind, value = events.get(timeout=timeout)
+                except queue.Empty:
+                    if deadline is not None and time.monotonic() >= deadline:
+                        self.metrics.inc("llm_deadline_exceeded_total")
+                        break
+                    hedge_at = None
+                    hedge = launch(blocking=False)
+                    if hedge is not None:
+                        self.logger.info(f"Hedging slow stream with {hedge.name}")
+                        self.metrics.inc("llm_hedges_total", 1, {"backend": hedge.name})
+                    continue
+
+                if winner is not None and attempt != winner:
+                    continue
+
+                if kind == "chunk":
+                    if winner is None:
+                        # The first stream to produce text wins, the others stop
+                        winner = attempt
+                        cancelled.update(a for a in running if a != attempt)
+                    yield value
+                elif kind == "end":
+                    if usage is not None:
+                        usage.update(running[attempt][1])
+                    if tool_calls is not None:
+                        tool_calls.extend(running[attempt][2])
+                    return
+                else:
+                    backend = running.pop(attempt)[0]
+                    if winner is not None:
+                        raise value
+                    self._failed(backend, value)
+                    errors.append((backend.name, value))
+                    if not running:
+                        hedge_at = None
+                        launch()
+        finally:
+            cancelled.update(running)
+
+        raise self._unavailable(errors)
@@ -0,0 +1,390 @@
+"""Headless HTTP server streaming NanoEngineer conversations as server-sent events.
+
+A master process accepts connections and reads the request head, then
+passes the connection to one of several pre-forked worker processes. The
+worker is chosen by the session id in the path, so all requests of a
+conversation reach the worker holding its history. Each worker builds its
+own engine with the factory after the fork and serves its sessions from a
+SessionManager.
+
+Endpoints:
+    POST   /sessions/<id>/messages  {"message": "...", "stream": true}
+           Server-sent events: plan, execution, answer (text chunks), done or error
+    GET    /sessions/<id>/stats     Statistics of the session
+    DELETE /sessions/<id>           End the session
+    GET    /health                  Sessions of the worker
+
+POSIX only, as connections are passed to the workers over Unix sockets.
+"""
+from http.server import BaseHTTPRequestHandler
+from typing import Callable, Dict, Optional
+import io
+import json
+import logging as lg
+import os
+import selectors
+import signal
+import socket
+import threading
+import time
+import weakref
+import zlib
+from nanoengineer.nanoengineer import NanoEngineer
+from nanoengineer.sessions import SessionManager
+
+# Limits of the request head read by the master
+MAX_HEAD_BYTES = 64 * 1024
+HEAD_TIMEOUT = 10.0
+
+logger = lg.getLogger(__name__)
+
+
+def session_id(path: str) -> Optional[str]:
+    """Return the session id of a request path, None for other paths"""
+    parts = path.split("?", 1)[0].strip("/").split("/")
+    if len(parts) >= 2 and parts[0] == "sessions" and parts[1]:
+        return parts[1]
+    return None
+
+
+def route(session: Optional[str], workers: int, fallback: int = 0) -> int:
+    """Return the index of the worker serving a session"""
+    if session is None:
+        return fallback % workers
+    return zlib.crc32(session.encode("utf-8")) % workers
+
+
+class _PrefixedReader:
+    """Reads the bytes the master already received before the connection"""
+
+    def __init__(self, prefix, rfile):
+        self.buffer = io.BytesIO(prefix)
+        self.rfile = rfile
+
+    def readline(self, limit=-1):
+        line = self.buffer.readline(limit)
+        if line.endswith(b"\n") or (limit is not None and 0 <= limit <= len(line)):
+            return line
+        rest = -1 if limit is None or limit < 0 else limit - len(line)
+        return line + self.rfile.readline(rest)
+
+    def read(self, size=-1):
+        data = self.buffer.read(size)
+        if size is None or size < 0:
+            return data + self.rfile.read()
+        if len(data) < size:
+            data += self.rfile.read(size - len(data))
+        return data
+
+    def close(self):
+        self.rfile.close()
+
+
+class SessionHandler(BaseHTTPRequestHandler):
+    """Request handler of a worker, serving the sessions of its SessionManager"""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    manager: SessionManager = None
+    worker: int = 0
+    busy = None
+
+    def __init__(self, request, client_address, prefix):
+        self.prefix = prefix
+        super().__init__(request, client_address, None)
+
+    def setup(self):
+        super().setup()
+        self.rfile = _PrefixedReader(self.prefix, self.rfile)
+
+    def log_message(self, format, *args):
+        logger.debug(f"Worker {self.worker}: {format % args}")
+
+    def _json(self, status, data=None):
+        body = json.dumps(data).encode("utf-8") if data is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
+        self.close_connection = True
+
+    def do_GET(self):
+        session = session_id(self.path)
+        if self.path.split("?", 1)[0] == "/health":
+            self._json(200, {"worker": self.worker, "pid": os.getpid(), **self.manager.stats()})
+        elif session is not None and self.path.split("?", 1)[0].endswith("/stats"):
+            engine = self.manager.sessions.get(session)
+            if engine is None:
+                self._json(404, {"error": f"Session {session} not found"})
+            else:
+                self._json(200, engine.session_stats())
+        else:
+            self._json(404, {"error": "Not found"})
+
+    def do_DELETE(self):
+        session = session_id(self.path)
+        if session is None:
+            self._json(404, {"error": "Not found"})
+        elif self.manager.remove(session):
+            self._json(204)
+        else:
+            self._json(404, {"error": f"Session {session} not found"})
+
+    def do_POST(self):
+        session = session_id(self.path)
+        if session is None or not self.path.split("?", 1)[0].endswith("/messages"):
+            self._json(404, {"error": "Not found"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            message = request["message"]
+        except (ValueError, KeyError, TypeError):
+            self._json(400, {"error": 'Expected a JSON body {"message": "..."}'})
+            return
+
+        engine = self.manager.get(session)
+        lock = self.busy.setdefault(engine, threading.Lock())
+        # A conversation has one history, its turns cannot overlap
+        if not lock.acquire(blocking=False):
+            self._json(409, {"error": f"Session {session} is processing another message"})
+            return
+
+        try:
+            self._stream(engine, message, request.get("stream", True))
+        finally:
+            lock.release()
+
+    def _stream(self, engine, message, stream):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        response = ""
+        turn = engine.send_message(message, yield_response=True, stream=stream)
+        try:
+            for item in turn:
+                if isinstance(item, list):
+                    self._event("plan", {"steps": item})
+                elif isinstance(item, dict):
+                    self._event("execution", item)
+                else:
+                    response += item
+                    self._event("answer", {"text": item})
+            self._event("done", {"response": response})
+        except (BrokenPipeError, ConnectionResetError):
+            logger.info(f"Client of worker {self.worker} disconnected")
+            turn.close()
+        except Exception as e:
+            logger.error(f"Turn failed: {e}")
+            self._event("error", {"error": str(e)})
+
+    def _event(self, event, data):
+        self.wfile.write(f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n".encode("utf-8"))
+
+
+def _run_worker(index: int, channel: socket.socket, factory: Callable[[], NanoEngineer], manager_kwargs: Dict):
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    handler = type("WorkerHandler", (SessionHandler,), {
+        "manager": SessionManager(factory(), **manager_kwargs),
+        "worker": index,
+        "busy": weakref.WeakKeyDictionary()
+    })
+    logger.info(f"Worker {index} ready (pid {os.getpid()})")
+
+    def handle(connection, prefix):
+        try:
+            handler(connection, connection.getpeername(), prefix)
+        except Exception as e:
+            logger.error(f"Worker {index} failed to handle a request: {e}")
+        finally:
+            connection.close()
+
+    while True:
+        prefix, fds, _, _ = socket.recv_fds(channel, MAX_HEAD_BYTES, 1)
+        if not fds:
+            # The master has exited
+            break
+        connection = socket.socket(fileno=fds[0])
+        connection.setblocking(True)
+        threading.Thread(target=handle, args=(connection, prefix), daemon=True).start()
+
+
+class Server:
+    """Pre-forking master, see the module documentation"""
+
+    def __init__(self,
+                 factory: Callable[[], NanoEngineer],
+                 host: str = "0.0.0.0",
+                 port: int = 8000,
+                 workers: Optional[int] = None,
+                 **manager_kwargs):
+        """
+        Initialize the server.
+
+        Args:
+            factory (callable): Returns the configured engine of a worker, called in the worker.
+            host (str): The interface to listen on.
+            port (int): The port.
+            workers (int): Number of worker processes, defaults to the number of CPUs.
+            **manager_kwargs: Arguments of each worker's SessionManager, e.g. max_memory.
+        """
+        self.factory = factory
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.manager_kwargs = manager_kwargs
+        self.channels = [None] * self.workers
+        self.pids = {}
+        self.requests = 0
+        self.running = False
+
+    def _spawn(self, index):
+        master, worker = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        pid = os.fork()
+        if pid == 0:
+            master.close()
+            self.listener.close()
+            # Without the other workers' channels, a worker sees the master exit
+            for channel in self.channels:
+                if channel is not None:
+                    channel.close()
+            try:
+                _run_worker(index, worker, self.factory, self.manager_kwargs)
+            finally:
+                os._exit(0)
+
+        worker.close()
+        if self.channels[index] is not None:
+            self.channels[index].close()
+        self.channels[index] = master
+        self.pids[pid] = index
+
+    def _reap(self):
+        while self.pids:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            index = self.pids.pop(pid, None)
+            if index is not None and self.running:
+                logger.warning(f"Worker {index} exited with status {status}, restarting")
+                self._spawn(index)
+
+    def _dispatch(self, connection, head):
+        request_line = head.split(b"\r\n", 1)[0].decode("latin-1")
+        parts = request_line.split(" ")
+        session = session_id(parts[1]) if len(parts) >= 2 else None
+        self.requests += 1
+        index = route(session, self.workers, self.requests)
+        try:
+            socket.send_fds(self.channels[index], [head], [connection.fileno()])
+        except OSError as e:
+            logger.error(f"Passing a connection to worker {index} failed: {e}")
+        connection.close()
+
+    def serve_forever(self):
+        """Fork the workers and serve until SIGINT or SIGTERM"""
+        self.listener = socket.create_server((self.host, self.port), backlog=1024)
+        self.listener.setblocking(False)
+        self.running = True
+
+        for index in range(self.workers):
+            self._spawn(index)
+        logger.info(f"Serving on http://{self.host}:{self.port} with {self.workers} workers")
+
+        def stop(signum, frame):
+            self.running = False
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGTERM, stop)
+
+        selector = selectors.DefaultSelector()
+        selector.register(self.listener, selectors.EVENT_READ)
+        pending = {}
+
+        try:
+            while self.running:
+                for key, _ in selector.select(timeout=1.0):
+                    if key.fileobj is self.listener:
+                        try:
+                            connection, _ = self.listener.accept()
+                        except BlockingIOError:
+                            continue
+                        connection.setblocking(False)
+                        pending[connection] = [b"", time.monotonic()]
+                        selector.register(connection, selectors.EVENT_READ)
+                        continue
+
+                    connection = key.fileobj
+                    try:
+                        data = connection.recv(MAX_HEAD_BYTES - len(pending[connection][0]))
+                    except (BlockingIOError, InterruptedError):
+                        continue
+                    except OSError:
+                        data = b""
+
+                    state = pending[connection]
+                    state[0] += data
+                    if data and b"\r\n\r\n" not in state[0] and len(state[0]) < MAX_HEAD_BYTES:
+                        continue
+
+                    selector.unregister(connection)
+                    del pending[connection]
+                    if b"\r\n\r\n" in state[0]:
+                        self._dispatch(connection, state[0])
+                    else:
+                        connection.close()
+
+                # Drop clients which do not send their request head
+                now = time.monotonic()
+                for connection, (_, started) in list(pending.items()):
+                    if now - started > HEAD_TIMEOUT:
+                        selector.unregister(connection)
+                        del pending[connection]
+                        connection.close()
+
+                self._reap()
+        finally:
+            self.running = False
+            for pid in list(self.pids):
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+            for channel in self.channels:
+                channel.close()
+            for pid in list(self.pids):
+                try:
+                    os.waitpid(pid, 0)
+                except ChildProcessError:
+                    pass
+            self.listener.close()
+            selector.close()
+
+
+def serve(factory: Callable[[], NanoEngineer],
+          host: str = "0.0.0.0",
+          port: int = 8000,
+          workers: Optional[int] = None,
+          **manager_kwargs):
+    """
+    Serve conversations of the engines returned by factory until interrupted.
+
+    Args:
+        factory (callable): Returns the configured engine of a worker, called in the worker.
+        host (str): The interface to listen on.
+        port (int): The port.
+        workers (int): Number of worker processes, defaults to the number of CPUs.
+        **manager_kwargs: Arguments of each worker's SessionManager.
+    """
+    Server(factory, host, port, workers, **manager_kwargs).serve_forever()
@@ -0,0 +1,166 @@
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+import logging as lg
+import threading
+import time
+from nanoengineer.nanoengineer import NanoEngineer
+
+# Approximate memory of an empty session and of a history message besides its content
+SESSION_OVERHEAD = 4096
+MESSAGE_OVERHEAD = 400
+
+
+class SessionManager:
+    """Serves many conversations from one configured engine.
+
+    The engine passed in holds everything sessions share: the provider
+    client, the tool and widget registries with their serialized catalog,
+    the tool executor, the caches, the metrics sink and the tracer. Each
+    session is created with NanoEngineer.new_session, so it only adds its
+    history and plans.
+
+    Sessions idle for longer than idle_timeout are removed, and the least
+    recently used sessions are evicted while there are more than
+    max_sessions or their estimated memory exceeds max_memory. An evicted
+    conversation starts over on its next message.
+    """
+
+    def __init__(self,
+                 engine: NanoEngineer,
+                 max_sessions: int = 10000,
+                 max_memory: int = 256 * 1024 * 1024,
+                 idle_timeout: Optional[float] = 60 * 60,
+                 check_interval: float = 10.0):
+        """
+        Initialize the session manager.
+
+        Args:
+            engine (NanoEngineer): The configured engine the sessions are created from.
+            max_sessions (int): Maximum number of sessions.
+            max_memory (int): Maximum estimated memory of all sessions in bytes.
+            idle_timeout (float): Seconds after which an unused session is removed, None to keep it.
+            check_interval (float): Minimum seconds between two scans for idle sessions and memory.
+        """
+        self.engine = engine
+        self.max_sessions = max_sessions
+        self.max_memory = max_memory
+        self.idle_timeout = idle_timeout
+        self.check_interval = check_interval
+        self.sessions = OrderedDict()
+        self.last_used = {}
+        self.checked = 0.0
+        self.evicted = 0
+        self.lock = threading.Lock()
+        self.logger = lg.getLogger(__name__)
+
+        # Serialize the catalog once, before any session copies it
+        self.engine._format_catalog()
+
+    def get(self, session_id: str) -> NanoEngineer:
+        """
+        Return the engine of a session, creating it if needed.
+
+        Args:
+            session_id (str): The session id.
+
+        Returns:
+            NanoEngineer: The engine of the session.
+        """
+        now = time.monotonic()
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is not None:
+                self.sessions.move_to_end(session_id)
+                self.last_used[session_id] = now
+                return session
+
+            session = self.engine.new_session()
+            self.sessions[session_id] = session
+            self.last_used[session_id] = now
+            self.logger.debug(f"Created session {session_id}")
+
+            if len(self.sessions) > self.max_sessions or now - self.checked >= self.check_interval:
+                self._evict(now)
+            return session
+
+    def remove(self, session_id: str) -> bool:
+        """
+        Remove a session.
+
+        Args:
+            session_id (str): The session id.
+
+        Returns:
+            bool: True if the session existed.
+        """
+        with self.lock:
+            self.last_used.pop(session_id, None)
+            return self.sessions.pop(session_id, None) is not None
+
+    def evict(self):
+        """Remove idle sessions and evict sessions over the limits now"""
+        with self.lock:
+            self._evict(time.monotonic())
+
+    def _evict(self, now):
+        self.checked = now
+
+        if self.idle_timeout is not None:
+            # Sessions are ordered by last use, idle ones come first
+            for session_id in list(self.sessions):
+                if now - self.last_used[session_id] < self.idle_timeout:
+                    break
+                self._drop(session_id)
+
+        while len(self.sessions) > self.max_sessions:
+            self._drop(next(iter(self.sessions)))
+
+        sizes = {session_id: self.session_size(s) for session_id, s in self.sessions.items()}
+        total = sum(sizes.values())
+        # The newest session is kept even if it alone exceeds the limit
+        while total > self.max_memory and len(self.sessions) > 1:
+            session_id = next(iter(self.sessions))
+            total -= sizes[session_id]
+            self._drop(session_id)
+
+    def _drop(self, session_id):
+        del self.sessions[session_id]
+        del self.last_used[session_id]
+        self.evicted += 1
+        self.logger.info(f"Evicted session {session_id}")
+
+    @staticmethod
+    def session_size(session: NanoEngineer) -> int:
+        """
+        Estimate the memory of a session in bytes.
+
+        Args:
+            session (NanoEngineer): The session.
+
+        Returns:
+            int: The estimated size. The shared catalog text is counted once per
+                session, as it is part of the first message.
+        """
+        history = session.llm.history
+        size = SESSION_OVERHEAD + MESSAGE_OVERHEAD * len(history)
+        size += sum(len(m["content"]) for m in history)
+        size += sum(len(step) for steps in session.plans.values() for step in steps)
+        return size
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return the number of sessions, their estimated memory, the number of evictions
+        and the tool calls executed and coalesced by the sessions.
+
+        Returns:
+            dict: The statistics.
+        """
+        with self.lock:
+            sessions = list(self.sessions.values())
+            evicted = self.evicted
+        return {
+            "sessions": len(sessions),
+            "memory": sum(self.session_size(s) for s in sessions),
+            "evicted": evicted,
+            "tool_flights": self.engine.single_flight.stats()
+        }
@@ -0,0 +1,100 @@
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Tuple
+import asyncio
+import threading
+
+
+class SingleFlight:
+    """Coalesces identical calls which are in flight at the same time.
+
+    The first caller of a key runs the call, every caller arriving before
+    it finishes waits for and receives the same result or exception.
+    Threads and coroutines share the calls, so a coroutine may wait for a
+    call run by a worker thread and vice versa. Finished calls are
+    forgotten immediately; repeated calls are the job of the result cache.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    def _join(self, key: str) -> Tuple[Future, bool]:
+        with self.lock:
+            future = self.calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+
+            future = Future()
+            self.calls[key] = future
+            self.executed += 1
+            return future, True
+
+    def _finish(self, key: str, future: Future, result: Any = None, error: BaseException = None):
+        with self.lock:
+            del self.calls[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run fn, or wait for the run of an identical call in flight.
+
+        Args:
+            key (str): Key of the call, equal for calls with the same result.
+            fn (callable): The call.
+
+        Returns:
+            Any: The result of the call.
+            bool: Whether the result was shared by another caller.
+        """
+        future, leader = self._join(key)
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = fn()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result, False
+
+    async def ado(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Await fn(), or wait for the run of an identical call in flight.
+
+        Args:
+            key (str): Key of the call, equal for calls with the same result.
+            fn (callable): Returns the awaitable of the call.
+
+        Returns:
+            Any: The result of the call.
+            bool: Whether the result was shared by another caller.
+        """
+        future, leader = self._join(key)
+        if not leader:
+            # Shielded, a cancelled waiter must not cancel the shared call
+            return await asyncio.shield(asyncio.wrap_future(future)), True
+
+        try:
+            result = await fn()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result, False
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Return the number of executed and coalesced calls and of the calls in flight.
+
+        Returns:
+            dict: The statistics.
+        """
+        with self.lock:
+            return {"executed": self.executed, "coalesced": self.coalesced, "in_flight": len(self.calls)}
@@ -0,0 +1,240 @@
+from collections import deque
+from typing import Any, Dict, List, Optional
+import asyncio
+import hashlib
+import json
+import logging as lg
+import os
+import random
+import threading
+import time
+from nanoengineer.cache import canonical_params
+
+
+def params_hash(params: Any) -> str:
+    """Short stable hash of tool parameters, used as span attribute"""
+    if isinstance(params, list):
+        # Batched executions carry a list of param sets
+        return hashlib.sha1("\n".join(canonical_params(p) for p in params).encode("utf-8")).hexdigest()[:12]
+    return hashlib.sha1(canonical_params(params).encode("utf-8")).hexdigest()[:12]
+
+
+class Span:
+    """A timed operation of a turn, e.g. an LLM call or a tool execution"""
+
+    __slots__ = ("tracer", "name", "trace_id", "span_id", "parent_id", "attributes",
+                 "start", "end", "thread", "error")
+
+    def __init__(self, tracer, name, parent=None, attributes=None):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = parent.trace_id if parent else f"{random.getrandbits(128):032x}"
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = attributes or {}
+        self.start = None
+        self.end = None
+        self.thread = None
+        self.error = None
+
+    def set(self, **attributes):
+        """Add attributes to the span"""
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self.thread = _lane()
+        self.start = time.time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end = time.time_ns()
+        if isinstance(exc, Exception):
+            self.error = f"{exc_type.__name__}: {exc}"
+        self.tracer._finish(self)
+        return False
+
+
+class _NullSpan:
+    """Span of a disabled tracer, all operations are no-ops"""
+
+    __slots__ = ()
+
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class NullTracer:
+    """Tracer used when tracing is disabled"""
+
+    enabled = False
+
+    def span(self, name: str, parent=None, **attributes):
+        return NULL_SPAN
+
+
+class Tracer:
+    """Collects the spans of each turn and writes them to local disk.
+
+    Spans are nested by passing the parent span explicitly, which also works
+    across the tool executor threads and asyncio tasks. When a root span (a
+    turn) ends, its spans are written to directory as Chrome trace_event JSON
+    (trace-<id>.json, open in chrome://tracing or Perfetto) and OTLP-JSON
+    (trace-<id>.otlp.json). Without a directory, spans are kept in memory,
+    up to max_spans, and exported with export_chrome and export_otlp.
+    """
+
+    enabled = True
+
+    def __init__(self, directory: Optional[str] = None, service_name: str = "nanoengineer",
+                 max_spans: int = 10000):
+        """
+        Initialize the tracer.
+
+        Args:
+            directory (str): Directory the traces of finished turns are written to.
+            service_name (str): Service name of the exported OTLP resource.
+            max_spans (int): Maximum number of finished spans kept in memory.
+        """
+        self.directory = directory
+        self.service_name = service_name
+        self.spans = deque(maxlen=max_spans)
+        self.lock = threading.Lock()
+        self.logger = lg.getLogger(__name__)
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def span(self, name: str, parent: Optional[Span] = None, **attributes) -> Span:
+        """
+        Create a span, timed while used as context manager.
+
+        Args:
+            name (str): The name of the operation.
+            parent (Span): The enclosing span, None for the root span of a turn.
+            **attributes: Attributes of the span.
+
+        Returns:
+            Span: The span.
+        """
+        return Span(self, name, parent if isinstance(parent, Span) else None, attributes)
+
+    def _finish(self, span):
+        if span.parent_id is not None or not self.directory:
+            with self.lock:
+                self.spans.append(span)
+            return
+
+        with self.lock:
+            spans = [s for s in self.spans if s.trace_id == span.trace_id] + [span]
+            remaining = [s for s in self.spans if s.trace_id != span.trace_id]
+            self.spans.clear()
+            self.spans.extend(remaining)
+
+        base = os.path.join(self.directory, f"trace-{span.trace_id}")
+        try:
+            self.export_chrome(f"{base}.json", spans)
+            self.export_otlp(f"{base}.otlp.json", spans)
+        except OSError as e:
+            self.logger.error(f"Writing trace {span.trace_id} failed: {e}")
+
+    def _collected(self, spans):
+        if spans is not None:
+            return list(spans)
+        with self.lock:
+            return list(self.spans)
+
+    def export_chrome(self, path: str, spans: Optional[List[Span]] = None):
+        """
+        Write spans as Chrome trace_event JSON.
+
+        Args:
+            path (str): The output file.
+            spans (list): The spans, defaults to all spans in memory.
+        """
+        pid = os.getpid()
+        events = []
+        for span in self._collected(spans):
+            args = {**span.attributes, "span_id": span.span_id, "trace_id": span.trace_id}
+            if span.parent_id:
+                args["parent_id"] = span.parent_id
+            if span.error:
+                args["error"] = span.error
+            events.append({
+                "name": span.name,
+                "cat": "nanoengineer",
+                "ph": "X",
+                "ts": span.start / 1000,
+                "dur": (span.end - span.start) / 1000,
+                "pid": pid,
+                "tid": span.thread,
+                "args": args
+            })
+        events.sort(key=lambda e: e["ts"])
+
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, default=str)
+
+    def export_otlp(self, path: str, spans: Optional[List[Span]] = None):
+        """
+        Write spans as OTLP-JSON (ExportTraceServiceRequest).
+
+        Args:
+            path (str): The output file.
+            spans (list): The spans, defaults to all spans in memory.
+        """
+        otlp_spans = []
+        for span in self._collected(spans):
+            otlp_span = {
+                "traceId": span.trace_id,
+                "spanId": span.span_id,
+                "name": span.name,
+                "kind": 1,
+                "startTimeUnixNano": str(span.start),
+                "endTimeUnixNano": str(span.end),
+                "attributes": _otlp_attributes(span.attributes),
+                "status": {"code": 2, "message": span.error} if span.error else {"code": 1}
+            }
+            if span.parent_id:
+                otlp_span["parentSpanId"] = span.parent_id
+            otlp_spans.append(otlp_span)
+
+        data = {"resourceSpans": [{
+            "resource": {"attributes": _otlp_attributes({"service.name": self.service_name})},
+            "scopeSpans": [{"scope": {"name": "nanoengineer"}, "spans": otlp_spans}]
+        }]}
+
+        with open(path, "w") as f:
+            json.dump(data, f)
+
+
+def _lane():
+    # Concurrent asyncio tasks share a thread, give each its own timeline row
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    return id(task) if task is not None else threading.get_ident()
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    result = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            value = {"boolValue": value}
+        elif isinstance(value, int):
+            value = {"intValue": str(value)}
+        elif isinstance(value, float):
+            value = {"doubleValue": value}
+        else:
+            value = {"stringValue": str(value)}
+        result.append({"key": key, "value": value})
+    return result
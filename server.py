@@ -0,0 +1,74 @@
+"""Headless server of the travel assistant, see nanoengineer.server.
+
+    python server.py --port 8000 --workers 4
+
+It is configured by the same environment variables as the Streamlit
+application. Set TOOL_CACHE_PATH and LLM_CACHE_PATH to share the caches
+between the worker processes.
+"""
+import argparse
+import logging as lg
+import os
+from dotenv import load_dotenv
+from nanoengineer import NanoEngineer, LLMInteract
+from nanoengineer.cache import ToolResultCache, SQLiteResultCache
+from nanoengineer.history import HistoryManager
+from nanoengineer.server import serve
+from nanoengineer.tracing import Tracer
+from tools import WeatherTool, HotelTool, SightseeingTool, MapSearchTool, WikiTool
+from tools.weather_store import parse_locations
+from streamlit_widgets import MapWidget, MetricWidget
+
+
+def engine():
+    # Called in each worker process after the fork
+    token_budget = os.getenv("HISTORY_TOKEN_BUDGET")
+    tool_cache_path = os.getenv("TOOL_CACHE_PATH")
+    llm_cache_path = os.getenv("LLM_CACHE_PATH")
+    trace_dir = os.getenv("TRACE_DIR")
+    hot_cities = os.getenv("WEATHER_PREFETCH")
+    if hot_cities:
+        # Threads do not survive the fork, each worker refreshes its own store
+        WeatherTool.prefetch(parse_locations(hot_cities))
+
+    llm = LLMInteract(provider=os.getenv("LANGUAGE_PROVIDER"),
+                      model=os.getenv("LANGUAGE_MODEL"),
+                      api_key=os.getenv("ANTHROPIC_API_KEY"),
+                      history_manager=HistoryManager(int(token_budget)) if token_budget else None,
+                      response_cache=SQLiteResultCache(llm_cache_path) if llm_cache_path else None,
+                      # Only responses at temperature 0 are cached
+                      **({"temperature": 0} if llm_cache_path else {}))
+
+    nano = NanoEngineer(llm,
+                        cache=SQLiteResultCache(tool_cache_path, memory=ToolResultCache())
+                        if tool_cache_path else ToolResultCache(),
+                        tracer=Tracer(trace_dir) if trace_dir else None)
+
+    nano.register_tools([
+        WeatherTool,
+        HotelTool,
+        SightseeingTool,
+        MapSearchTool,
+        WikiTool
+    ])
+
+    nano.register_widgets([
+        MapWidget,
+        MetricWidget
+    ])
+
+    return nano
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    lg.basicConfig(level=lg.INFO)
+
+    parser = argparse.ArgumentParser(description="Serve the travel assistant over HTTP with server-sent events")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes, defaults to the number of CPUs")
+    parser.add_argument("--session-memory-mb", type=int, default=256, help="Memory cap of the sessions of a worker")
+    args = parser.parse_args()
+
+    serve(engine, args.host, args.port, args.workers, max_memory=args.session_memory_mb * 1024 * 1024)
@@ -1,8 +1,15 @@
 import streamlit as st
 import os
-import re
-import json
+import uuid
 from nanoengineer import NanoEngineer, LLMInteract
+from nanoengineer.parser import parse_response
+from nanoengineer.cache import ToolResultCache, SQLiteResultCache
+from nanoengineer.history import HistoryManager
+from nanoengineer.metrics import NullSink, PrometheusSink
+from nanoengineer.tracing import Tracer
+from nanoengineer.sessions import SessionManager
+from tools.http_client import client
+from tools.weather_store import parse_locations
 from tools import WeatherTool, HotelTool, SightseeingTool, MapSearchTool, WikiTool
 from streamlit_widgets import MapWidget, MetricWidget
 import logging as lg
@@ -14,20 +21,72 @@ lg.basicConfig(level=lg.INFO)
 st.set_page_config(page_title="Travel Assistant")
 
 
+@st.cache_resource
+def tool_cache():
+    # Shared by all sessions of this process, and by all worker processes
+    # if TOOL_CACHE_PATH points to a common SQLite file
+    cache_path = os.getenv("TOOL_CACHE_PATH")
+    if cache_path:
+        return SQLiteResultCache(cache_path, memory=ToolResultCache())
+    return ToolResultCache()
+
+
+@st.cache_resource
+def response_cache():
+    # Responses of the LLM for identical requests, shared like the tool cache
+    cache_path = os.getenv("LLM_CACHE_PATH")
+    if cache_path:
+        return SQLiteResultCache(cache_path, memory=ToolResultCache())
+    return None
+
+
+@st.cache_resource
+def metrics():
+    # Token, cost and latency metrics of all sessions, scraped from
+    # http://host:METRICS_PORT/metrics if METRICS_PORT is set
+    port = os.getenv("METRICS_PORT")
+    if not port:
+        return NullSink()
+    sink = PrometheusSink()
+    sink.serve(int(port))
+    client.metrics = sink
+    return sink
+
+
 if 'messages' not in st.session_state:
     st.session_state.messages = []
 
-if 'nano' not in st.session_state:
+@st.cache_resource
+def sessions():
+    # One engine configuration for all browser sessions: they share the
+    # provider client, the tool catalog and the executor, and each session
+    # only holds its conversation
     anthropic_key = os.getenv("ANTHROPIC_API_KEY")
     language_model = os.getenv("LANGUAGE_MODEL")
     language_provider = os.getenv("LANGUAGE_PROVIDER")
     lg.info(f"Using language model {language_model} by {language_provider}")
 
+    token_budget = os.getenv("HISTORY_TOKEN_BUDGET")
+    trace_dir = os.getenv("TRACE_DIR")
+    hot_cities = os.getenv("WEATHER_PREFETCH")
+    if hot_cities:
+        WeatherTool.prefetch(parse_locations(hot_cities))
+
+    # Only responses at temperature 0 are cached, so the cache implies greedy decoding
+    config = {"temperature": 0} if response_cache() is not None else {}
+
     llm = LLMInteract(provider=language_provider,
                       model=language_model,
-                      api_key=anthropic_key)
+                      api_key=anthropic_key,
+                      history_manager=HistoryManager(int(token_budget)) if token_budget else None,
+                      metrics=metrics(),
+                      response_cache=response_cache(),
+                      **config)
 
-    nano = NanoEngineer(llm)
+    nano = NanoEngineer(llm,
+                        cache=tool_cache(),
+                        metrics=metrics(),
+                        tracer=Tracer(trace_dir) if trace_dir else None)
 
     nano.register_tools([
         WeatherTool,
@@ -42,25 +101,33 @@ if 'nano' not in st.session_state:
         MetricWidget
     ])
 
-    st.session_state.nano = nano
+    session_memory = os.getenv("SESSION_MEMORY_MB")
+    if session_memory:
+        return SessionManager(nano, max_memory=int(session_memory) * 1024 * 1024)
+    return SessionManager(nano)
+
+
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = str(uuid.uuid4())
+
+nano = sessions().get(st.session_state.session_id)
+
+
+def display_content(content, answer_tag="Answer"):
+    """Collect the texts to display and the widgets of a parsed response."""
+    events = parse_response(content)
+    texts = [e.text for tag in ("Ask", "Message", answer_tag) for e in events if e.tag == tag]
+    widgets = [e for e in events if e.tag == "Widget"]
+    return texts, widgets
 
 
 for message in st.session_state.messages:
     with st.chat_message(message["role"]):
         if message["role"] == "assistant":
-            ask_pattern = r'<Ask.*?>(.*?)</Ask>'
-            message_pattern = r'<Message.*?>(.*?)</Message>'
-            answer_pattern = r'<Answer.*?>(.*?)</Answer>'
-            
-            display_content = []
-            
-            for pattern in [ask_pattern, message_pattern, answer_pattern]:
-                matches = re.findall(pattern, message["content"], re.DOTALL)
-                display_content.extend(matches)
+            texts, _ = display_content(message["content"])
 
-                
-            if display_content:
-                st.markdown('\n\n'.join(display_content))
+            if texts:
+                st.markdown('\n\n'.join(texts))
             else:
                 st.markdown(message["content"])
                 
@@ -78,7 +145,7 @@ if prompt := st.chat_input("What would you like to know about travel?"):
         status_messages = []
         
         with st.status("Processing...", expanded=False) as status:
-            for chunk in st.session_state.nano.send_message(prompt, yield_response=True):
+            for chunk in nano.send_message(prompt, yield_response=True, stream=True):
                 if isinstance(chunk, list):
                     for i, step in enumerate(chunk):
                         status_msg = f"Step {i+1}: {step}"
@@ -96,55 +163,30 @@ if prompt := st.chat_input("What would you like to know about travel?"):
             status.update(label="Complete!", state="complete")
         
         message_placeholder = st.empty()
-        ask_pattern = r'<Ask.*?>(.*?)</Ask>'
-        message_pattern = r'<Message.*?>(.*?)</Message>'
 
-        if st.session_state.nano.answer_instruction is not None:
-            answer_pattern = r'<FormattedAnswer.*?>(.*?)</FormattedAnswer>'
+        if nano.answer_instruction is not None:
+            answer_tag = "FormattedAnswer"
         else:
-            answer_pattern = r'<Answer.*?>(.*?)</Answer>'
-        
-        display_content = []
-        
-        for pattern in [ask_pattern, message_pattern]:
-            matches = re.findall(pattern, full_response, re.DOTALL)
-            display_content.extend(matches)
-
-        widgets = re.findall(
-            r'<Widget plan=\d+ name="([^"]+)">(.*?)</Widget>',
-            full_response, 
-            re.DOTALL
-        )
-
-        # Filter out widget tags from the full response
-        full_response = re.sub(
-            r'<Widget plan=\d+ name="[^"]+">(.*?)</Widget>',
-            '',
-            full_response,
-            flags=re.DOTALL
-        )
-
-        answer_matches = re.findall(answer_pattern, full_response, re.DOTALL)
-        display_content.extend(answer_matches)
+            answer_tag = "Answer"
+
+        texts, widgets = display_content(full_response, answer_tag)
         
-        for widget_name, widget_content in widgets:
-            try:
-                widget_params = json.loads(widget_content)
-            except:
-                st.write(widget_content)
-                st.error(f"Error parsing widget params: {widget_content}")
+        for widget in widgets:
+            if widget.error is not None:
+                st.write(widget.content)
+                st.error(f"Error parsing widget params: {widget.content}")
                 continue
 
-            match widget_name:
+            match widget.attrs.get("name"):
                 case "map":
                     map_widget = MapWidget()
-                    map_widget.display(widget_params)
+                    map_widget.display(widget.data)
                 case "metric":
                     metric_widget = MetricWidget()
-                    metric_widget.display(widget_params)
+                    metric_widget.display(widget.data)
         
-        if display_content:
-            message_placeholder.markdown('\n\n'.join(display_content))
+        if texts:
+            message_placeholder.markdown('\n\n'.join(texts))
         else:
             message_placeholder.markdown(full_response)
     
@@ -1,36 +1,81 @@
-
 from ..tool import Tool
+from ..catalog import load_catalog
 import os
-import pandas as pd
+
+# Offered to the LLM only if the catalog has a price column
+PRICE_PARAMS = {
+    "min_price": {"description": "Minimum price per night", "type": "number", "optional": "yes"},
+    "max_price": {"description": "Maximum price per night", "type": "number", "optional": "yes"}
+}
+COLUMNS = ["name", "city", "type", "stars", "price", "description", "latitude", "longitude"]
 
 
 class HotelTool(Tool):
+    file_path = os.path.join(os.path.dirname(__file__), "hotel.csv")
+    catalog = load_catalog(file_path, "city", ("type", "stars"))
+    priced = "price" in catalog.columns()
+
     name = "hotel"
     description = "Get hotel information for a given city"
     params = {
         "city": {"description": "City name to get hotel for", "type": "string", "optional": "no"},
         "type": {"description": "Type of hotel", "type": "string", "optional": "yes"},
-        "stars": {"description": "Number of stars of the hotel", "type": "integer", "optional": "yes"}
+        "stars": {"description": "Number of stars of the hotel", "type": "integer", "optional": "yes"},
+        **(PRICE_PARAMS if priced else {})
+    }
+    return_schema = {
+        "type": "csv",
+        "columns": COLUMNS if priced else [c for c in COLUMNS if c != "price"]
     }
-    return_schema = {"type": "csv", "columns": ["hotel_name", "city", "type","price", "availability"]}
+
+    cacheable = True
+    batched = True
+
+    # Upper bound of rows returned for a city, cheapest first if prices are known
+    max_rows = 50
 
     def execute(self, params):
+        error = self._price_error(params)
+        if error:
+            return error
+
         city = params.get("city", "")
         type = params.get("type", None)
         stars = params.get("stars", None)
-        return self.get_hotel(city, type, stars)
-
-    def get_hotel(self, city, type, stars):
-        file_path = os.path.join(os.path.dirname(__file__), "hotel.csv")
-        df = pd.read_csv(file_path)
-        condition = df["city"] == city
-        if type is not None:
-            condition = condition & (df["type"] == type)
-        if stars is not None:
-            condition = condition & (df["stars"] == stars)
-        df = df[condition]
-
-        if len(df) == 0:
+        price_range = (params.get("min_price", None), params.get("max_price", None))
+        return self.get_hotel(city, type, stars, price_range)
+
+    def execute_batch(self, params_list):
+        # All cities are filtered in one pass over the catalog
+        errors = [self._price_error(params) for params in params_list]
+        queries = [self._query(params) for params, error in zip(params_list, errors) if not error]
+        results = iter(self.catalog.lookup_many(queries))
+        return [error or next(results) or "No hotel found for the given city" for error in errors]
+
+    def cache_version(self):
+        return self.catalog.version()
+
+    def _price_error(self, params):
+        if not self.priced and (params.get("min_price") is not None or params.get("max_price") is not None):
+            return "Error: The hotel catalog has no prices, search without min_price and max_price"
+        return None
+
+    def _query(self, params):
+        query = {"key": params.get("city", ""),
+                 "limit": self.max_rows,
+                 "type": params.get("type", None),
+                 "stars": params.get("stars", None)}
+        if self.priced:
+            query["ranges"] = {"price": (params.get("min_price", None), params.get("max_price", None))}
+            query["order_by"] = "price"
+        return query
+
+    def get_hotel(self, city, type, stars, price_range=(None, None)):
+        query = self._query({"city": city, "type": type, "stars": stars,
+                             "min_price": price_range[0], "max_price": price_range[1]})
+        result = self.catalog.lookup(**query)
+
+        if result is None:
             return "No hotel found for the given city"
         else:
-            return df.to_csv(index=False)
+            return result
@@ -1,6 +1,8 @@
 from .tool import Tool
-import requests
+from .http_client import client
+from .gazetteer import Gazetteer
 import json
+import os
 
 class MapSearchTool(Tool):
     name = "map_search"
@@ -10,16 +12,96 @@ class MapSearchTool(Tool):
     }
     return_schema = {
         "type": "json",
-        "columns": ["place_name", "latitude", "longitude"]
+        "columns": ["place_name", "country", "latitude", "longitude"],
+        "records": "features",
+        "sources": {
+            "place_name": "properties.name",
+            "country": "properties.country",
+            "latitude": "geometry.coordinates.1",
+            "longitude": "geometry.coordinates.0"
+        }
     }
 
+    cacheable = True
+    cache_ttl = 7 * 24 * 60 * 60
+    batched = True
+
+    timeout = (3.05, 5)
+    rate_limit = (5, 10)
+
     base_url = "https://photon.komoot.io/api/"
 
+    # Common cities are found offline by their exact name, Photon is asked for other places
+    gazetteer = Gazetteer(os.path.join(os.path.dirname(__file__), "cities.csv"))
+    max_results = 3
+
+    def execute_batch(self, params_list):
+        # One request per param set, sent concurrently within the rate limit
+        return self.execute_concurrently(params_list)
+
+    async def aexecute_batch(self, params_list):
+        return await self.aexecute_concurrently(params_list)
+
     def execute(self, params):
         place = params.get("place", "").lower()
-        url = f"{self.base_url}?q={place}&limit=3"
+        places = self.gazetteer.search(place, limit=self.max_results, exact=True)
+        if places:
+            return json.dumps(self._features(places))
+
+        try:
+            response = client.get(self.base_url,
+                                  params={"q": place, "limit": self.max_results},
+                                  timeout=self.timeout,
+                                  rate_limit=self.rate_limit)
+        except:
+            return "Error while loading MapSearch API"
+        return self._result(place, response)
+
+    async def aexecute(self, params):
+        place = params.get("place", "").lower()
+        places = self.gazetteer.search(place, limit=self.max_results, exact=True)
+        if places:
+            return json.dumps(self._features(places))
+
         try:
-            response = requests.get(url)
-            return json.dumps(response.json())
+            response = await client.aget(self.base_url,
+                                         params={"q": place, "limit": self.max_results},
+                                         timeout=self.timeout,
+                                         rate_limit=self.rate_limit)
         except:
             return "Error while loading MapSearch API"
+        return self._result(place, response)
+
+    def _result(self, place, response):
+        try:
+            # Raised, so an error response is never returned or cached as places
+            response.raise_for_status()
+            result = response.json()
+        except:
+            return "Error while loading MapSearch API"
+
+        if not result.get("features"):
+            # Prefix and typo matches are only guesses, used when Photon knows no such place
+            places = self.gazetteer.search(place, limit=self.max_results)
+            if places:
+                result = self._features(places)
+        return json.dumps(result)
+
+    @staticmethod
+    def _features(places):
+        # Same GeoJSON shape as the Photon response
+        return {
+            "features": [{
+                "geometry": {"coordinates": [p["longitude"], p["latitude"]], "type": "Point"},
+                "type": "Feature",
+                "properties": {
+                    "country": p["country"],
+                    "osm_key": "place",
+                    "countrycode": p["country_code"],
+                    "osm_value": "city",
+                    "name": p["name"],
+                    "type": "city"
+                }
+            } for p in places],
+            "type": "FeatureCollection"
+        }
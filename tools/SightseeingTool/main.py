@@ -1,6 +1,6 @@
 from ..tool import Tool
+from ..catalog import load_catalog
 import os
-import pandas as pd
 
 
 class SightseeingTool(Tool):
@@ -10,19 +10,44 @@ class SightseeingTool(Tool):
         "city": {"description": "City name to get sightseeing for", "type": "string", "optional": "no"},
         "type": {"description": "Type of sightseeing", "type": "string", "optional": "yes"}
     }
-    return_schema = {"type": "csv", "columns": ["sightseeing_name", "city", "type","price", "availability"]}
+    return_schema = {
+        "type": "csv",
+        "columns": ["name", "city", "description", "latitude", "longitude"],
+        "sources": {
+            "name": "Name",
+            "city": "City",
+            "description": "Description",
+            "latitude": "Latitude",
+            "longitude": "Longitude"
+        }
+    }
+
+    cacheable = True
+    batched = True
+    file_path = os.path.join(os.path.dirname(__file__), "sightseeing.csv")
+    catalog = load_catalog(file_path, "City")
+
+    # Upper bound of rows returned for a city
+    max_rows = 50
 
     def execute(self, params):
         city = params.get("city", "")
         type = params.get("type", None)
         return self.get_sightseeing(city, type)
 
+    def execute_batch(self, params_list):
+        # All cities are looked up against one version of the catalog
+        results = self.catalog.lookup_many([{"key": params.get("city", ""), "limit": self.max_rows}
+                                            for params in params_list])
+        return [result or "No sightseeing found for the given city" for result in results]
+
+    def cache_version(self):
+        return self.catalog.version()
+
     def get_sightseeing(self, city, type):
-        file_path = os.path.join(os.path.dirname(__file__), "sightseeing.csv")
-        df = pd.read_csv(file_path)
-        df = df[df["City"] == city]
+        result = self.catalog.lookup(city, limit=self.max_rows)
 
-        if len(df) == 0:
+        if result is None:
             return "No sightseeing found for the given city"
         else:
-            return df.to_csv(index=False)
+            return result
@@ -1,8 +1,10 @@
 from .tool import Tool
-import requests
+from .http_client import client
+from .weather_store import WeatherStore
 import json
 import logging as lg
-from datetime import datetime, timezone
+import time
+from datetime import datetime
 
 
 class WeatherTool(Tool):
@@ -15,46 +17,83 @@ class WeatherTool(Tool):
     }
     return_schema = {
         "type": "json",
-        "columns": ["timestamp", "temperature", "precipitation", "condition"]
+        "columns": ["timestamp", "temperature", "precipitation", "condition", "relative_humidity", "wind_speed"],
+        "records": "weather"
     }
 
+    cacheable = True
+    cache_ttl = 15 * 60
+    batched = True
+
+    timeout = (3.05, 10)
+    rate_limit = (10, 20)
+
     base_url = "https://api.brightsky.dev/weather"
 
+    # Whole days per geocell, shared by all instances of the tool
+    store = WeatherStore()
+
+    def execute_batch(self, params_list):
+        # One request per param set, sent concurrently within the rate limit
+        return self.execute_concurrently(params_list)
+
+    async def aexecute_batch(self, params_list):
+        return await self.aexecute_concurrently(params_list)
+
+    @classmethod
+    def prefetch(cls, locations, interval=None):
+        # Keep the current day of hot cities, (lat, lon) pairs, in the store
+        cls.store.start_prefetch(locations, cls()._fetch_day, interval)
+
     def execute(self, params):
-        lat = params.get("lat")
-        lon = params.get("lon")
-        
-        if not lat or not lon:
+        if not params.get("lat") or not params.get("lon"):
             return "Error: Latitude and Longitude are required"
 
-        date = params.get("date", "")
-
-        if not date:
-            date = datetime.now().strftime("%Y-%m-%d")
-
-        url = f"{self.base_url}?lat={lat}&lon={lon}"
-
-        if date:
-            url += f"&date={date}"
-
-        try:    
-            response = requests.get(url)
-            data = response.json()
-            
-            # Find entry closest to current time
-            current_time = datetime.now(timezone.utc)  # Get UTC time
-            weather_entries = data.get("weather", [])
-            
-            if not weather_entries:
-                return "No weather data available"
-                
-            closest_entry = min(
-                weather_entries,
-                key=lambda x: abs(datetime.fromisoformat(x["timestamp"]) - current_time)
-            )
-
-            lg.debug(f"Weather data: {closest_entry}")
-            
-            return json.dumps({"weather": [closest_entry]})
+        try:
+            series = self.store.get_or_fetch(params["lat"], params["lon"], self._date(params), self._fetch_day)
         except Exception as e:
             return f"Error while loading Weather API: {str(e)}"
+        return self._result(series)
+
+    async def aexecute(self, params):
+        if not params.get("lat") or not params.get("lon"):
+            return "Error: Latitude and Longitude are required"
+
+        try:
+            series = await self.store.aget_or_fetch(params["lat"], params["lon"], self._date(params),
+                                                    self._afetch_day)
+        except Exception as e:
+            return f"Error while loading Weather API: {str(e)}"
+        return self._result(series)
+
+    @staticmethod
+    def _date(params):
+        return params.get("date") or datetime.now().strftime("%Y-%m-%d")
+
+    @staticmethod
+    def _result(series):
+        # Find entry closest to current time
+        closest_entry = series.closest(time.time())
+        if closest_entry is None:
+            return "No weather data available"
+
+        lg.debug(f"Weather data: {closest_entry}")
+
+        return json.dumps({"weather": [closest_entry]})
+
+    def _fetch_day(self, lat, lon, date):
+        response = client.get(self.base_url,
+                              params={"lat": lat, "lon": lon, "date": date},
+                              timeout=self.timeout,
+                              rate_limit=self.rate_limit)
+        # Raised, so failed requests are never stored as days without data
+        response.raise_for_status()
+        return response.json().get("weather", [])
+
+    async def _afetch_day(self, lat, lon, date):
+        response = await client.aget(self.base_url,
+                                     params={"lat": lat, "lon": lon, "date": date},
+                                     timeout=self.timeout,
+                                     rate_limit=self.rate_limit)
+        response.raise_for_status()
+        return response.json().get("weather", [])
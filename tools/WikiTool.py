@@ -1,5 +1,5 @@
 from .tool import Tool
-import requests
+from .http_client import client
 import json
 import re
 
@@ -16,11 +16,26 @@ class WikiTool(Tool):
     }
     return_schema = {
         "type": "json",
-        "columns": ["label", "wikipedia_url", "description", "categories"]
+        "columns": ["label", "wikipedia_url", "description", "categories"],
+        "records": "results"
     }
 
+    cacheable = True
+    cache_ttl = 7 * 24 * 60 * 60
+    batched = True
+
+    timeout = (3.05, 15)
+    rate_limit = (5, 10)
+
     base_url = "https://lookup.dbpedia.org/api/search"
 
+    def execute_batch(self, params_list):
+        # One request per param set, sent concurrently within the rate limit
+        return self.execute_concurrently(params_list)
+
+    async def aexecute_batch(self, params_list):
+        return await self.aexecute_concurrently(params_list)
+
     def execute(self, params):
         query = params.get("query")
 
@@ -28,33 +43,53 @@ class WikiTool(Tool):
             return "Error: Query parameter is required"
 
         try:
-            response = requests.get(f"{self.base_url}?query={query}")
-            if response.status_code != 200:
-                return f"Error: API request failed with status {response.status_code}"
-
-            xml_text = response.text
-            results = []
-            label_matches = re.findall(r"<Label>(.*?)</Label>", xml_text)[:3]
-            uri_matches = re.findall(r"<URI>(.*?)</URI>", xml_text)[:3]
-            desc_matches = re.findall(r"<Description>(.*?)</Description>", xml_text)[:3]
-            category_sections = re.findall(r"<Categories>(.*?)</Categories>", xml_text)[:3]
-            all_categories = []
-            for section in category_sections:
-                categories = re.findall(r"<Label>(.*?)</Label>", section)
-                all_categories.append(categories)
-
-            for i in range(min(3, len(label_matches))):
-                wiki_url = uri_matches[i].replace("dbpedia.org/resource", "wikipedia.org/wiki")
-                
-                result = {
-                    "label": label_matches[i],
-                    "wikipedia_url": wiki_url,
-                    "description": desc_matches[i] if i < len(desc_matches) else "",
-                    "categories": all_categories[i] if i < len(all_categories) else []
-                }
-                results.append(result)
-
-            return json.dumps({"results": results})
-            
+            response = client.get(self.base_url,
+                                  params={"query": query},
+                                  timeout=self.timeout,
+                                  rate_limit=self.rate_limit)
+            return self._result(response)
+        except Exception as e:
+            return f"Error while querying Wikipedia: {str(e)}"
+
+    async def aexecute(self, params):
+        query = params.get("query")
+
+        if not query:
+            return "Error: Query parameter is required"
+
+        try:
+            response = await client.aget(self.base_url,
+                                         params={"query": query},
+                                         timeout=self.timeout,
+                                         rate_limit=self.rate_limit)
+            return self._result(response)
         except Exception as e:
             return f"Error while querying Wikipedia: {str(e)}"
+
+    def _result(self, response):
+        if response.status_code != 200:
+            return f"Error: API request failed with status {response.status_code}"
+
+        xml_text = response.text
+        results = []
+        label_matches = re.findall(r"<Label>(.*?)</Label>", xml_text)[:3]
+        uri_matches = re.findall(r"<URI>(.*?)</URI>", xml_text)[:3]
+        desc_matches = re.findall(r"<Description>(.*?)</Description>", xml_text)[:3]
+        category_sections = re.findall(r"<Categories>(.*?)</Categories>", xml_text)[:3]
+        all_categories = []
+        for section in category_sections:
+            categories = re.findall(r"<Label>(.*?)</Label>", section)
+            all_categories.append(categories)
+
+        for i in range(min(3, len(label_matches))):
+            wiki_url = uri_matches[i].replace("dbpedia.org/resource", "wikipedia.org/wiki")
+
+            result = {
+                "label": label_matches[i],
+                "wikipedia_url": wiki_url,
+                "description": desc_matches[i] if i < len(desc_matches) else "",
+                "categories": all_categories[i] if i < len(all_categories) else []
+            }
+            results.append(result)
+
+        return json.dumps({"results": results})
@@ -0,0 +1,165 @@
+from itertools import combinations
+import csv
+import io
+import os
+import threading
+import time
+
+
+class CSVCatalog:
+    """CSV catalog loaded once per process and indexed by its key columns.
+
+    Every combination of the primary key column (e.g. city) with the
+    secondary filter columns (e.g. type, stars) is indexed, so a lookup
+    is a single dictionary access returning pre-rendered CSV rows. The
+    file is reloaded when its mtime changes, checked at most every
+    check_interval seconds.
+    """
+
+    def __init__(self, file_path, key_column, filter_columns=(), check_interval=1.0):
+        self.file_path = file_path
+        self.key_column = key_column
+        self.filter_columns = tuple(filter_columns)
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self.mtime = None
+        self.checked = 0.0
+        self.catalog = ("", {})
+
+    def version(self):
+        return os.path.getmtime(self.file_path)
+
+    def columns(self):
+        self._refresh()
+        return list(self.catalog[1])
+
+    def lookup(self, key, ranges=None, order_by=None, limit=None, **filters):
+        """
+        Find the rows matching the key and the given filters.
+
+        Args:
+            key: Value of the key column.
+            ranges (dict): Inclusive (low, high) bounds per numeric column, None for an open bound.
+            order_by (str): Numeric column to sort the result by, ascending.
+            limit (int): Maximum number of rows, the first rows by order_by.
+            **filters: Values of the filter columns, None to ignore a filter.
+
+        Returns:
+            str: CSV with header of the matching rows, None if no row matches.
+        """
+        self._refresh()
+        return self._lookup(self.catalog, key, ranges, order_by, limit, **filters)
+
+    def lookup_many(self, queries):
+        """
+        Run several lookups against the same version of the catalog.
+
+        Args:
+            queries (list): Keyword arguments of lookup per query, e.g. {"key": "London", "stars": 4}.
+
+        Returns:
+            list: The result of each query, None for queries without matches.
+        """
+        self._refresh()
+        catalog = self.catalog
+        return [self._lookup(catalog, **query) for query in queries]
+
+    def _lookup(self, catalog, key, ranges=None, order_by=None, limit=None, **filters):
+        header, columns, index = catalog
+        active = tuple((c, _normalize(filters[c])) for c in self.filter_columns if filters.get(c) is not None)
+        rows = index.get((_normalize(key), active))
+
+        if rows and ranges:
+            for column, (low, high) in ranges.items():
+                if column not in columns:
+                    continue
+                pos = columns[column]
+                rows = [r for r in rows
+                        if (low is None or _number(r[0][pos]) >= float(low))
+                        and (high is None or _number(r[0][pos]) <= float(high))]
+
+        if rows and order_by in columns:
+            pos = columns[order_by]
+            rows = sorted(rows, key=lambda r: _number(r[0][pos]))
+
+        if rows and limit is not None:
+            rows = rows[:limit]
+
+        if not rows:
+            return None
+        return header + "".join(line for _, line in rows)
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self.mtime is not None and now - self.checked < self.check_interval:
+            return
+
+        with self.lock:
+            self.checked = now
+            mtime = self.version()
+            if mtime != self.mtime:
+                self._load()
+                self.mtime = mtime
+
+    def _load(self):
+        with open(self.file_path, newline="") as f:
+            reader = csv.reader(f)
+            columns = next(reader)
+            rows = list(reader)
+
+        key_pos = columns.index(self.key_column)
+        filter_pos = [(c, columns.index(c)) for c in self.filter_columns]
+
+        index = {}
+        for row in rows:
+            line = _render(row)
+            for n in range(len(filter_pos) + 1):
+                for subset in combinations(filter_pos, n):
+                    active = tuple((c, row[pos]) for c, pos in subset)
+                    index.setdefault((row[key_pos], active), []).append((row, line))
+
+        # Swap in the new index at once, so concurrent lookups never see a partial catalog
+        self.catalog = (_render(columns), {c: i for i, c in enumerate(columns)}, index)
+
+
+def load_catalog(file_path, key_column, filter_columns=()):
+    """
+    Open the catalog of a CSV file, preferring its columnar conversion.
+
+    Large catalogs converted with tools.columnar are memory-mapped instead
+    of being loaded into memory.
+
+    Args:
+        file_path (str): Path of the CSV file.
+        key_column (str): Column to look rows up by.
+        filter_columns (tuple): Columns to filter by.
+
+    Returns:
+        CSVCatalog or ColumnarCatalog: The catalog.
+    """
+    from .columnar import columnar_path, is_catalog, ColumnarCatalog
+
+    path = columnar_path(file_path)
+    if is_catalog(path):
+        return ColumnarCatalog(path)
+    return CSVCatalog(file_path, key_column, filter_columns)
+
+
+def _number(value):
+    try:
+        return float(value)
+    except ValueError:
+        return float("inf")
+
+
+def _normalize(value):
+    # Parameters from the LLM may be numbers, i.e. stars=5 or stars=5.0
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+def _render(row):
+    out = io.StringIO()
+    csv.writer(out, lineterminator="\n").writerow(row)
+    return out.getvalue()
@@ -0,0 +1,412 @@
+"""Memory-mapped columnar catalogs for large hotel and sightseeing inventories.
+
+A catalog directory holds one NumPy file per column, opened with
+mmap_mode="r", so only the pages of the rows a query touches are read and
+several processes share them through the OS page cache. Every conversion is
+written into a new version subdirectory, and the file "current" names the
+complete version, so readers never see a half-written catalog:
+
+- meta.json: columns, row count and encoding of every column
+- <key>.dict.json, <key>.offsets.npy: sorted key values and the row range of each
+- <col>.npy: int64 or float64 values of numeric columns
+- <col>.codes.npy, <col>.dict.json: dictionary-encoded low-cardinality strings
+- <col>.data.npy, <col>.offsets.npy: UTF-8 blob and row offsets of other strings
+
+Rows are sorted by the key column, so a key lookup is a slice and all other
+predicates are evaluated on that slice only.
+
+Convert a CSV file with:
+    python -m tools.columnar tools/HotelTool/hotel.csv city
+"""
+import csv
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+# Strings with at most this share of distinct values are dictionary-encoded. The
+# dictionaries are loaded into every process, so their size must stay small
+DICT_RATIO = 0.01
+DICT_MAX = 65536
+
+# File naming the version subdirectory of the complete catalog
+CURRENT = "current"
+
+
+def columnar_path(csv_path):
+    return os.path.splitext(csv_path)[0] + ".columnar"
+
+
+def is_catalog(path):
+    return os.path.exists(os.path.join(path, CURRENT))
+
+
+def convert_csv(csv_path, key_column, out_dir=None):
+    """
+    Convert a CSV file into a columnar catalog directory.
+
+    Args:
+        csv_path (str): Path of the CSV file.
+        key_column (str): Column the rows are sorted and indexed by, e.g. city.
+        out_dir (str): Output directory, defaults to the CSV path with a .columnar suffix.
+
+    Returns:
+        str: The output directory.
+    """
+    out_dir = out_dir or columnar_path(csv_path)
+    os.makedirs(out_dir, exist_ok=True)
+    version_dir = tempfile.mkdtemp(prefix=f"v{time.time_ns()}-", dir=out_dir)
+    try:
+        _convert(csv_path, key_column, version_dir)
+    except BaseException:
+        shutil.rmtree(version_dir, ignore_errors=True)
+        raise
+
+    # Readers keep the files of the version they have mmapped, a new version is
+    # only seen once the pointer to it is replaced, which is atomic
+    previous = _current_version(out_dir)
+    pointer = os.path.join(out_dir, f"{CURRENT}.{os.getpid()}.tmp")
+    with open(pointer, "w") as f:
+        f.write(os.path.basename(version_dir))
+    os.replace(pointer, os.path.join(out_dir, CURRENT))
+
+    # The previous version is kept for readers still opening it, older ones are removed
+    for name in os.listdir(out_dir):
+        path = os.path.join(out_dir, name)
+        if os.path.isdir(path) and name not in (os.path.basename(version_dir), previous):
+            shutil.rmtree(path, ignore_errors=True)
+
+    return out_dir
+
+
+def _current_version(path):
+    try:
+        with open(os.path.join(path, CURRENT)) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def _convert(csv_path, key_column, out_dir):
+    with open(csv_path, newline="") as f:
+        reader = csv.reader(f)
+        columns = next(reader)
+        values = [[] for _ in columns]
+        for row in reader:
+            for i, value in enumerate(row):
+                values[i].append(value)
+
+    rows = len(values[0]) if values else 0
+    key_pos = columns.index(key_column)
+    order = sorted(range(rows), key=values[key_pos].__getitem__)
+
+    encodings = {}
+    for column, column_values in zip(columns, values):
+        column_values = [column_values[i] for i in order]
+        if column == key_column:
+            encodings[column] = _write_key(out_dir, column, column_values)
+        else:
+            encodings[column] = _write_column(out_dir, column, column_values)
+
+    with open(os.path.join(out_dir, "meta.json"), "w") as f:
+        json.dump({"columns": columns, "rows": rows, "key": key_column, "encodings": encodings}, f)
+
+
+def _write_key(out_dir, column, values):
+    keys = sorted(set(values))
+    codes = {k: i for i, k in enumerate(keys)}
+    counts = np.bincount([codes[v] for v in values], minlength=len(keys))
+    offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+    np.save(os.path.join(out_dir, f"{column}.offsets.npy"), offsets)
+    _write_column(out_dir, column, values, force="dict")
+    return "dict"
+
+
+def _write_column(out_dir, column, values, force=None):
+    encoding = force or _infer_encoding(values)
+
+    if encoding == "int":
+        np.save(os.path.join(out_dir, f"{column}.npy"), np.array([int(v) for v in values], dtype=np.int64))
+    elif encoding == "float":
+        array = np.array([float(v) if v != "" else np.nan for v in values], dtype=np.float64)
+        np.save(os.path.join(out_dir, f"{column}.npy"), array)
+    elif encoding == "dict":
+        dictionary = sorted(set(values))
+        codes = {v: i for i, v in enumerate(dictionary)}
+        np.save(os.path.join(out_dir, f"{column}.codes.npy"), np.array([codes[v] for v in values], dtype=np.int32))
+        with open(os.path.join(out_dir, f"{column}.dict.json"), "w") as f:
+            json.dump(dictionary, f)
+    else:
+        encoded = [v.encode("utf-8") for v in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        np.save(os.path.join(out_dir, f"{column}.offsets.npy"), offsets)
+        np.save(os.path.join(out_dir, f"{column}.data.npy"), np.frombuffer(b"".join(encoded), dtype=np.uint8))
+
+    return encoding
+
+
+def _infer_encoding(values):
+    for cast, encoding in ((int, "int"), (float, "float")):
+        try:
+            for v in values:
+                if v != "" or encoding == "int":
+                    cast(v)
+            return encoding
+        except ValueError:
+            continue
+
+    if len(set(values)) <= min(DICT_RATIO * len(values), DICT_MAX):
+        return "dict"
+    return "str"
+
+
+class ColumnarCatalog:
+    """Query interface of a columnar catalog directory.
+
+    Has the same lookup interface as tools.catalog.CSVCatalog. The directory
+    is reopened when its current version changes, checked at most every
+    check_interval seconds.
+    """
+
+    def __init__(self, path, check_interval=1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self.current = None
+        self.checked = 0.0
+        self.catalog = None
+
+    def version(self):
+        return _current_version(self.path)
+
+    def columns(self):
+        return list(self._refresh()["meta"]["columns"])
+
+    def lookup(self, key, ranges=None, order_by=None, limit=None, **filters):
+        """
+        Find the rows matching the key, the filters and the ranges.
+
+        Args:
+            key: Value of the key column.
+            ranges (dict): Inclusive (low, high) bounds per numeric column, None for an open bound.
+            order_by (str): Numeric column to sort the result by, ascending.
+            limit (int): Maximum number of rows, the first rows by order_by.
+            **filters: Values of other columns, None to ignore a filter.
+
+        Returns:
+            str: CSV with header of the matching rows, None if no row matches.
+        """
+        catalog = self._refresh()
+        meta = catalog["meta"]
+        key_column = meta["key"]
+
+        code = catalog["codes"][key_column].get(str(key))
+        if code is None:
+            return None
+
+        start, end = (int(x) for x in catalog["key_offsets"][code:code + 2])
+        mask = np.ones(end - start, dtype=bool)
+
+        for column, value in filters.items():
+            if value is None:
+                continue
+            if column not in catalog["columns"]:
+                return None
+            mask &= self._equals(catalog, column, value, start, end)
+
+        for column, (low, high) in (ranges or {}).items():
+            if column not in catalog["columns"]:
+                continue
+            column_values = catalog["columns"][column][start:end]
+            if low is not None:
+                mask &= column_values >= float(low)
+            if high is not None:
+                mask &= column_values <= float(high)
+
+        rows = np.flatnonzero(mask) + start
+        return self._render(catalog, rows, order_by, limit)
+
+    def lookup_many(self, queries):
+        """
+        Run several lookups with one vectorized filter per set of predicates.
+
+        Queries differing only in their key, e.g. the hotels of several cities
+        with the same filters, are evaluated together: the row ranges of all
+        keys are gathered and every predicate is applied once to all of them.
+
+        Args:
+            queries (list): Keyword arguments of lookup per query, e.g. {"key": "London", "stars": 4}.
+
+        Returns:
+            list: The result of each query, None for queries without matches.
+        """
+        catalog = self._refresh()
+        results = [None] * len(queries)
+
+        groups = {}
+        for i, query in enumerate(queries):
+            query = dict(query)
+            key = query.pop("key")
+            signature = json.dumps(query, sort_keys=True, default=str)
+            groups.setdefault(signature, (query, []))[1].append((i, key))
+
+        for query, members in groups.values():
+            ranges = query.pop("ranges", None)
+            order_by = query.pop("order_by", None)
+            limit = query.pop("limit", None)
+
+            segments = []
+            for i, key in members:
+                code = catalog["codes"][catalog["meta"]["key"]].get(str(key))
+                if code is not None:
+                    start, end = (int(x) for x in catalog["key_offsets"][code:code + 2])
+                    segments.append((i, start, end))
+            if not segments:
+                continue
+
+            rows = np.concatenate([np.arange(start, end) for _, start, end in segments])
+            mask = self._mask(catalog, rows, ranges, query)
+            if mask is None:
+                continue
+
+            # Split the matches back into the rows of each key
+            bounds = np.cumsum([0] + [end - start for _, start, end in segments])
+            for (i, _, _), low, high in zip(segments, bounds[:-1], bounds[1:]):
+                results[i] = self._render(catalog, rows[low:high][mask[low:high]], order_by, limit)
+
+        return results
+
+    def _mask(self, catalog, rows, ranges, filters):
+        mask = np.ones(len(rows), dtype=bool)
+
+        for column, value in filters.items():
+            if value is None:
+                continue
+            if column not in catalog["columns"]:
+                return None
+            encoding = catalog["meta"]["encodings"][column]
+            if encoding == "dict":
+                code = catalog["codes"][column].get(str(value))
+                mask &= catalog["columns"][column][rows] == (code if code is not None else -1)
+            elif encoding in ("int", "float"):
+                try:
+                    mask &= catalog["columns"][column][rows] == float(value)
+                except (TypeError, ValueError):
+                    mask[:] = False
+            else:
+                mask &= np.array([self._value(catalog, column, row) == str(value) for row in rows], dtype=bool)
+
+        for column, (low, high) in (ranges or {}).items():
+            if column not in catalog["columns"]:
+                continue
+            column_values = catalog["columns"][column][rows]
+            if low is not None:
+                mask &= column_values >= float(low)
+            if high is not None:
+                mask &= column_values <= float(high)
+
+        return mask
+
+    def _render(self, catalog, rows, order_by, limit):
+        meta = catalog["meta"]
+        if len(rows) == 0:
+            return None
+
+        if order_by is not None and order_by in catalog["columns"]:
+            column_values = np.asarray(catalog["columns"][order_by][rows])
+            if limit is not None and limit < len(rows):
+                top = np.argpartition(column_values, limit - 1)[:limit]
+                rows = rows[top[np.argsort(column_values[top], kind="stable")]]
+            else:
+                rows = rows[np.argsort(column_values, kind="stable")]
+
+        if limit is not None:
+            rows = rows[:limit]
+
+        out = io.StringIO()
+        writer = csv.writer(out, lineterminator="\n")
+        writer.writerow(meta["columns"])
+        for row in rows:
+            writer.writerow([self._value(catalog, c, row) for c in meta["columns"]])
+        return out.getvalue()
+
+    def _equals(self, catalog, column, value, start, end):
+        encoding = catalog["meta"]["encodings"][column]
+
+        if encoding == "dict":
+            code = catalog["codes"][column].get(str(value))
+            if code is None:
+                return np.zeros(end - start, dtype=bool)
+            return catalog["columns"][column][start:end] == code
+
+        if encoding in ("int", "float"):
+            try:
+                return catalog["columns"][column][start:end] == float(value)
+            except (TypeError, ValueError):
+                return np.zeros(end - start, dtype=bool)
+
+        return np.array([self._value(catalog, column, row) == str(value) for row in range(start, end)], dtype=bool)
+
+    def _value(self, catalog, column, row):
+        encoding = catalog["meta"]["encodings"][column]
+
+        if encoding == "dict":
+            return catalog["dicts"][column][catalog["columns"][column][row]]
+        if encoding == "str":
+            offsets = catalog["offsets"][column]
+            return bytes(catalog["columns"][column][offsets[row]:offsets[row + 1]]).decode("utf-8")
+        if encoding == "float":
+            value = catalog["columns"][column][row]
+            return "" if np.isnan(value) else repr(float(value))
+        return str(int(catalog["columns"][column][row]))
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self.catalog is not None and now - self.checked < self.check_interval:
+            return self.catalog
+
+        with self.lock:
+            self.checked = now
+            current = self.version()
+            if current != self.current:
+                self.catalog = self._open(os.path.join(self.path, current))
+                self.current = current
+            return self.catalog
+
+    def _open(self, path):
+        def load(name):
+            return np.load(os.path.join(path, name), mmap_mode="r")
+
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+
+        catalog = {"meta": meta, "columns": {}, "dicts": {}, "codes": {}, "offsets": {}}
+        for column, encoding in meta["encodings"].items():
+            if encoding == "dict":
+                catalog["columns"][column] = load(f"{column}.codes.npy")
+                with open(os.path.join(path, f"{column}.dict.json")) as f:
+                    catalog["dicts"][column] = json.load(f)
+                catalog["codes"][column] = {v: i for i, v in enumerate(catalog["dicts"][column])}
+            elif encoding == "str":
+                catalog["columns"][column] = load(f"{column}.data.npy")
+                catalog["offsets"][column] = load(f"{column}.offsets.npy")
+            else:
+                catalog["columns"][column] = load(f"{column}.npy")
+
+        catalog["key_offsets"] = load(f"{meta['key']}.offsets.npy")
+        return catalog
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Usage: python -m tools.columnar <csv_path> <key_column> [out_dir]")
+        sys.exit(1)
+    print(convert_csv(sys.argv[1], sys.argv[2], *sys.argv[3:4]))
@@ -0,0 +1,278 @@
+"""Offline gazetteer answering place searches for the most common cities.
+
+The gazetteer is a CSV file in the style of a GeoNames dump with the columns
+geonameid, name, asciiname, alternatenames (comma-separated), latitude,
+longitude, country_code, country and population. Every name is normalized
+(lowercase, without accents and punctuation) into a search key:
+
+- Keys are kept in a sorted array, a flattened trie in which all keys with
+  a common prefix form a contiguous range found by binary search.
+- A trigram index maps every trigram to the keys containing it, and
+  narrows typo-tolerant queries down to a few candidates, which are
+  checked with a bounded edit distance. Typos are not tolerated in the
+  first letter.
+
+Places sharing a name are ranked by population.
+
+Convert a GeoNames dump, e.g. cities15000.txt, with:
+    python -m tools.gazetteer cities15000.txt countryInfo.txt tools/cities.csv
+"""
+from array import array
+import bisect
+import csv
+import heapq
+import os
+import re
+import sys
+import threading
+import time
+import unicodedata
+
+COLUMNS = ["geonameid", "name", "asciiname", "alternatenames", "latitude", "longitude",
+           "country_code", "country", "population"]
+
+# Shorter queries are only matched exactly, as too many names start with or resemble them
+MIN_PREFIX = 4
+MIN_FUZZY = 5
+
+NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def normalize(text):
+    """Search key of a name: lowercase ASCII letters and digits separated by single spaces"""
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    return NON_ALNUM.sub(" ", text).strip()
+
+
+def trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def max_distance(key):
+    # Typos tolerated for a query, one for short names and two for long ones
+    if len(key) < MIN_FUZZY:
+        return 0
+    return 1 if len(key) < 8 else 2
+
+
+def edit_distance(a, b, limit):
+    """
+    Optimal string alignment distance of two strings, adjacent transpositions counting as one edit.
+
+    Args:
+        a (str): First string.
+        b (str): Second string.
+        limit (int): Maximum distance of interest.
+
+    Returns:
+        int: The distance, limit + 1 if it exceeds the limit.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if previous2 is not None and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return min(previous[-1], limit + 1)
+
+
+class Gazetteer:
+    """Exact, prefix and typo-tolerant search of places by name.
+
+    The CSV file is loaded on the first search and reloaded when its mtime
+    changes, checked at most every check_interval seconds.
+    """
+
+    def __init__(self, file_path, check_interval=1.0):
+        self.file_path = file_path
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self.mtime = None
+        self.checked = 0.0
+        self.index = None
+
+    def version(self):
+        return os.path.getmtime(self.file_path)
+
+    def search(self, query, limit=3, exact=False):
+        """
+        Find the places matching a query, e.g. "London" or "Paris, France".
+
+        Exact matches of a name are preferred over names starting with the
+        query, which are preferred over names with typos. A part after a
+        comma must match the country name or code.
+
+        Args:
+            query (str): The place name.
+            limit (int): Maximum number of places.
+            exact (bool): Only match whole names, as a prefix or typo match
+                may be a guess for a place missing from the gazetteer.
+
+        Returns:
+            list: The places as dicts with name, country, country_code, latitude,
+                longitude and population, empty if no place matches.
+        """
+        self._refresh()
+        index = self.index
+        if index is None:
+            return []
+
+        name, _, qualifier = query.partition(",")
+        key = normalize(name)
+        country = normalize(qualifier)
+        if not key:
+            return []
+
+        tiers = (self._exact,) if exact else (self._exact, self._prefix, self._fuzzy)
+        for tier in tiers:
+            places = [index["places"][i] for i in tier(index, key)]
+            if country:
+                places = [p for p in places
+                          if country in (normalize(p["country"]), p["country_code"].lower())]
+            if places:
+                places.sort(key=lambda p: -p["population"])
+                return places[:limit]
+        return []
+
+    def _exact(self, index, key):
+        keys = index["keys"]
+        i = bisect.bisect_left(keys, key)
+        if i < len(keys) and keys[i] == key:
+            return index["places_of"][i]
+        return ()
+
+    def _prefix(self, index, key):
+        if len(key) < MIN_PREFIX:
+            return ()
+        keys = index["keys"]
+        start = bisect.bisect_left(keys, key)
+        end = bisect.bisect_left(keys, key + "\x7f", start)
+        places = {i for k in range(start, end) for i in index["places_of"][k]}
+        # Only the most populated places of a wide prefix range can be returned
+        return heapq.nlargest(32, places, key=index["population"].__getitem__)
+
+    def _fuzzy(self, index, key):
+        limit = max_distance(key)
+        if not limit:
+            return ()
+
+        grams = trigrams(key)
+        counts = {}
+        for gram in grams:
+            for k in index["grams"].get(gram, ()):
+                counts[k] = counts.get(k, 0) + 1
+
+        # An edit changes at most three trigrams of the padded key, a transposition four
+        needed = max(1, len(grams) - 4 * limit)
+        keys = index["keys"]
+        matches = {}
+        for k, count in counts.items():
+            if count < needed or keys[k][0] != key[0]:
+                continue
+            distance = edit_distance(key, keys[k], limit)
+            if distance <= limit:
+                for i in index["places_of"][k]:
+                    matches[i] = min(distance, matches.get(i, distance))
+        if not matches:
+            return ()
+
+        best = min(matches.values())
+        return [i for i, distance in matches.items() if distance == best]
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self.mtime is not None and now - self.checked < self.check_interval:
+            return
+
+        with self.lock:
+            self.checked = now
+            if not os.path.exists(self.file_path):
+                return
+            mtime = self.version()
+            if mtime != self.mtime:
+                self._load()
+                self.mtime = mtime
+
+    def _load(self):
+        places = []
+        names = {}
+        with open(self.file_path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                i = len(places)
+                places.append({
+                    "name": row["name"],
+                    "country": row["country"],
+                    "country_code": row["country_code"],
+                    "latitude": float(row["latitude"]),
+                    "longitude": float(row["longitude"]),
+                    "population": int(row["population"] or 0)
+                })
+                for name in [row["name"], row["asciiname"], *row["alternatenames"].split(",")]:
+                    key = normalize(name)
+                    if key:
+                        names.setdefault(key, set()).add(i)
+
+        keys = sorted(names)
+        grams = {}
+        for k, key in enumerate(keys):
+            for gram in trigrams(key):
+                grams.setdefault(gram, array("I")).append(k)
+
+        # Swap in the new index at once, so concurrent searches never see a partial one
+        self.index = {
+            "places": places,
+            "population": array("q", (p["population"] for p in places)),
+            "keys": keys,
+            "places_of": [tuple(names[key]) for key in keys],
+            "grams": grams
+        }
+
+
+def convert_geonames(cities_path, countries_path, out_path):
+    """
+    Convert a GeoNames cities dump into a gazetteer CSV file.
+
+    Args:
+        cities_path (str): Tab-separated cities file, e.g. cities15000.txt.
+        countries_path (str): Tab-separated countryInfo.txt with the country names.
+        out_path (str): Path of the gazetteer CSV file.
+
+    Returns:
+        int: The number of places.
+    """
+    countries = {}
+    with open(countries_path, encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("#"):
+                continue
+            fields = line.rstrip("\n").split("\t")
+            countries[fields[0]] = fields[4]
+
+    count = 0
+    with open(cities_path, encoding="utf-8") as f, open(out_path, "w", newline="", encoding="utf-8") as out:
+        writer = csv.writer(out, lineterminator="\n")
+        writer.writerow(COLUMNS)
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+            writer.writerow([fields[0], fields[1], fields[2], fields[3], fields[4], fields[5],
+                             fields[8], countries.get(fields[8], fields[8]), fields[14]])
+            count += 1
+    return count
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4:
+        print("Usage: python -m tools.gazetteer <cities_path> <country_info_path> <out_path>")
+        sys.exit(1)
+    print(convert_geonames(sys.argv[1], sys.argv[2], sys.argv[3]))
@@ -0,0 +1,271 @@
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+import asyncio
+import logging as lg
+import random
+import ssl
+import threading
+import time
+import weakref
+import certifi
+import httpx
+import requests
+
+
+class CircuitOpenError(requests.RequestException):
+    """Raised when requests to a host are suspended after repeated failures"""
+    pass
+
+
+class TokenBucket:
+    """Client-side rate limiter allowing rate requests per second with bursts of burst requests"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _take(self):
+        # Take a token, or return the seconds until one is available
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        while wait := self._take():
+            time.sleep(wait)
+
+    async def aacquire(self):
+        while wait := self._take():
+            await asyncio.sleep(wait)
+
+
+class CircuitBreaker:
+    """Suspends requests to a host for reset_timeout seconds after failure_threshold consecutive failures.
+
+    After the timeout a single trial request is let through (half-open); its
+    outcome closes the circuit again or reopens it.
+    """
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened = None
+        self.trial = False
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.opened is None:
+                return True
+            if not self.trial and time.monotonic() - self.opened >= self.reset_timeout:
+                self.trial = True
+                return True
+            return False
+
+    def success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened = None
+            self.trial = False
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial or self.failures >= self.failure_threshold:
+                self.opened = time.monotonic()
+                self.trial = False
+
+
+class HTTPClient:
+    """Shared HTTP client for the network tools.
+
+    Keeps one pooled keep-alive session, one async session per event loop,
+    one token bucket and one circuit breaker per host. Connection errors, timeouts, 429 and 5xx responses are
+    retried with exponential backoff and full jitter. Requests, retries and
+    rejections by an open circuit are counted per host in the optional
+    metrics sink.
+    """
+
+    RETRY_STATUS = (429, 500, 502, 503, 504)
+
+    def __init__(self,
+                 retries=2,
+                 backoff=0.5,
+                 max_backoff=8.0,
+                 rate=10.0,
+                 burst=20,
+                 failure_threshold=5,
+                 reset_timeout=30.0,
+                 pool_maxsize=16,
+                 metrics=None):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.rate = rate
+        self.burst = burst
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.pool_maxsize = pool_maxsize
+        self.metrics = metrics
+        self.hosts = {}
+        self.ssl_context = None
+        self.lock = threading.Lock()
+        self.logger = lg.getLogger(__name__)
+
+    def _host(self, url, rate_limit=None):
+        host = urlsplit(url).netloc
+
+        with self.lock:
+            if host not in self.hosts:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                rate, burst = rate_limit or (self.rate, self.burst)
+                self.hosts[host] = {
+                    "session": session,
+                    "bucket": TokenBucket(rate, burst),
+                    "breaker": CircuitBreaker(self.failure_threshold, self.reset_timeout),
+                    "async_sessions": weakref.WeakKeyDictionary()
+                }
+            return host, self.hosts[host]
+
+    def get(self, url, params=None, timeout=(3.05, 10), rate_limit=None, **kwargs):
+        """
+        Send a GET request.
+
+        Args:
+            url (str): The URL.
+            params (dict): Query parameters.
+            timeout (tuple): Connect and read timeout in seconds.
+            rate_limit (tuple): Requests per second and burst size of the host,
+                applied when the host is first used.
+            **kwargs: Additional arguments for requests.Session.get.
+
+        Returns:
+            requests.Response: The response. Non-retryable error statuses are returned, not raised.
+        """
+        host, state = self._host(url, rate_limit)
+
+        for attempt in range(self.retries + 1):
+            self._allow(host, state)
+            state["bucket"].acquire()
+            self._count("http_requests_total", host)
+
+            try:
+                response = state["session"].get(url, params=params, timeout=timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if not self._retry_error(host, state, attempt, e):
+                    raise
+                time.sleep(self._delay(attempt))
+                continue
+
+            if self._is_final(host, state, attempt, response):
+                return response
+            time.sleep(self._delay(attempt, response.headers.get("Retry-After")))
+
+    async def aget(self, url, params=None, timeout=(3.05, 10), rate_limit=None, **kwargs):
+        """
+        Send a GET request on the event loop.
+
+        Shares the token bucket and circuit breaker of the host with get, so
+        sync and async requests count against the same limits.
+
+        Args:
+            url (str): The URL.
+            params (dict): Query parameters.
+            timeout (tuple): Connect and read timeout in seconds.
+            rate_limit (tuple): Requests per second and burst size of the host,
+                applied when the host is first used.
+            **kwargs: Additional arguments for httpx.AsyncClient.get.
+
+        Returns:
+            httpx.Response: The response. Non-retryable error statuses are returned, not raised.
+        """
+        host, state = self._host(url, rate_limit)
+        session = self._async_session(state)
+        if isinstance(timeout, tuple):
+            timeout = httpx.Timeout(timeout[1], connect=timeout[0])
+
+        for attempt in range(self.retries + 1):
+            self._allow(host, state)
+            await state["bucket"].aacquire()
+            self._count("http_requests_total", host)
+
+            try:
+                response = await session.get(url, params=params, timeout=timeout, **kwargs)
+            except (httpx.TimeoutException, httpx.NetworkError) as e:
+                if not self._retry_error(host, state, attempt, e):
+                    raise
+                await asyncio.sleep(self._delay(attempt))
+                continue
+
+            if self._is_final(host, state, attempt, response):
+                return response
+            await asyncio.sleep(self._delay(attempt, response.headers.get("Retry-After")))
+
+    def _async_session(self, state):
+        # Connections of an async client belong to the event loop they were opened on
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            session = state["async_sessions"].get(loop)
+            if session is None:
+                # Loading the CA certificates is the slow part of creating a client, it is done once
+                if self.ssl_context is None:
+                    self.ssl_context = ssl.create_default_context(cafile=certifi.where())
+                limits = httpx.Limits(max_connections=self.pool_maxsize,
+                                      max_keepalive_connections=self.pool_maxsize)
+                session = state["async_sessions"][loop] = httpx.AsyncClient(limits=limits, verify=self.ssl_context,
+                                                                            follow_redirects=True)
+            return session
+
+    def _allow(self, host, state):
+        if not state["breaker"].allow():
+            self._count("http_circuit_open_total", host)
+            raise CircuitOpenError(f"Circuit open for {host}")
+
+    def _retry_error(self, host, state, attempt, error):
+        # Whether a request failing with a connection error or timeout is retried
+        state["breaker"].failure()
+        if attempt == self.retries:
+            return False
+        self.logger.warning(f"Request to {host} failed: {error}, retry {attempt + 1}/{self.retries}")
+        self._count("http_retries_total", host)
+        return True
+
+    def _is_final(self, host, state, attempt, response):
+        # Whether a response is returned, or retried after a 429 or 5xx status
+        if response.status_code not in self.RETRY_STATUS:
+            state["breaker"].success()
+            return True
+
+        state["breaker"].failure()
+        if attempt == self.retries:
+            return True
+        self.logger.warning(f"Request to {host} returned {response.status_code}, retry {attempt + 1}/{self.retries}")
+        self._count("http_retries_total", host)
+        return False
+
+    def _count(self, name, host):
+        if self.metrics is not None:
+            self.metrics.inc(name, 1, {"host": host})
+
+    def _delay(self, attempt, retry_after=None):
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        if retry_after is not None and retry_after.isdigit():
+            delay = max(delay, min(float(retry_after), self.max_backoff))
+        return delay
+
+
+# Shared by all tools of the process
+client = HTTPClient()
@@ -1,4 +1,10 @@
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import json
+
+# Shared by the batches of all tools, so concurrent requests of a batch stay bounded
+batch_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="tool-batch")
 
 class Tool(ABC):
     @property
@@ -16,6 +22,73 @@ class Tool(ABC):
     def return_schema(self):
         pass
 
+    # Results of cacheable tools are stored by NanoEngineer's result cache
+    # for cache_ttl seconds (None: until cache_version changes)
+    cacheable = False
+    cache_ttl = None
+
+    # Connect/read timeout in seconds and (requests per second, burst) of network tools
+    timeout = (3.05, 10)
+    rate_limit = None
+
+    # Tools whose execute_batch is faster than one execute per param set,
+    # e.g. concurrent requests or a single catalog scan, set batched = True
+    batched = False
+
     @abstractmethod
     def execute(self, params):
-        pass
\ No newline at end of file
+        pass
+
+    def cache_version(self):
+        # Cached results are invalidated when the version changes, i.e. the mtime of a data file
+        return None
+
+    def is_cacheable_result(self, result):
+        # Tools report failures as error strings, which must not be cached
+        return isinstance(result, str) and not result.startswith("Error")
+
+    async def aexecute(self, params):
+        # Tools without a native async implementation, e.g. the catalog tools, run
+        # in the event loop's default executor; network tools override it
+        return await asyncio.to_thread(self.execute, params)
+
+    def execute_batch(self, params_list):
+        # Results of several param sets, in their order; by default executed one by one
+        return [self.execute(params) for params in params_list]
+
+    async def aexecute_batch(self, params_list):
+        return await asyncio.to_thread(self.execute_batch, params_list)
+
+    def execute_concurrently(self, params_list):
+        """
+        Execute the param sets concurrently, identical param sets once.
+
+        Args:
+            params_list (list): The param sets.
+
+        Returns:
+            list: The results, in the order of params_list.
+        """
+        keys = [json.dumps(params, sort_keys=True, default=str) for params in params_list]
+        unique = dict(zip(keys, params_list))
+        if len(unique) == 1:
+            result = self.execute(params_list[0])
+            return [result] * len(params_list)
+
+        results = dict(zip(unique, batch_executor.map(self.execute, unique.values())))
+        return [results[key] for key in keys]
+
+    async def aexecute_concurrently(self, params_list):
+        """
+        Await aexecute for the param sets concurrently, identical param sets once.
+
+        Args:
+            params_list (list): The param sets.
+
+        Returns:
+            list: The results, in the order of params_list.
+        """
+        keys = [json.dumps(params, sort_keys=True, default=str) for params in params_list]
+        unique = dict(zip(keys, params_list))
+        results = dict(zip(unique, await asyncio.gather(*(self.aexecute(p) for p in unique.values()))))
+        return [results[key] for key in keys]
@@ -0,0 +1,243 @@
+from collections import OrderedDict
+from datetime import datetime
+import asyncio
+import bisect
+import logging as lg
+import threading
+import time
+
+
+class DaySeries:
+    """Weather records of one geocell and day, ordered by their timestamps.
+
+    The timestamps are parsed once into epoch seconds, so the record
+    closest to a point in time is found by binary search.
+    """
+
+    __slots__ = ("epochs", "records", "fetched")
+
+    def __init__(self, records, fetched):
+        pairs = sorted(((datetime.fromisoformat(r["timestamp"]).timestamp(), r)
+                        for r in records if r.get("timestamp")), key=lambda pair: pair[0])
+        self.epochs = [epoch for epoch, _ in pairs]
+        self.records = [record for _, record in pairs]
+        self.fetched = fetched
+
+    def closest(self, epoch):
+        """
+        Find the record closest to a point in time, the earlier one on a tie.
+
+        Args:
+            epoch (float): The point in time in epoch seconds.
+
+        Returns:
+            dict: The record, None if the day has no records.
+        """
+        if not self.records:
+            return None
+
+        i = bisect.bisect_left(self.epochs, epoch)
+        if i == 0:
+            return self.records[0]
+        if i == len(self.epochs):
+            return self.records[-1]
+        if epoch - self.epochs[i - 1] <= self.epochs[i] - epoch:
+            return self.records[i - 1]
+        return self.records[i]
+
+
+class WeatherStore:
+    """In-memory weather time series per geocell and day.
+
+    Coordinates are quantized to a grid of cell_size degrees (0.1 degrees
+    are about 11 km), and a whole day is fetched once for the center of a
+    cell. Every later request for that day and any coordinate within the
+    cell is served from memory until the day is older than ttl seconds.
+    Concurrent requests for a missing day, from threads or coroutines, wait
+    for a single fetch. Hot locations can be refreshed in the background,
+    so their requests never wait for the API.
+    """
+
+    def __init__(self, cell_size=0.1, ttl=30 * 60, max_days=4096):
+        self.cell_size = cell_size
+        self.ttl = ttl
+        self.max_days = max_days
+        self.lock = threading.Lock()
+        self.days = OrderedDict()
+        self.loading = {}
+        self.hits = 0
+        self.misses = 0
+        self.stop = threading.Event()
+        self.prefetcher = None
+        self.logger = lg.getLogger(__name__)
+
+    def cell(self, lat, lon):
+        return round(float(lat) / self.cell_size), round(float(lon) / self.cell_size)
+
+    def center(self, cell):
+        # Rounded, as the coordinates are sent to the API
+        return round(cell[0] * self.cell_size, 6), round(cell[1] * self.cell_size, 6)
+
+    def get_or_fetch(self, lat, lon, date, fetch):
+        """
+        Return the series of the day at the cell of the coordinates, fetching it if missing.
+
+        Args:
+            lat (float): Latitude.
+            lon (float): Longitude.
+            date (str): Day in YYYY-MM-DD format.
+            fetch (callable): fetch(lat, lon, date) returns the records of a day.
+
+        Returns:
+            DaySeries: The series.
+        """
+        key = (self.cell(lat, lon), date)
+        while True:
+            series, loading, leader = self._claim(key)
+            if series is not None:
+                return series
+            if leader:
+                break
+            # Another caller fetches this day, use its result or retry if it failed
+            loading.wait()
+
+        try:
+            return self._fetch(key, fetch)
+        finally:
+            self._release(key, loading)
+
+    async def aget_or_fetch(self, lat, lon, date, fetch):
+        """
+        Return the series of the day at the cell of the coordinates, awaiting its fetch if missing.
+
+        Args:
+            lat (float): Latitude.
+            lon (float): Longitude.
+            date (str): Day in YYYY-MM-DD format.
+            fetch (callable): fetch(lat, lon, date) returns an awaitable of the records of a day.
+
+        Returns:
+            DaySeries: The series.
+        """
+        key = (self.cell(lat, lon), date)
+        while True:
+            series, loading, leader = self._claim(key)
+            if series is not None:
+                return series
+            if leader:
+                break
+            # The fetch may run on another thread or event loop, only its end is awaited here
+            await asyncio.to_thread(loading.wait)
+
+        try:
+            return self._store(key, await fetch(*self.center(key[0]), date))
+        finally:
+            self._release(key, loading)
+
+    def _claim(self, key):
+        # The stored series, or the event of the fetch in flight and whether the caller runs it
+        with self.lock:
+            series = self._get(key)
+            if series is not None:
+                self.hits += 1
+                return series, None, False
+
+            loading = self.loading.get(key)
+            if loading is not None:
+                return None, loading, False
+            loading = self.loading[key] = threading.Event()
+            self.misses += 1
+            return None, loading, True
+
+    def _release(self, key, loading):
+        with self.lock:
+            del self.loading[key]
+        loading.set()
+
+    def _get(self, key):
+        series = self.days.get(key)
+        if series is None:
+            return None
+        if time.monotonic() - series.fetched > self.ttl:
+            del self.days[key]
+            return None
+        self.days.move_to_end(key)
+        return series
+
+    def _fetch(self, key, fetch):
+        cell, date = key
+        return self._store(key, fetch(*self.center(cell), date))
+
+    def _store(self, key, records):
+        series = DaySeries(records, time.monotonic())
+        with self.lock:
+            self.days[key] = series
+            self.days.move_to_end(key)
+            while len(self.days) > self.max_days:
+                self.days.popitem(last=False)
+        return series
+
+    def start_prefetch(self, locations, fetch, interval=None):
+        """
+        Refresh the current day of hot locations in a background thread.
+
+        Args:
+            locations (list): (lat, lon) pairs, e.g. of popular cities.
+            fetch (callable): fetch(lat, lon, date) returns the records of a day.
+            interval (float): Seconds between two refreshes, defaults to half the ttl.
+        """
+        if self.prefetcher is not None:
+            self.stop_prefetch()
+
+        cells = list(dict.fromkeys(self.cell(lat, lon) for lat, lon in locations))
+        interval = interval or self.ttl / 2
+        self.stop.clear()
+        self.prefetcher = threading.Thread(target=self._prefetch, args=(cells, fetch, interval),
+                                           name="weather-prefetch", daemon=True)
+        self.prefetcher.start()
+
+    def stop_prefetch(self):
+        self.stop.set()
+        if self.prefetcher is not None:
+            self.prefetcher.join()
+            self.prefetcher = None
+
+    def _prefetch(self, cells, fetch, interval):
+        while not self.stop.is_set():
+            date = datetime.now().strftime("%Y-%m-%d")
+            for cell in cells:
+                if self.stop.is_set():
+                    return
+                try:
+                    self._fetch((cell, date), fetch)
+                except Exception as e:
+                    self.logger.warning(f"Prefetching weather of {self.center(cell)} failed: {e}")
+            self.stop.wait(interval)
+
+    def stats(self):
+        """
+        Return the number of stored days and the hits and misses of lookups.
+
+        Returns:
+            dict: The statistics.
+        """
+        with self.lock:
+            return {"days": len(self.days), "hits": self.hits, "misses": self.misses}
+
+
+def parse_locations(text):
+    """
+    Parse locations given as "lat,lon;lat,lon", e.g. of the WEATHER_PREFETCH variable.
+
+    Args:
+        text (str): The locations.
+
+    Returns:
+        list: (lat, lon) pairs.
+    """
+    locations = []
+    for location in text.split(";"):
+        if location.strip():
+            lat, lon = location.split(",")
+            locations.append((float(lat), float(lon)))
+    return locations